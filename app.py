@@ -1,9 +1,19 @@
 import typing
 from litestar import Litestar, get
 from core.lifespan import ASGILifespan
-from controllers import TaskController, CalendarController
+from core.tenant import TenantMiddleware
+from core.instrumentation import MetricsMiddleware
+from core.admission import AdmissionMiddleware
+from core.settings import settings
+from controllers import (
+    TaskController, CalendarController, CalendarSeriesController, CalendarReminderController, HealthController,
+    MetricsController, ChangesController
+)
 from core.exceptions import (
-    unique_violation_handler, foreign_key_violation_handler, postgres_error_handler
+    unique_violation_handler, foreign_key_violation_handler, postgres_error_handler,
+    invalid_cursor_handler, InvalidCursorError, version_conflict_handler, VersionConflictError,
+    missing_tenant_handler, MissingTenantError, invalid_recurrence_handler, InvalidRecurrenceError,
+    change_feed_unavailable_handler, ChangeFeedUnavailableError, invalid_import_handler, InvalidImportError
 )
 from asyncpg.exceptions import (
     UniqueViolationError,
@@ -11,18 +21,31 @@ from asyncpg.exceptions import (
     PostgresError,
 )
 
-@get("/", tags=["Litestar"])
+@get("/", tags=["Litestar"], opt={"admission": "exempt", "tenantless": True})
 async def index() -> typing.Dict[str, str]:
     return {"status": "ok"}
 
 app = Litestar(
-    route_handlers=[index, TaskController, CalendarController],
+    route_handlers=[index, TaskController, CalendarController, CalendarSeriesController, CalendarReminderController,
+                    HealthController, MetricsController, ChangesController],
+    # Admission runs after metrics so shed requests are counted, and before any database work
+    middleware=[
+        *([MetricsMiddleware()] if settings.METRICS_ENABLED else []),
+        *([AdmissionMiddleware()] if settings.ADMISSION_ENABLED else []),
+        TenantMiddleware(),
+    ],
     on_startup=[ASGILifespan.startup],
     on_shutdown=[ASGILifespan.shutdown],
     exception_handlers={
         UniqueViolationError: unique_violation_handler,
         ForeignKeyViolationError: foreign_key_violation_handler,
         PostgresError: postgres_error_handler,
+        InvalidCursorError: invalid_cursor_handler,
+        VersionConflictError: version_conflict_handler,
+        MissingTenantError: missing_tenant_handler,
+        InvalidRecurrenceError: invalid_recurrence_handler,
+        ChangeFeedUnavailableError: change_feed_unavailable_handler,
+        InvalidImportError: invalid_import_handler,
     },
     debug=True
 )
\ No newline at end of file
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import itertools
+import sys
+import typing
+import uuid
+import httpx
+from app import app
+from core.settings import settings
+from benchmarks.runner import add_arguments, run
+
+# Drives the Litestar app in process through httpx's ASGI transport: the app runs in the benchmark's event loop,
+# so the numbers cover routing, validation, the repositories and Postgres but no sockets or server
+
+class ApiTarget:
+
+    def __init__(
+            self,
+            name: str,
+            client: httpx.AsyncClient,
+            path: str,
+            add_body: typing.Callable[[], dict[str, typing.Any]],
+            update_body: typing.Callable[[int], dict[str, typing.Any]]
+    ) -> None:
+        self.name = name
+        self.client = client
+        self.path = path
+        self.add_body = add_body
+        self.update_body = update_body
+
+    async def add(self) -> int:
+        response = await self.client.post(f"{self.path}/add", json=self.add_body())
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def get(self, id_: int) -> None:
+        response = await self.client.get(f"{self.path}/{id_}")
+        response.raise_for_status()
+
+    async def update(self, id_: int) -> None:
+        response = await self.client.put(f"{self.path}/update", json=self.update_body(id_))
+        response.raise_for_status()
+
+    async def delete(self, id_: int) -> None:
+        response = await self.client.request("DELETE", f"{self.path}/delete", json={"id": id_})
+        response.raise_for_status()
+
+
+def targets(client: httpx.AsyncClient) -> list[ApiTarget]:
+    # Titles are unique per owner, every added row gets a title of its own and an update keeps it unique by id
+    tasks, notes = itertools.count(), itertools.count()
+    return [
+        ApiTarget(
+            "tasks", client, "/tasks",
+            lambda: {"title": f"Benchmark task {next(tasks)}", "description": "Lorem ipsum dolor sit amet"},
+            lambda id_: {"id": id_, "title": f"Updated benchmark task {id_}", "description": "Consectetur adipiscing elit", "done": True},
+        ),
+        ApiTarget(
+            "calendar", client, "/calendar",
+            lambda: {"title": f"Benchmark note {next(notes)}", "note": "Lorem ipsum dolor sit amet"},
+            lambda id_: {"id": id_, "title": f"Updated benchmark note {id_}", "note": "Consectetur adipiscing elit"},
+        ),
+    ]
+
+
+async def benchmark(args: argparse.Namespace) -> dict[str, typing.Any]:
+    # Every run writes as a tenant of its own and deletes what it added
+    headers = {settings.TENANT_HEADER: str(uuid.uuid4())}
+    async with app.lifespan():
+        async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://benchmark", headers=headers
+        ) as client:
+            return await run(
+                "api", [target for target in targets(client) if target.name in args.targets], args
+            )
+
+
+def main(argv: typing.Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="add/get/update/delete mixes through the ASGI app")
+    add_arguments(parser, ("tasks", "calendar"))
+    args = parser.parse_args(argv)
+    settings.CACHE_ENABLED = not args.no_cache
+    document = asyncio.run(benchmark(args))
+    return 1 if document.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
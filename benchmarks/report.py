@@ -0,0 +1,101 @@
+import datetime
+import json
+import math
+import pathlib
+import typing
+
+__all__ = (
+    "Report",
+)
+
+class Report:
+    # Metrics compared against the baseline within the tolerance, round trips and errors are compared exactly
+    LOWER_IS_BETTER: typing.ClassVar[tuple[str, ...]] = ("p95_ms", "p99_ms")
+    HIGHER_IS_BETTER: typing.ClassVar[tuple[str, ...]] = ("throughput_rps",)
+
+    @staticmethod
+    def percentile(ordered: typing.Sequence[float], q: float) -> float:
+        # Nearest-rank percentile of an already sorted sample
+        if not ordered:
+            return 0.0
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    @classmethod
+    def summarize(
+            cls,
+            latencies: typing.Sequence[float],
+            errors: int,
+            elapsed: float,
+            round_trips: int
+    ) -> dict[str, float | int]:
+        ordered = sorted(latencies)
+        count = len(ordered)
+        return {
+            "count": count,
+            "errors": errors,
+            "p50_ms": round(cls.percentile(ordered, 50) * 1e3, 3),
+            "p95_ms": round(cls.percentile(ordered, 95) * 1e3, 3),
+            "p99_ms": round(cls.percentile(ordered, 99) * 1e3, 3),
+            "mean_ms": round(sum(ordered) / count * 1e3, 3) if count else 0.0,
+            "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+            "round_trips_per_request": round(round_trips / count, 2) if count else 0.0,
+        }
+
+    @staticmethod
+    def document(name: str, options: typing.Mapping[str, typing.Any], results: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        return {
+            "benchmark": name,
+            "created": datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds"),
+            "options": dict(options),
+            "results": results,
+        }
+
+    @staticmethod
+    def write(path: pathlib.Path, document: dict[str, typing.Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+
+    @staticmethod
+    def load(path: pathlib.Path) -> dict[str, typing.Any]:
+        return json.loads(path.read_text())
+
+    @staticmethod
+    def show(results: dict[str, typing.Any]) -> None:
+        print(f"{'scenario':<24} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>10} {'rt/req':>7}")
+        for target, operations in results.items():
+            for operation, summary in operations.items():
+                print(
+                    f"{target + '.' + operation:<24} {summary['count']:>7} {summary['errors']:>5} "
+                    f"{summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f} "
+                    f"{summary['throughput_rps']:>10.1f} {summary['round_trips_per_request']:>7.2f}"
+                )
+
+    @classmethod
+    def compare(
+            cls,
+            results: dict[str, typing.Any],
+            baseline: dict[str, typing.Any],
+            tolerance: float
+    ) -> list[str]:
+        # Scenarios missing from either side are skipped, round trips are deterministic so any increase counts
+        regressions = []
+        for target, operations in results.items():
+            for operation, summary in operations.items():
+                before = baseline.get(target, {}).get(operation)
+                if not before or not before["count"] or not summary["count"]:
+                    continue
+                scenario = f"{target}.{operation}"
+                for metric in cls.LOWER_IS_BETTER:
+                    if summary[metric] > before[metric] * (1 + tolerance):
+                        regressions.append(f"{scenario} {metric} {before[metric]} -> {summary[metric]}")
+                for metric in cls.HIGHER_IS_BETTER:
+                    if summary[metric] < before[metric] * (1 - tolerance):
+                        regressions.append(f"{scenario} {metric} {before[metric]} -> {summary[metric]}")
+                if summary["round_trips_per_request"] > before["round_trips_per_request"]:
+                    regressions.append(
+                        f"{scenario} round_trips_per_request "
+                        f"{before['round_trips_per_request']} -> {summary['round_trips_per_request']}"
+                    )
+                if summary["errors"] > before["errors"]:
+                    regressions.append(f"{scenario} errors {before['errors']} -> {summary['errors']}")
+        return regressions
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import itertools
+import sys
+import typing
+import uuid
+from core.lifespan import ASGILifespan
+from core.settings import settings
+from core.tenant import Tenant
+from db.models import _TaskModel, _CalendarNoteModel
+from dto import AddTaskDTO, TaskUpdateDTO, AddCalendarNoteDTO, CalendarNoteUpdateDTO
+from repository import BaseRepository, TaskRepository, CalendarNoteRepository
+from benchmarks.runner import add_arguments, run
+
+# Calls the repositories directly against the configured Postgres, the difference with benchmarks.api is
+# what Litestar adds on top
+
+class RepositoryTarget:
+
+    def __init__(
+            self,
+            name: str,
+            repo: BaseRepository,
+            add_dto: typing.Callable[[], typing.Any],
+            update_dto: typing.Callable[[int], typing.Any]
+    ) -> None:
+        self.name = name
+        self.repo = repo
+        self.add_dto = add_dto
+        self.update_dto = update_dto
+
+    async def add(self) -> int:
+        return (await self.repo.add(self.add_dto()))["id"]
+
+    async def get(self, id_: int) -> None:
+        if await self.repo.get(id_) is None:
+            raise LookupError(f"{self.name} {id_} not found")
+
+    async def update(self, id_: int) -> None:
+        if await self.repo.update(self.update_dto(id_)) is None:
+            raise LookupError(f"{self.name} {id_} not found")
+
+    async def delete(self, id_: int) -> None:
+        if await self.repo.delete(id_) is None:
+            raise LookupError(f"{self.name} {id_} not found")
+
+
+def targets() -> list[RepositoryTarget]:
+    # Titles are unique per owner, every added row gets a title of its own and an update keeps it unique by id
+    tasks, notes = itertools.count(), itertools.count()
+    return [
+        RepositoryTarget(
+            "tasks", TaskRepository(_TaskModel),
+            lambda: AddTaskDTO(title=f"Benchmark task {next(tasks)}", description="Lorem ipsum dolor sit amet"),
+            lambda id_: TaskUpdateDTO(id=id_, title=f"Updated benchmark task {id_}", description="Consectetur adipiscing elit", done=True),
+        ),
+        RepositoryTarget(
+            "calendar", CalendarNoteRepository(_CalendarNoteModel),
+            lambda: AddCalendarNoteDTO(title=f"Benchmark note {next(notes)}", note="Lorem ipsum dolor sit amet"),
+            lambda id_: CalendarNoteUpdateDTO(id=id_, title=f"Updated benchmark note {id_}", note="Consectetur adipiscing elit"),
+        ),
+    ]
+
+
+async def benchmark(args: argparse.Namespace) -> dict[str, typing.Any]:
+    # Same startup as the app (migrations, prepared statements, pool warmup), every run writes as a tenant of its own
+    await ASGILifespan.startup()
+    try:
+        with Tenant.scope(uuid.uuid4()):
+            return await run(
+                "repositories", [target for target in targets() if target.name in args.targets], args
+            )
+    finally:
+        await ASGILifespan.shutdown()
+
+
+def main(argv: typing.Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="add/get/update/delete mixes against the repositories")
+    add_arguments(parser, ("tasks", "calendar"))
+    args = parser.parse_args(argv)
+    settings.CACHE_ENABLED = not args.no_cache
+    document = asyncio.run(benchmark(args))
+    return 1 if document.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
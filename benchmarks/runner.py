@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import collections
+import contextvars
+import pathlib
+import random
+import sys
+import time
+import typing
+import asyncpg
+from loguru import logger as log
+from db.manager import AsyncPGPoolManager
+from benchmarks.report import Report
+
+__all__ = (
+    "Target",
+    "RoundTrips",
+    "LoadRunner",
+    "add_arguments",
+    "run",
+)
+
+OPERATIONS: typing.Final[tuple[str, ...]] = ("add", "get", "update", "delete")
+
+# Operation timed by the current task, read back by RoundTrips
+_operation: contextvars.ContextVar[str | None] = contextvars.ContextVar("benchmark_operation", default=None)
+
+class Target(typing.Protocol):
+    # One controller or repository, add returns the id the other operations work on
+    name: str
+
+    async def add(self) -> int: ...
+
+    async def get(self, id_: int) -> None: ...
+
+    async def update(self, id_: int) -> None: ...
+
+    async def delete(self, id_: int) -> None: ...
+
+
+class RoundTrips:
+    # Statements sent to Postgres per operation, BEGIN/COMMIT included. asyncpg runs query loggers
+    # with call_soon, which copies the context of the task that sent the statement
+
+    def __init__(self) -> None:
+        self.counts: collections.Counter[str | None] = collections.Counter()
+
+    def __call__(self, record: asyncpg.connection.LoggedQuery) -> None:
+        self.counts[_operation.get()] += 1
+
+    async def settle(self) -> None:
+        # Let the loggers scheduled by the last statements run
+        await asyncio.sleep(0)
+
+
+class LoadRunner:
+
+    def __init__(
+            self,
+            target: Target,
+            mix: typing.Mapping[str, int],
+            requests: int,
+            concurrency: int,
+            seed_rows: int,
+            round_trips: RoundTrips,
+            seed: int | None = None
+    ) -> None:
+        self.target = target
+        self.operations: list[str] = [operation for operation, weight in mix.items() if weight > 0]
+        self.weights: list[int] = [mix[operation] for operation in self.operations]
+        self.requests = requests
+        self.concurrency = concurrency
+        self.seed_rows = seed_rows
+        self.round_trips = round_trips
+        self.random = random.Random(seed)
+        # Ids are leased by one worker at a time, so a get never races the delete of the same row
+        self.ids: list[int] = []
+        self.latencies: dict[str, list[float]] = {operation: [] for operation in OPERATIONS}
+        self.errors: collections.Counter[str] = collections.Counter()
+        self.issued: int = 0
+
+    def _lease(self) -> int | None:
+        if not self.ids:
+            return None
+        idx = self.random.randrange(len(self.ids))
+        self.ids[idx], self.ids[-1] = self.ids[-1], self.ids[idx]
+        return self.ids.pop()
+
+    async def _call(self, operation: str) -> None:
+        id_ = None if operation == "add" else self._lease()
+        if id_ is None:
+            operation = "add"
+        token = _operation.set(operation)
+        started = time.perf_counter()
+        try:
+            if operation == "add":
+                self.ids.append(await self.target.add())
+            else:
+                await getattr(self.target, operation)(id_)
+                if operation != "delete":
+                    self.ids.append(id_)
+        except Exception as exc:
+            if not self.errors:
+                log.opt(exception=exc).warning(f"{self.target.name}.{operation} failed, further errors are only counted")
+            self.errors[operation] += 1
+        finally:
+            self.latencies[operation].append(time.perf_counter() - started)
+            _operation.reset(token)
+
+    async def _worker(self) -> None:
+        while self.issued < self.requests:
+            self.issued += 1
+            await self._call(self.random.choices(self.operations, self.weights)[0])
+
+    async def run(self) -> dict[str, dict[str, float | int]]:
+        # A failed seed would leave every worker adding instead of running the mix, so it fails the run
+        try:
+            for _ in range(self.seed_rows):
+                self.ids.append(await self.target.add())
+        except Exception as exc:
+            seeded = len(self.ids)
+            while self.ids:
+                await self.target.delete(self.ids.pop())
+            raise RuntimeError(
+                f"Seeding {self.target.name} failed after {seeded} of {self.seed_rows} rows: {exc!r}"
+            ) from exc
+        await self.round_trips.settle()
+        self.round_trips.counts.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+        await self.round_trips.settle()
+
+        results = {
+            "all": Report.summarize(
+                [latency for latencies in self.latencies.values() for latency in latencies],
+                sum(self.errors.values()),
+                elapsed,
+                sum(count for operation, count in self.round_trips.counts.items() if operation is not None)
+            )
+        }
+        for operation, latencies in self.latencies.items():
+            if latencies:
+                results[operation] = Report.summarize(
+                    latencies, self.errors[operation], elapsed, self.round_trips.counts[operation]
+                )
+
+        # Untimed, leaves the tables as they were before the run
+        while self.ids:
+            await self.target.delete(self.ids.pop())
+        return results
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        operation, _, weight = part.partition("=")
+        if operation.strip() not in OPERATIONS or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"Expected operation=weight pairs of {', '.join(OPERATIONS)}, got {part!r}")
+        mix[operation.strip()] = int(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("At least one operation needs a positive weight")
+    return mix
+
+
+def add_arguments(parser: argparse.ArgumentParser, targets: typing.Sequence[str]) -> None:
+    parser.add_argument("--targets", nargs="+", choices=targets, default=list(targets))
+    parser.add_argument("--mix", type=parse_mix, default="add=2,get=6,update=1,delete=1",
+                        help="Weighted operation mix, e.g. add=2,get=6,update=1,delete=1")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per target")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed-rows", type=int, default=100, help="Rows added (untimed) before each run")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the repository read-through cache")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed of the operation sequence")
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=pathlib.Path, default=None,
+                        help="Compare with a results file, exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative latency/throughput change")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline instead")
+
+
+async def run(
+        name: str,
+        targets: typing.Sequence[Target],
+        args: argparse.Namespace
+) -> dict[str, typing.Any]:
+    # Targets run one after the other so their numbers don't interfere
+    round_trips = RoundTrips()
+    mgr = await AsyncPGPoolManager.instance()
+    mgr.add_query_logger(round_trips)
+    try:
+        results = {}
+        for target in targets:
+            results[target.name] = await LoadRunner(
+                target, args.mix, args.requests, args.concurrency, args.seed_rows, round_trips, args.seed
+            ).run()
+    finally:
+        mgr.remove_query_logger(round_trips)
+
+    options = {
+        key: str(value) if isinstance(value, pathlib.Path) else value
+        for key, value in vars(args).items()
+    }
+    document = Report.document(name, options, results)
+    Report.show(results)
+    if args.output is not None:
+        Report.write(args.output, document)
+    if args.baseline is not None:
+        if args.save_baseline:
+            Report.write(args.baseline, document)
+        else:
+            regressions = Report.compare(results, Report.load(args.baseline)["results"], args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}", file=sys.stderr)
+            document["regressions"] = regressions
+    return document
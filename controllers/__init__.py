@@ -1,2 +1,7 @@
 from .task import TaskController
-from .calendar import CalendarController
\ No newline at end of file
+from .calendar import CalendarController
+from .health import HealthController
+from .metrics import MetricsController
+from .series import CalendarSeriesController
+from .changes import ChangesController
+from .reminders import CalendarReminderController
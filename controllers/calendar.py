@@ -1,64 +1,257 @@
-from litestar import Controller, post, put, delete
+import typing
+import datetime
+import email.utils
+import zoneinfo
+from litestar import Controller, Request, post, put, delete, get
 from litestar.di import Provide
-from repository import CalendarNoteRepository
-from db.models import _CalendarNoteModel
-from pydantic import BaseModel, Field
-from dto import CalendarNoteDTO, CalendarNoteUpdateDTO, AddCalendarNoteDTO
-
-class CalendarNoteAdd(BaseModel):
-    title: str = "New note"
-    note: str
-
-class CalendarNoteGet(BaseModel):
-    id: int = Field(
-        gt=0
-    )
-
-class CalendarNoteDel(BaseModel):
-    id: int = Field(
-        gt=0
-    )
-
-class CalendarNoteUpdate(BaseModel):
-    id: int = Field(
-        gt=0
-    )
-    title: str
-    note: str
+from litestar.params import Parameter
+from litestar.datastructures import CacheControlHeader
+from litestar.enums import MediaType
+from litestar.exceptions import NotFoundException, ValidationException
+from litestar.openapi import ResponseSpec
+from litestar.response import Response
+from litestar.status_codes import HTTP_304_NOT_MODIFIED
+from repository import CalendarNoteRepository, CalendarSeriesRepository
+from db.models import _CalendarNoteModel, _CalendarSeriesModel
+from dto import (
+    CalendarNoteDTO, CalendarNoteUpdateDTO, AddCalendarNoteDTO, CalendarNoteIdDTO, CalendarNoteIdsDTO,
+    CalendarNotePageDTO, CalendarDayDTO, CalendarNoteBulkResultDTO, CalendarNoteSearchPageDTO, CalendarNoteImportDTO,
+    ImportResultDTO
+)
+from core.settings import settings
+from repository.transfer import Transfer
+from core.etag import ETag
+from core.streaming import ClosingStream
 
 class CalendarController(Controller):
     path = "/calendar"
     dependencies = {
         "repo": Provide(lambda: CalendarNoteRepository(_CalendarNoteModel), sync_to_thread=False),
+        "series": Provide(lambda: CalendarSeriesRepository(_CalendarSeriesModel), sync_to_thread=False),
     }
 
+    @get("/", tags=["Calendar notes"], responses={200: ResponseSpec(data_container=CalendarNotePageDTO, description="A page of calendar notes")})
+    async def list_calendar_notes(
+            self,
+            repo: CalendarNoteRepository,
+            cursor: str | None = None,
+            limit: int = Parameter(default=settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+            title_prefix: str | None = None
+    ) -> Response[bytes]:
+        # Records are encoded straight to JSON, the response spec keeps the documented schema
+        return Response(
+            await repo.list_json(cursor=cursor, limit=limit, title_prefix=title_prefix),
+            media_type=MediaType.JSON
+        )
+
+    @get("/stream", tags=["Calendar notes"], opt={"admission": "bulk"})
+    async def stream_calendar_notes(
+            self,
+            repo: CalendarNoteRepository,
+            title_prefix: str | None = None
+    ) -> ClosingStream:
+        return ClosingStream(repo.stream_json(title_prefix=title_prefix), media_type="application/x-ndjson")
+
+    @get("/export", tags=["Calendar notes"], opt={"admission": "bulk"})
+    async def export_calendar_notes(
+            self,
+            repo: CalendarNoteRepository,
+            format_: typing.Literal["ndjson", "csv"] = Parameter(query="format", default="ndjson"),
+            compression: typing.Literal["gzip"] | None = None
+    ) -> ClosingStream:
+        # Every row of the tenant: NDJSON from a server-side cursor, CSV from COPY ... TO STDOUT
+        chunks = repo.stream_json() if format_ == "ndjson" else repo.export_csv()
+        if compression == "gzip":
+            chunks = Transfer.gzip(chunks)
+        return ClosingStream(
+            chunks,
+            media_type=Transfer.media_type(format_, compression),
+            headers={
+                "Content-Disposition": f'attachment; filename="{Transfer.filename("calendar_notes", format_, compression)}"'
+            }
+        )
+
+    @post("/import", tags=["Calendar notes"], opt={"admission": "bulk"}, request_max_body_size=None)
+    async def import_calendar_notes(
+            self,
+            request: Request,
+            repo: CalendarNoteRepository,
+            format_: typing.Literal["ndjson", "csv"] = Parameter(query="format", default="ndjson"),
+            compression: typing.Literal["gzip"] | None = None,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> ImportResultDTO:
+        # The body is parsed as it arrives and loaded chunk_size rows at a time, export files import as is
+        if compression is None and request.headers.get("Content-Encoding") == "gzip":
+            compression = "gzip"
+        return await repo.import_records(
+            Transfer.records(request.stream(), CalendarNoteImportDTO, format_, compression),
+            chunk_size=chunk_size
+        )
+
+    @get("/range", tags=["Calendar notes"])
+    async def calendar_range(
+            self,
+            repo: CalendarNoteRepository,
+            series: CalendarSeriesRepository,
+            start: datetime.datetime = Parameter(query="from"),
+            end: datetime.datetime = Parameter(query="to"),
+            tz: str = "UTC"
+    ) -> list[CalendarDayDTO]:
+        if end <= start:
+            raise ValidationException("'to' must be after 'from'")
+        if end - start > datetime.timedelta(days=settings.MAX_RANGE_DAYS):
+            raise ValidationException(f"Range must not exceed {settings.MAX_RANGE_DAYS} days")
+        try:
+            zoneinfo.ZoneInfo(tz)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValidationException(f"Unknown time zone {tz!r}")
+        # Naive bounds are UTC, as the database reads them
+        start, end = (value if value.tzinfo else value.replace(tzinfo=datetime.UTC) for value in (start, end))
+        return await repo.range(start, end, tz, occurrences=await series.occurrences(start, end))
+
+    @get("/search", tags=["Calendar notes"])
+    async def search_calendar_notes(
+            self,
+            repo: CalendarNoteRepository,
+            q: str = Parameter(min_length=1, max_length=256),
+            mode: typing.Literal["fts", "prefix"] = "fts",
+            cursor: str | None = None,
+            limit: int = Parameter(default=settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE)
+    ) -> CalendarNoteSearchPageDTO:
+        # fts: ranked full-text search with snippets and a keyset cursor, prefix: title autocomplete by trigrams
+        if mode == "prefix":
+            return await repo.autocomplete(q, limit=limit)
+        return await repo.search(q, cursor=cursor, limit=limit)
+
+    @get("/feed.ics", tags=["Calendar notes"], cache_control=CacheControlHeader(no_cache=True))
+    async def calendar_feed(
+            self,
+            repo: CalendarNoteRepository,
+            if_none_match: str | None = Parameter(header="If-None-Match", default=None),
+            if_modified_since: str | None = Parameter(header="If-Modified-Since", default=None)
+    ) -> Response:
+        # Calendar apps poll this: revalidation is a single aggregate query, a changed feed re-renders only
+        # the notes whose version isn't cached yet
+        if if_none_match is not None or if_modified_since is not None:
+            version, modified = await repo.feed_version()
+            if if_none_match is not None:
+                # If-None-Match takes precedence over If-Modified-Since
+                not_modified = ETag.matches(if_none_match, version, weak=True)
+            else:
+                try:
+                    since = email.utils.parsedate_to_datetime(if_modified_since)
+                except (TypeError, ValueError):
+                    since = None
+                not_modified = since is not None and since.tzinfo is not None and modified <= since
+            if not_modified:
+                return Response(
+                    None,
+                    status_code=HTTP_304_NOT_MODIFIED,
+                    headers={
+                        "ETag": ETag.of(version),
+                        "Last-Modified": email.utils.format_datetime(modified, usegmt=True),
+                    }
+                )
+        version, modified, body = await repo.feed()
+        return ClosingStream(
+            body,
+            media_type="text/calendar",
+            headers={
+                "ETag": ETag.of(version),
+                "Last-Modified": email.utils.format_datetime(modified, usegmt=True),
+            }
+        )
+
+    @get("/{note_id:int}", tags=["Calendar notes"], cache_control=CacheControlHeader(no_cache=True))
+    async def read_calendar_note(
+            self,
+            repo: CalendarNoteRepository,
+            note_id: int = Parameter(gt=0),
+            if_none_match: str | None = Parameter(header="If-None-Match", default=None)
+    ) -> Response[CalendarNoteDTO]:
+        # Revalidation only reads the version column, the row itself is fetched (or taken from the cache) on a miss
+        version = None
+        if if_none_match is not None:
+            version = await repo.version(note_id)
+            if ETag.matches(if_none_match, version, weak=True):
+                return Response(None, status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": ETag.of(version)})
+        note = await repo.get(note_id, min_version=version)
+        if note is None:
+            raise NotFoundException("Calendar note not found")
+        return Response(note, headers={"ETag": ETag.of(note["version"])})
+
     @post("/add", tags=["Calendar notes"])
-    async def add_calendar_note(self, data: CalendarNoteAdd, repo: CalendarNoteRepository) -> CalendarNoteDTO:
+    async def add_calendar_note(self, data: AddCalendarNoteDTO, repo: CalendarNoteRepository) -> CalendarNoteDTO:
         return await repo.add(
-            AddCalendarNoteDTO(
-                title=data.title,
-                note=data.note
-            )
+            data
         )
 
     @post("/get", tags=["Calendar notes"])
-    async def get_calendar_note(self, data: CalendarNoteGet, repo: CalendarNoteRepository) -> CalendarNoteDTO:
-        return await repo.get(
+    async def get_calendar_note(self, data: CalendarNoteIdDTO, repo: CalendarNoteRepository) -> CalendarNoteDTO:
+        note = await repo.get(
             data.id
         )
+        if note is None:
+            raise NotFoundException("Calendar note not found")
+        return note
 
     @delete("/delete", tags=["Calendar notes"], status_code=200)
-    async def delete_calendar_note(self, data: CalendarNoteDel, repo: CalendarNoteRepository) -> CalendarNoteDTO:
-        return await repo.delete(
+    async def delete_calendar_note(self, data: CalendarNoteIdDTO, repo: CalendarNoteRepository) -> CalendarNoteDTO:
+        note = await repo.delete(
             data.id
         )
+        if note is None:
+            raise NotFoundException("Calendar note not found")
+        return note
 
     @put("/update", tags=["Calendar notes"])
-    async def update_calendar_note(self, data: CalendarNoteUpdate, repo: CalendarNoteRepository) -> CalendarNoteDTO:
-        return await repo.update(
-            CalendarNoteUpdateDTO(
-                id=data.id,
-                title=data.title,
-                note=data.note
-            )
+    async def update_calendar_note(
+            self,
+            data: CalendarNoteUpdateDTO,
+            repo: CalendarNoteRepository,
+            if_match: str | None = Parameter(header="If-Match", default=None)
+    ) -> Response[CalendarNoteDTO]:
+        # Optimistic concurrency: 412 when the row changed since the client read the ETag it sends
+        note = await repo.update(
+            data,
+            versions=None if if_match is None or ETag.is_any(if_match) else ETag.versions(if_match)
+        )
+        if note is None:
+            raise NotFoundException("Calendar note not found")
+        return Response(note, headers={"ETag": ETag.of(note["version"])})
+
+    @post("/bulk", tags=["Calendar notes"], opt={"admission": "bulk"})
+    async def bulk_add_calendar_notes(
+            self,
+            data: list[AddCalendarNoteDTO],
+            repo: CalendarNoteRepository,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> list[CalendarNoteBulkResultDTO]:
+        return await repo.bulk_add(
+            data,
+            chunk_size=chunk_size
+        )
+
+    @put("/bulk", tags=["Calendar notes"], opt={"admission": "bulk"})
+    async def bulk_update_calendar_notes(
+            self,
+            data: list[CalendarNoteUpdateDTO],
+            repo: CalendarNoteRepository,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> list[CalendarNoteBulkResultDTO]:
+        return await repo.bulk_update(
+            data,
+            chunk_size=chunk_size
+        )
+
+    @delete("/bulk", tags=["Calendar notes"], opt={"admission": "bulk"}, status_code=200)
+    async def bulk_delete_calendar_notes(
+            self,
+            data: CalendarNoteIdsDTO,
+            repo: CalendarNoteRepository,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> list[CalendarNoteBulkResultDTO]:
+        return await repo.bulk_delete(
+            data.ids,
+            chunk_size=chunk_size
         )
@@ -0,0 +1,76 @@
+import typing
+from litestar import Controller, get
+from litestar.exceptions import ValidationException
+from litestar.handlers import websocket_stream
+from litestar.response import ServerSentEventMessage
+from core.settings import settings
+from core.tenant import Tenant
+from core.streaming import ClosingServerSentEvent
+from db.changes import ChangeFeed, RESYNC
+from db.models import _TaskModel, _CalendarNoteModel, _CalendarSeriesModel, _CalendarReminderModel
+
+# Tables whose repositories publish change events
+TABLES: typing.Final[tuple[str, ...]] = (
+    _TaskModel.__table__, _CalendarNoteModel.__table__, _CalendarSeriesModel.__table__,
+    _CalendarReminderModel.__table__
+)
+
+class ChangesController(Controller):
+    path = "/changes"
+
+    @staticmethod
+    def _tables(tables: list[str] | None) -> tuple[str, ...]:
+        # Checked before the stream starts, so the client gets a 400 or 503 rather than an empty stream
+        unknown = set(tables or ()) - set(TABLES)
+        if unknown:
+            raise ValidationException(f"Unknown tables {', '.join(sorted(unknown))}, expected {', '.join(TABLES)}")
+        ChangeFeed.check()
+        return tuple(tables or ())
+
+    @staticmethod
+    async def _events(
+            tables: tuple[str, ...],
+            heartbeat: float | None
+    ) -> typing.AsyncIterator[tuple[str, str] | None]:
+        # None every `heartbeat` seconds without events. Subscribed on the first iteration, so a stream that never
+        # starts holds no subscription, and unsubscribed when the stream ends
+        subscription = ChangeFeed.subscribe(Tenant.current(), tables)
+        try:
+            while True:
+                yield await subscription.get(heartbeat)
+        finally:
+            ChangeFeed.unsubscribe(subscription)
+
+    # Long-lived and without database work, an admission permit would be held for the whole stream
+    @get("/", tags=["Changes"], opt={"admission": "exempt"})
+    async def changes(self, tables: list[str] | None = None) -> ClosingServerSentEvent:
+        # Server-sent events named after the operation (created, updated, deleted or resync) with the
+        # {"tenant", "table", "op", "id", "version"} payload; on resync clients refetch what they display
+        tables = self._tables(tables)
+
+        async def messages() -> typing.AsyncIterator[ServerSentEventMessage]:
+            events = self._events(tables, settings.CHANGES_HEARTBEAT_SECONDS)
+            try:
+                async for event in events:
+                    if event is None:
+                        # Keeps proxies from closing an idle stream
+                        yield ServerSentEventMessage(data=None, comment="ping")
+                    else:
+                        op, payload = event
+                        yield ServerSentEventMessage(data=payload, event=op)
+            finally:
+                # Closed by the response while suspended at a yield, the inner stream isn't closed with it
+                await events.aclose()
+
+        return ClosingServerSentEvent(messages())
+
+    @websocket_stream("/ws")
+    async def changes_ws(self, tables: list[str] | None = None) -> typing.AsyncGenerator[str, None]:
+        # Same payloads as JSON text frames, {"op": "resync"} after missed events
+        events = self._events(self._tables(tables), None)
+        try:
+            async for event in events:
+                op, payload = event
+                yield payload if op != RESYNC else f'{{"op": "{RESYNC}"}}'
+        finally:
+            await events.aclose()
@@ -0,0 +1,52 @@
+from litestar import Controller, get
+from litestar.response import Response
+from litestar.status_codes import HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE
+from db.manager import AsyncPGPoolManager
+from repository.cache import RepositoryCache
+from db.statements import StatementRegistry
+from db.changes import ChangeFeed
+from repository.coalescing import WriteCoalescer
+from repository.scheduler import ReminderScheduler
+from core.admission import Admission
+import typing
+
+class HealthController(Controller):
+    path = "/health"
+    # Probes must answer while the service sheds load
+    opt = {"admission": "exempt", "tenantless": True}
+
+    @get("/", tags=["Health"])
+    async def health(self) -> Response[typing.Dict[str, str]]:
+        mgr = await AsyncPGPoolManager.instance()
+        if await mgr.health():
+            return Response({"status": "ok"}, status_code=HTTP_200_OK)
+        return Response({"status": "unavailable"}, status_code=HTTP_503_SERVICE_UNAVAILABLE)
+
+    @get("/pool", tags=["Health"])
+    async def pool_stats(self) -> typing.Dict[str, typing.Any]:
+        mgr = await AsyncPGPoolManager.instance()
+        return mgr.stats()
+
+    @get("/cache", tags=["Health"])
+    async def cache_stats(self) -> typing.Dict[str, typing.Any]:
+        return RepositoryCache.stats()
+
+    @get("/statements", tags=["Health"])
+    async def statement_stats(self) -> typing.Dict[str, typing.Any]:
+        return StatementRegistry.stats()
+
+    @get("/changes", tags=["Health"])
+    async def change_feed_stats(self) -> typing.Dict[str, typing.Any]:
+        return ChangeFeed.stats()
+
+    @get("/writes", tags=["Health"])
+    async def write_coalescing_stats(self) -> typing.Dict[str, typing.Any]:
+        return WriteCoalescer.stats()
+
+    @get("/reminders", tags=["Health"])
+    async def reminder_stats(self) -> typing.Dict[str, typing.Any]:
+        return ReminderScheduler.stats()
+
+    @get("/admission", tags=["Health"])
+    async def admission_stats(self) -> typing.Dict[str, typing.Any]:
+        return Admission.stats()
@@ -0,0 +1,19 @@
+from litestar import Controller, get
+from litestar.response import Response
+from db.manager import AsyncPGPoolManager
+from core.instrumentation import Instrumentation
+from core.metrics import Prometheus
+import typing
+
+class MetricsController(Controller):
+    path = "/metrics"
+    opt = {"admission": "exempt", "tenantless": True}
+
+    @get("/", tags=["Metrics"])
+    async def metrics(self) -> Response[str]:
+        mgr = await AsyncPGPoolManager.instance()
+        return Response(Instrumentation.render(mgr), media_type=Prometheus.CONTENT_TYPE)
+
+    @get("/slow-queries", tags=["Metrics"])
+    async def slow_queries(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        return list(Instrumentation.slow_queries)
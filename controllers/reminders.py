@@ -0,0 +1,45 @@
+from litestar import Controller, get, post, delete
+from litestar.di import Provide
+from litestar.exceptions import NotFoundException
+from litestar.params import Parameter
+from repository import CalendarReminderRepository
+from repository.scheduler import ReminderScheduler
+from db.models import _CalendarReminderModel
+from dto import CalendarReminderDTO, AddCalendarReminderDTO, CalendarReminderIdDTO
+from core.tenant import Tenant
+
+class CalendarReminderController(Controller):
+    # Reminders of calendar notes, delivered by the scheduler to the REMINDER_SINK once due
+    path = "/calendar/reminders"
+    dependencies = {
+        "repo": Provide(lambda: CalendarReminderRepository(_CalendarReminderModel), sync_to_thread=False),
+    }
+
+    @get("/", tags=["Calendar reminders"])
+    async def list_calendar_reminders(
+            self,
+            repo: CalendarReminderRepository,
+            note_id: int = Parameter(gt=0)
+    ) -> list[CalendarReminderDTO]:
+        return await repo.list(
+            note_id
+        )
+
+    @post("/add", tags=["Calendar reminders"])
+    async def add_calendar_reminder(self, data: AddCalendarReminderDTO, repo: CalendarReminderRepository) -> CalendarReminderDTO:
+        reminder = await repo.add(
+            data
+        )
+        if reminder is None:
+            raise NotFoundException("Calendar note not found")
+        ReminderScheduler.nudge(Tenant.current(), reminder["id"], reminder["due"])
+        return reminder
+
+    @delete("/delete", tags=["Calendar reminders"], status_code=200)
+    async def delete_calendar_reminder(self, data: CalendarReminderIdDTO, repo: CalendarReminderRepository) -> CalendarReminderDTO:
+        reminder = await repo.delete(
+            data.id
+        )
+        if reminder is None:
+            raise NotFoundException("Calendar reminder not found")
+        return reminder
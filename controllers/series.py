@@ -0,0 +1,68 @@
+from litestar import Controller, post, put, delete
+from litestar.di import Provide
+from litestar.exceptions import NotFoundException
+from repository import CalendarSeriesRepository
+from db.models import _CalendarSeriesModel
+from dto import (
+    CalendarSeriesDTO, AddCalendarSeriesDTO, CalendarSeriesIdDTO, CalendarSeriesExceptionDTO,
+    CalendarSeriesExceptionUpdateDTO, CalendarSeriesOccurrenceIdDTO
+)
+
+class CalendarSeriesController(Controller):
+    # Recurring notes, their occurrences show up in GET /calendar/range
+    path = "/calendar/series"
+    dependencies = {
+        "repo": Provide(lambda: CalendarSeriesRepository(_CalendarSeriesModel), sync_to_thread=False),
+    }
+
+    @post("/add", tags=["Calendar series"])
+    async def add_calendar_series(self, data: AddCalendarSeriesDTO, repo: CalendarSeriesRepository) -> CalendarSeriesDTO:
+        return await repo.add(
+            data
+        )
+
+    @post("/get", tags=["Calendar series"])
+    async def get_calendar_series(self, data: CalendarSeriesIdDTO, repo: CalendarSeriesRepository) -> CalendarSeriesDTO:
+        series = await repo.get(
+            data.id
+        )
+        if series is None:
+            raise NotFoundException("Calendar series not found")
+        return series
+
+    @delete("/delete", tags=["Calendar series"], status_code=200)
+    async def delete_calendar_series(self, data: CalendarSeriesIdDTO, repo: CalendarSeriesRepository) -> CalendarSeriesDTO:
+        series = await repo.delete(
+            data.id
+        )
+        if series is None:
+            raise NotFoundException("Calendar series not found")
+        return series
+
+    @put("/exception", tags=["Calendar series"])
+    async def set_calendar_series_exception(
+            self,
+            data: CalendarSeriesExceptionUpdateDTO,
+            repo: CalendarSeriesRepository
+    ) -> CalendarSeriesExceptionDTO:
+        # Cancels one occurrence (cancelled=true) or moves/renames it (date, title, note)
+        exception = await repo.set_exception(
+            data
+        )
+        if exception is None:
+            raise NotFoundException("Calendar series not found")
+        return exception
+
+    @delete("/exception", tags=["Calendar series"], status_code=200)
+    async def delete_calendar_series_exception(
+            self,
+            data: CalendarSeriesOccurrenceIdDTO,
+            repo: CalendarSeriesRepository
+    ) -> CalendarSeriesExceptionDTO:
+        exception = await repo.delete_exception(
+            data.series_id,
+            data.occurrence
+        )
+        if exception is None:
+            raise NotFoundException("Calendar series exception not found")
+        return exception
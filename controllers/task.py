@@ -1,63 +1,194 @@
-from litestar import Controller, post, delete, put
+import typing
+from litestar import Controller, Request, post, delete, put, get
 from litestar.di import Provide
+from litestar.params import Parameter
+from litestar.datastructures import CacheControlHeader
+from litestar.enums import MediaType
+from litestar.exceptions import NotFoundException
+from litestar.openapi import ResponseSpec
+from litestar.response import Response
+from litestar.status_codes import HTTP_304_NOT_MODIFIED
 from repository import TaskRepository
-from dto import TaskDTO, AddTaskDTO, TaskUpdateDTO
-from pydantic import BaseModel, Field
+from dto import (
+    TaskDTO, AddTaskDTO, TaskIdDTO, TaskIdsDTO, TaskUpdateDTO, TaskPageDTO, TaskBulkResultDTO, TaskSearchPageDTO,
+    TaskImportDTO, ImportResultDTO
+)
+from core.settings import settings
+from repository.transfer import Transfer
+from core.etag import ETag
+from core.streaming import ClosingStream
 from db.models import _TaskModel
 
-class TaskAdd(BaseModel):
-    title: str = "New task"
-    description: str
-
-class TaskGet(BaseModel):
-    id: int = Field(
-        gt=0
-    )
-
-class TaskDel(BaseModel):
-    id: int = Field(
-        gt=0
-    )
-
-class TaskUpdate(BaseModel):
-    id: int = Field(
-        gt=0
-    )
-    title: str
-    description: str
-    done: bool
-
 class TaskController(Controller):
     path = "/tasks"
     dependencies = {
         "repo": Provide(lambda: TaskRepository(_TaskModel), sync_to_thread=False),
     }
 
+    @get("/", tags=["Tasks"], responses={200: ResponseSpec(data_container=TaskPageDTO, description="A page of tasks")})
+    async def list_tasks(
+            self,
+            repo: TaskRepository,
+            cursor: str | None = None,
+            limit: int = Parameter(default=settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+            done: bool | None = None,
+            title_prefix: str | None = None
+    ) -> Response[bytes]:
+        # Records are encoded straight to JSON, the response spec keeps the documented schema
+        return Response(
+            await repo.list_json(cursor=cursor, limit=limit, done=done, title_prefix=title_prefix),
+            media_type=MediaType.JSON
+        )
+
+    @get("/stream", tags=["Tasks"], opt={"admission": "bulk"})
+    async def stream_tasks(
+            self,
+            repo: TaskRepository,
+            done: bool | None = None,
+            title_prefix: str | None = None
+    ) -> ClosingStream:
+        return ClosingStream(repo.stream_json(done=done, title_prefix=title_prefix), media_type="application/x-ndjson")
+
+    @get("/export", tags=["Tasks"], opt={"admission": "bulk"})
+    async def export_tasks(
+            self,
+            repo: TaskRepository,
+            format_: typing.Literal["ndjson", "csv"] = Parameter(query="format", default="ndjson"),
+            compression: typing.Literal["gzip"] | None = None
+    ) -> ClosingStream:
+        # Every row of the tenant: NDJSON from a server-side cursor, CSV from COPY ... TO STDOUT
+        chunks = repo.stream_json() if format_ == "ndjson" else repo.export_csv()
+        if compression == "gzip":
+            chunks = Transfer.gzip(chunks)
+        return ClosingStream(
+            chunks,
+            media_type=Transfer.media_type(format_, compression),
+            headers={
+                "Content-Disposition": f'attachment; filename="{Transfer.filename("tasks", format_, compression)}"'
+            }
+        )
+
+    @post("/import", tags=["Tasks"], opt={"admission": "bulk"}, request_max_body_size=None)
+    async def import_tasks(
+            self,
+            request: Request,
+            repo: TaskRepository,
+            format_: typing.Literal["ndjson", "csv"] = Parameter(query="format", default="ndjson"),
+            compression: typing.Literal["gzip"] | None = None,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> ImportResultDTO:
+        # The body is parsed as it arrives and loaded chunk_size rows at a time, export files import as is
+        if compression is None and request.headers.get("Content-Encoding") == "gzip":
+            compression = "gzip"
+        return await repo.import_records(
+            Transfer.records(request.stream(), TaskImportDTO, format_, compression),
+            chunk_size=chunk_size
+        )
+
+    @get("/search", tags=["Tasks"])
+    async def search_tasks(
+            self,
+            repo: TaskRepository,
+            q: str = Parameter(min_length=1, max_length=256),
+            mode: typing.Literal["fts", "prefix"] = "fts",
+            cursor: str | None = None,
+            limit: int = Parameter(default=settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE)
+    ) -> TaskSearchPageDTO:
+        # fts: ranked full-text search with snippets and a keyset cursor, prefix: title autocomplete by trigrams
+        if mode == "prefix":
+            return await repo.autocomplete(q, limit=limit)
+        return await repo.search(q, cursor=cursor, limit=limit)
+
+    @get("/{task_id:int}", tags=["Tasks"], cache_control=CacheControlHeader(no_cache=True))
+    async def read_task(
+            self,
+            repo: TaskRepository,
+            task_id: int = Parameter(gt=0),
+            if_none_match: str | None = Parameter(header="If-None-Match", default=None)
+    ) -> Response[TaskDTO]:
+        # Revalidation only reads the version column, the row itself is fetched (or taken from the cache) on a miss
+        version = None
+        if if_none_match is not None:
+            version = await repo.version(task_id)
+            if ETag.matches(if_none_match, version, weak=True):
+                return Response(None, status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": ETag.of(version)})
+        task = await repo.get(task_id, min_version=version)
+        if task is None:
+            raise NotFoundException("Task not found")
+        return Response(task, headers={"ETag": ETag.of(task["version"])})
+
     @post("/add", tags=["Tasks"])
-    async def add_task(self, data: TaskAdd, repo: TaskRepository) -> TaskDTO:
+    async def add_task(self, data: AddTaskDTO, repo: TaskRepository) -> TaskDTO:
         return await repo.add(
-            AddTaskDTO(
-                title=data.title,
-                description=data.description,
-            )
+            data
         )
 
     @post("/get", tags=["Tasks"])
-    async def get_task(self, data: TaskGet, repo: TaskRepository) -> TaskDTO:
-        return await repo.get(
+    async def get_task(self, data: TaskIdDTO, repo: TaskRepository) -> TaskDTO:
+        task = await repo.get(
             data.id
         )
+        if task is None:
+            raise NotFoundException("Task not found")
+        return task
 
     @delete("/delete", tags=["Tasks"], status_code=200)
-    async def delete_task(self, data: TaskDel, repo: TaskRepository) -> TaskDTO:
-        return await repo.delete(
+    async def delete_task(self, data: TaskIdDTO, repo: TaskRepository) -> TaskDTO:
+        task = await repo.delete(
             data.id
         )
+        if task is None:
+            raise NotFoundException("Task not found")
+        return task
 
     @put("/update", tags=["Tasks"])
-    async def update_task(self, data: TaskUpdate, repo: TaskRepository) -> TaskDTO:
-        return await repo.update(
-                TaskUpdateDTO(
-                    data.id, data.title, data.description, data.done
-                )
-        )
\ No newline at end of file
+    async def update_task(
+            self,
+            data: TaskUpdateDTO,
+            repo: TaskRepository,
+            if_match: str | None = Parameter(header="If-Match", default=None)
+    ) -> Response[TaskDTO]:
+        # Optimistic concurrency: 412 when the row changed since the client read the ETag it sends
+        task = await repo.update(
+            data,
+            versions=None if if_match is None or ETag.is_any(if_match) else ETag.versions(if_match)
+        )
+        if task is None:
+            raise NotFoundException("Task not found")
+        return Response(task, headers={"ETag": ETag.of(task["version"])})
+
+    @post("/bulk", tags=["Tasks"], opt={"admission": "bulk"})
+    async def bulk_add_tasks(
+            self,
+            data: list[AddTaskDTO],
+            repo: TaskRepository,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> list[TaskBulkResultDTO]:
+        return await repo.bulk_add(
+            data,
+            chunk_size=chunk_size
+        )
+
+    @put("/bulk", tags=["Tasks"], opt={"admission": "bulk"})
+    async def bulk_update_tasks(
+            self,
+            data: list[TaskUpdateDTO],
+            repo: TaskRepository,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> list[TaskBulkResultDTO]:
+        return await repo.bulk_update(
+            data,
+            chunk_size=chunk_size
+        )
+
+    @delete("/bulk", tags=["Tasks"], opt={"admission": "bulk"}, status_code=200)
+    async def bulk_delete_tasks(
+            self,
+            data: TaskIdsDTO,
+            repo: TaskRepository,
+            chunk_size: int = Parameter(default=settings.BULK_CHUNK_SIZE, ge=1, le=settings.MAX_BULK_CHUNK_SIZE)
+    ) -> list[TaskBulkResultDTO]:
+        return await repo.bulk_delete(
+            data.ids,
+            chunk_size=chunk_size
+        )
@@ -0,0 +1,215 @@
+import asyncio
+import collections
+import math
+import time
+import typing
+from litestar.enums import ScopeType
+from litestar.exceptions import TooManyRequestsException, ServiceUnavailableException
+from litestar.middleware import ASGIMiddleware
+from litestar.types import ASGIApp, Receive, Scope, Send
+from core.settings import settings
+from core.metrics import Histogram
+
+__all__ = (
+    "Admission",
+    "AdmissionMiddleware",
+    "TokenBucket",
+    "PRIORITIES",
+)
+
+# Route classes by priority, a handler picks its own with opt={"admission": ...}; GET/HEAD default to "read",
+# other methods to "write". "exempt" routes (health, metrics, long-lived streams) skip admission entirely
+PRIORITIES: typing.Final[tuple[str, ...]] = ("read", "write", "bulk")
+EXEMPT: typing.Final[str] = "exempt"
+READ_METHODS: typing.Final[frozenset[str]] = frozenset({"GET", "HEAD", "OPTIONS"})
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float) -> None:
+        self.tokens: float = burst
+        self.updated: float = time.monotonic()
+
+    def take(self, rate: float, burst: float) -> float:
+        # 0 when a token was taken, otherwise the seconds until the next one
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class Admission:
+    # Requests only reach the pool through a bounded number of permits sized after its connections; a request
+    # that can't get one within ADMISSION_QUEUE_TIMEOUT (or finds ADMISSION_MAX_QUEUE of its class waiting) is shed
+    # with 503 instead of piling up on pool.acquire(). Writes may hold at most ADMISSION_WRITE_SHARE of the
+    # permits and bulk routes ADMISSION_BULK_SHARE, so reads keep flowing during write storms, and freed permits
+    # go to waiting reads first
+    MAX_CLIENTS: typing.ClassVar[int] = 100000
+
+    in_flight: typing.ClassVar[dict[str, int]] = dict.fromkeys(PRIORITIES, 0)
+    _waiters: typing.ClassVar[dict[str, collections.deque[asyncio.Future]]] = {
+        priority: collections.deque() for priority in PRIORITIES
+    }
+    _buckets: typing.ClassVar[collections.OrderedDict[str, TokenBucket]] = collections.OrderedDict()
+    admitted: typing.ClassVar[dict[str, int]] = dict.fromkeys(PRIORITIES, 0)
+    rejected: typing.ClassVar[dict[tuple[str, str], int]] = collections.defaultdict(int)
+    wait_seconds: typing.ClassVar[Histogram] = Histogram()
+
+    @staticmethod
+    def capacity() -> int:
+        # Every connection of the primary and replica pools, ADMISSION_PER_CONNECTION requests each
+        if settings.ADMISSION_CONCURRENCY is not None:
+            return settings.ADMISSION_CONCURRENCY
+        connections = settings.MAX_POOL * (1 + len(settings.REPLICA_DSNS))
+        return max(1, math.ceil(connections * settings.ADMISSION_PER_CONNECTION))
+
+    @classmethod
+    def limits(cls) -> dict[str, int]:
+        capacity = cls.capacity()
+        return {
+            "read": capacity,
+            "write": max(1, math.floor(capacity * settings.ADMISSION_WRITE_SHARE)),
+            "bulk": max(1, math.floor(capacity * settings.ADMISSION_BULK_SHARE)),
+        }
+
+    @classmethod
+    def _held(cls, priority: str) -> int:
+        # Permits counted against a class's limit: its own and those of the classes below it
+        return sum(cls.in_flight[other] for other in PRIORITIES[PRIORITIES.index(priority):])
+
+    @classmethod
+    def _can_start(cls, priority: str, limits: dict[str, int]) -> bool:
+        return sum(cls.in_flight.values()) < limits["read"] and cls._held(priority) < limits[priority]
+
+    @classmethod
+    def rate_limit(cls, client: str) -> None:
+        if settings.RATE_LIMIT_PER_SECOND is None:
+            return
+        bucket = cls._buckets.get(client)
+        if bucket is None:
+            bucket = cls._buckets[client] = TokenBucket(settings.RATE_LIMIT_BURST)
+            if len(cls._buckets) > cls.MAX_CLIENTS:
+                cls._buckets.popitem(last=False)
+        cls._buckets.move_to_end(client)
+        wait = bucket.take(settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST)
+        if wait:
+            cls.rejected[("rate_limited", "")] += 1
+            raise TooManyRequestsException(
+                detail="Rate limit exceeded", headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+    @classmethod
+    def _shed(cls, reason: str, priority: str) -> ServiceUnavailableException:
+        cls.rejected[(reason, priority)] += 1
+        return ServiceUnavailableException(
+            detail="Server is overloaded, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(settings.ADMISSION_RETRY_AFTER)))}
+        )
+
+    @classmethod
+    async def acquire(cls, priority: str) -> None:
+        limits = cls.limits()
+        waiters = cls._waiters[priority]
+        # Nobody of this class is queued ahead, so starting now doesn't overtake anyone
+        if not waiters and cls._can_start(priority, limits):
+            cls.in_flight[priority] += 1
+            cls.admitted[priority] += 1
+            return
+        # Per class, queued writes don't take the places of reads
+        if len(waiters) >= settings.ADMISSION_MAX_QUEUE:
+            raise cls._shed("queue_full", priority)
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        started = time.perf_counter()
+        try:
+            # The permit is handed over by _wake_next, already counted in in_flight
+            await asyncio.wait_for(asyncio.shield(future), settings.ADMISSION_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Handed a permit just as the deadline passed, keep it
+                pass
+            else:
+                future.cancel()
+                raise cls._shed("timeout", priority)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                cls.release(priority)
+            else:
+                future.cancel()
+            raise
+        finally:
+            if future in waiters:
+                waiters.remove(future)
+        cls.admitted[priority] += 1
+        cls.wait_seconds.observe(time.perf_counter() - started)
+
+    @classmethod
+    def release(cls, priority: str) -> None:
+        cls.in_flight[priority] -= 1
+        cls._wake_next()
+
+    @classmethod
+    def _wake_next(cls) -> None:
+        limits = cls.limits()
+        for priority in PRIORITIES:
+            waiters = cls._waiters[priority]
+            while waiters and cls._can_start(priority, limits):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                cls.in_flight[priority] += 1
+                future.set_result(None)
+
+    @classmethod
+    def stats(cls) -> dict[str, typing.Any]:
+        return {
+            "enabled": settings.ADMISSION_ENABLED,
+            "limits": cls.limits(),
+            "in_flight": dict(cls.in_flight),
+            "queued": {priority: len(waiters) for priority, waiters in cls._waiters.items()},
+            "admitted": dict(cls.admitted),
+            "rejected": [
+                {"reason": reason, "priority": priority or None, "count": count}
+                for (reason, priority), count in sorted(cls.rejected.items())
+            ],
+            "rate_limited_clients": len(cls._buckets),
+            "wait_seconds": cls.wait_seconds.snapshot(),
+        }
+
+
+class AdmissionMiddleware(ASGIMiddleware):
+    # Rate limits per client (RATE_LIMIT_KEY_HEADER, else the client address) with 429, then admits the request
+    # through Admission with 503 and Retry-After when the service is saturated
+    scopes = (ScopeType.HTTP,)
+
+    @staticmethod
+    def priority(scope: Scope) -> str:
+        handler = scope.get("route_handler")
+        priority = handler.opt.get("admission") if handler is not None else None
+        if priority is not None:
+            return priority
+        return "read" if scope["method"] in READ_METHODS else "write"
+
+    @staticmethod
+    def client(scope: Scope) -> str:
+        header = settings.RATE_LIMIT_KEY_HEADER.lower().encode()
+        key = next((value for name, value in scope["headers"] if name == header), None)
+        if key is not None:
+            return "key:" + key.decode("latin-1")
+        client = scope.get("client")
+        return "addr:" + (client[0] if client else "unknown")
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send, next_app: ASGIApp) -> None:
+        priority = self.priority(scope)
+        if priority == EXEMPT:
+            await next_app(scope, receive, send)
+            return
+        Admission.rate_limit(self.client(scope))
+        await Admission.acquire(priority)
+        try:
+            await next_app(scope, receive, send)
+        finally:
+            Admission.release(priority)
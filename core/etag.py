@@ -0,0 +1,34 @@
+__all__ = (
+    "ETag",
+)
+
+class ETag:
+    # Strong entity tags made of the row version, the URL already identifies the row
+
+    @staticmethod
+    def of(version: int) -> str:
+        return f'"{version}"'
+
+    @staticmethod
+    def is_any(header: str | None) -> bool:
+        return header is not None and header.strip() == "*"
+
+    @staticmethod
+    def versions(header: str | None, weak: bool = False) -> list[int]:
+        # If-None-Match compares weakly (W/"3" matches "3"), If-Match strongly (W/ tags never match)
+        returning = []
+        for tag in (header or "").split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                if not weak:
+                    continue
+                tag = tag[2:]
+            if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+                returning.append(int(tag[1:-1]))
+        return returning
+
+    @classmethod
+    def matches(cls, header: str | None, version: int | None, weak: bool = False) -> bool:
+        if version is None:
+            return False
+        return cls.is_any(header) or version in cls.versions(header, weak)
@@ -2,8 +2,10 @@ from litestar.connection import Request
 from litestar.response import Response
 from litestar.status_codes import (
     HTTP_409_CONFLICT,
+    HTTP_412_PRECONDITION_FAILED,
     HTTP_400_BAD_REQUEST,
     HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 from asyncpg.exceptions import (
     UniqueViolationError,
@@ -11,6 +13,30 @@ from asyncpg.exceptions import (
     PostgresError,
 )
 
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class VersionConflictError(Exception):
+    pass
+
+
+class MissingTenantError(LookupError):
+    pass
+
+
+class InvalidRecurrenceError(ValueError):
+    pass
+
+
+class ChangeFeedUnavailableError(Exception):
+    pass
+
+
+class InvalidImportError(ValueError):
+    pass
+
 def unique_violation_handler(request: Request, exc: UniqueViolationError) -> Response:
     return Response(
         content={"detail": "Unique constraint violation."},
@@ -31,3 +57,44 @@ def postgres_error_handler(request: Request, exc: PostgresError) -> Response:
         status_code=HTTP_500_INTERNAL_SERVER_ERROR,
     )
 
+
+def invalid_cursor_handler(request: Request, exc: InvalidCursorError) -> Response:
+    return Response(
+        content={"detail": "Invalid pagination cursor."},
+        status_code=HTTP_400_BAD_REQUEST,
+    )
+
+
+def version_conflict_handler(request: Request, exc: VersionConflictError) -> Response:
+    return Response(
+        content={"detail": "Resource was modified, If-Match does not match its current ETag."},
+        status_code=HTTP_412_PRECONDITION_FAILED,
+    )
+
+
+def missing_tenant_handler(request: Request, exc: MissingTenantError) -> Response:
+    return Response(
+        content={"detail": str(exc)},
+        status_code=HTTP_400_BAD_REQUEST,
+    )
+
+
+def invalid_recurrence_handler(request: Request, exc: InvalidRecurrenceError) -> Response:
+    return Response(
+        content={"detail": str(exc)},
+        status_code=HTTP_400_BAD_REQUEST,
+    )
+
+
+def change_feed_unavailable_handler(request: Request, exc: ChangeFeedUnavailableError) -> Response:
+    return Response(
+        content={"detail": str(exc)},
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+def invalid_import_handler(request: Request, exc: InvalidImportError) -> Response:
+    return Response(
+        content={"detail": str(exc)},
+        status_code=HTTP_400_BAD_REQUEST,
+    )
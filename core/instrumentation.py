@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import contextvars
+import datetime
+import random
+import time
+import typing
+import asyncpg
+from litestar.enums import ScopeType
+from litestar.exceptions import HTTPException
+from litestar.middleware import ASGIMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+from loguru import logger as log
+from core.settings import settings
+from core.metrics import Histogram, Prometheus, Labels
+from db.manager import AsyncPGPoolManager
+from repository.coalescing import WriteCoalescer
+from repository.scheduler import ReminderScheduler
+from core.admission import Admission, PRIORITIES
+
+__all__ = (
+    "Instrumentation",
+    "MetricsMiddleware",
+)
+
+class RequestStats:
+    __slots__ = ("route", "queries", "seconds")
+
+    def __init__(self, route: str) -> None:
+        self.route: str = route
+        self.queries: int = 0
+        self.seconds: float = 0.0
+
+
+# Query totals of the current (sampled) request, asyncpg runs query loggers in a copy of the caller's context
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+class Instrumentation:
+    QUERY_BUCKETS: typing.ClassVar[tuple[float, ...]] = (1, 2, 3, 5, 10, 20, 50, 100)
+
+    route_seconds: typing.ClassVar[dict[Labels, Histogram]] = {}
+    responses: typing.ClassVar[collections.Counter[Labels]] = collections.Counter()
+    request_queries: typing.ClassVar[Histogram] = Histogram(QUERY_BUCKETS)
+    request_query_seconds: typing.ClassVar[Histogram] = Histogram()
+    queries_total: typing.ClassVar[int] = 0
+    query_errors: typing.ClassVar[int] = 0
+    query_seconds: typing.ClassVar[float] = 0.0
+    slow_queries_total: typing.ClassVar[int] = 0
+    slow_queries: typing.ClassVar[collections.deque[dict[str, typing.Any]]] = collections.deque(
+        maxlen=settings.SLOW_QUERY_SAMPLES
+    )
+
+    @classmethod
+    def observe_request(cls, method: str, route: str, status: int, seconds: float) -> None:
+        labels = (("method", method), ("route", route))
+        histogram = cls.route_seconds.get(labels)
+        if histogram is None:
+            histogram = cls.route_seconds[labels] = Histogram()
+        histogram.observe(seconds)
+        cls.responses[(*labels, ("status", str(status)))] += 1
+
+    @classmethod
+    def observe_query(cls, record: asyncpg.connection.LoggedQuery) -> None:
+        # Registered with AsyncPGPoolManager.add_query_logger, runs once per statement sent
+        cls.queries_total += 1
+        cls.query_seconds += record.elapsed
+        if record.exception is not None:
+            cls.query_errors += 1
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += record.elapsed
+        if record.elapsed >= settings.SLOW_QUERY_SECONDS:
+            cls.slow_queries_total += 1
+            sample = {
+                "at": datetime.datetime.now(datetime.UTC).isoformat(timespec="milliseconds"),
+                "route": stats.route if stats is not None else None,
+                "seconds": round(record.elapsed, 6),
+                "query": cls.normalize(record.query),
+                # Parameters can hold user data, only their types are kept
+                "params": [type(arg).__name__ for arg in record.args or ()],
+                "error": type(record.exception).__name__ if record.exception is not None else None,
+            }
+            cls.slow_queries.append(sample)
+            log.warning(f"Slow query ({sample['seconds']}s, route={sample['route']}): {sample['query']}")
+
+    @staticmethod
+    def normalize(query: str, limit: int = 2000) -> str:
+        # Repository SQL only takes values as $n parameters, whitespace is collapsed for the log
+        query = " ".join(query.split())
+        return query if len(query) <= limit else query[:limit] + "..."
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.route_seconds.clear()
+        cls.responses.clear()
+        cls.request_queries = Histogram(cls.QUERY_BUCKETS)
+        cls.request_query_seconds = Histogram()
+        cls.queries_total = cls.query_errors = cls.slow_queries_total = 0
+        cls.query_seconds = 0.0
+        cls.slow_queries.clear()
+
+    @classmethod
+    def render(cls, mgr: AsyncPGPoolManager) -> str:
+        pool = mgr.stats()
+        coalescers = WriteCoalescer.coalescers()
+        lines = [
+            *Prometheus.histogram(
+                "http_request_duration_seconds", "Request latency by route", cls.route_seconds
+            ),
+            *Prometheus.scalar(
+                "counter", "http_responses_total", "Responses by route and status", cls.responses
+            ),
+            *Prometheus.histogram(
+                "http_request_db_queries", "Statements sent per sampled request", {(): cls.request_queries}
+            ),
+            *Prometheus.histogram(
+                "http_request_db_seconds", "Time spent in statements per sampled request",
+                {(): cls.request_query_seconds}
+            ),
+            *Prometheus.scalar("counter", "db_queries_total", "Statements sent", {(): cls.queries_total}),
+            *Prometheus.scalar("counter", "db_query_errors_total", "Statements that failed", {(): cls.query_errors}),
+            *Prometheus.scalar(
+                "counter", "db_query_seconds_total", "Time spent in statements", {(): round(cls.query_seconds, 6)}
+            ),
+            *Prometheus.scalar(
+                "counter", "db_slow_queries_total", "Statements slower than SLOW_QUERY_SECONDS",
+                {(): cls.slow_queries_total}
+            ),
+            *Prometheus.scalar("gauge", "db_pool_size", "Open pool connections", {(): pool["size"]}),
+            *Prometheus.scalar("gauge", "db_pool_idle", "Idle pool connections", {(): pool["idle"]}),
+            *Prometheus.scalar(
+                "counter", "db_pool_acquire_timeouts_total", "Pool acquires that timed out",
+                {(): pool["acquire_timeouts"]}
+            ),
+            *Prometheus.histogram(
+                "db_pool_acquire_wait_seconds", "Time waited for a pool connection", {(): mgr.acquire_wait}
+            ),
+            *Prometheus.scalar(
+                "counter", "db_reads_total",
+                "Read-only scopes by where they ran (replica, primary pinned after a write, primary fallback)",
+                {
+                    (("target", "replica"),): pool["replica_reads"],
+                    (("target", "pinned"),): pool["pinned_reads"],
+                    (("target", "fallback"),): pool["fallback_reads"],
+                }
+            ),
+            *Prometheus.scalar(
+                "gauge", "db_replica_healthy", "1 while a replica takes reads",
+                {(("replica", replica["name"]),): int(replica["healthy"]) for replica in pool["replicas"]}
+            ),
+            *Prometheus.scalar(
+                "gauge", "db_replica_lag_seconds", "Replay lag at the last health check",
+                {
+                    (("replica", replica["name"]),): replica["lag_seconds"]
+                    for replica in pool["replicas"] if replica["lag_seconds"] is not None
+                }
+            ),
+            # Coalescing ratio: rate(db_coalesced_updates_total) / rate(db_coalesced_rows_total)
+            *Prometheus.scalar(
+                "counter", "db_coalesced_updates_total", "Updates submitted to the write coalescer",
+                {(("table", coalescer.name),): coalescer.submitted for coalescer in coalescers}
+            ),
+            *Prometheus.scalar(
+                "counter", "db_coalesced_rows_total", "Rows written by coalesced batches",
+                {(("table", coalescer.name),): coalescer.written for coalescer in coalescers}
+            ),
+            *Prometheus.histogram(
+                "db_coalesce_batch_rows", "Rows per coalesced batch",
+                {(("table", coalescer.name),): coalescer.batch_rows for coalescer in coalescers}
+            ),
+            *Prometheus.histogram(
+                "db_coalesce_flush_seconds", "Time from the first update of a batch to its commit",
+                {(("table", coalescer.name),): coalescer.flush_seconds for coalescer in coalescers}
+            ),
+            *Prometheus.scalar(
+                "counter", "reminders_total", "Claimed reminders by outcome",
+                {
+                    (("outcome", "delivered"),): ReminderScheduler.delivered,
+                    (("outcome", "retried"),): ReminderScheduler.retried,
+                    (("outcome", "given_up"),): ReminderScheduler.given_up,
+                    (("outcome", "orphaned"),): ReminderScheduler.orphaned,
+                }
+            ),
+            *Prometheus.scalar(
+                "gauge", "reminders_scheduled", "Reminders of the current window waiting in memory",
+                {(): ReminderScheduler.stats()["scheduled"]}
+            ),
+            *Prometheus.scalar(
+                "gauge", "admission_in_flight", "Admitted requests in progress by priority",
+                {(("priority", priority),): Admission.in_flight[priority] for priority in PRIORITIES}
+            ),
+            *Prometheus.scalar(
+                "counter", "admission_rejected_total", "Requests rejected with 429 (rate_limited) or 503 (queue_full, timeout)",
+                {
+                    (("reason", reason), *((("priority", priority),) if priority else ())): count
+                    for (reason, priority), count in Admission.rejected.items()
+                }
+            ),
+            *Prometheus.histogram(
+                "admission_wait_seconds", "Time queued requests waited for a permit", {(): Admission.wait_seconds}
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware(ASGIMiddleware):
+    # Times every request by route template, counts and times the statements of a METRICS_SAMPLE_RATE share of them
+    scopes = (ScopeType.HTTP,)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send, next_app: ASGIApp) -> None:
+        route = scope.get("path_template", scope["path"])
+        status = 500
+        stats = RequestStats(route) if random.random() < settings.METRICS_SAMPLE_RATE else None
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await next_app(scope, receive, send_wrapper)
+        except HTTPException as exc:
+            status = exc.status_code
+            raise
+        finally:
+            Instrumentation.observe_request(scope["method"], route, status, time.perf_counter() - started)
+            _request_stats.reset(token)
+            if stats is not None:
+                # Query loggers of the last statements are scheduled with call_soon, let them run first
+                await asyncio.sleep(0)
+                Instrumentation.request_queries.observe(stats.queries)
+                Instrumentation.request_query_seconds.observe(stats.seconds)
@@ -1,6 +1,14 @@
 from db.manager import AsyncPGPoolManager
-from db.models import BaseAbstractModel
+from db.models import BaseAbstractModel, _TaskModel, _CalendarNoteModel, _CalendarSeriesModel, _CalendarReminderModel
 from db.config import DBConfig
+from db.migrations import Migrator
+from repository import TaskRepository, CalendarNoteRepository, CalendarSeriesRepository, CalendarReminderRepository
+from core.settings import settings
+from core.instrumentation import Instrumentation
+from db.changes import ChangeFeed
+from repository.coalescing import WriteCoalescer
+from repository.scheduler import ReminderScheduler
+from repository.cache import RepositoryCache
 import pathlib
 
 __all__ = (
@@ -10,44 +18,63 @@ __all__ = (
 class ASGILifespan:
 
     @staticmethod
-    async def startup() -> None:
+    def configure() -> None:
+        DBConfig.clear_extensions()
         DBConfig.new_extension(
             "uuid-ossp"
         )
+        DBConfig.new_extension(
+            "pg_trgm"
+        )
 
         DBConfig.set_sql_dir(
             pathlib.Path(__file__).resolve().parent.parent / "sql"
         )
 
+    @staticmethod
+    async def startup() -> None:
+        ASGILifespan.configure()
+
+        # Statements are registered before the pool exists so every new connection prepares them in init
+        TaskRepository.register(_TaskModel)
+        CalendarNoteRepository.register(_CalendarNoteModel)
+        CalendarSeriesRepository.register(_CalendarSeriesModel)
+        CalendarReminderRepository.register(_CalendarReminderModel)
+
         mgr = await AsyncPGPoolManager.instance()
+        if settings.METRICS_ENABLED:
+            mgr.add_query_logger(Instrumentation.observe_query)
 
-        # Pre init hook
-        await mgr.run_pre_init_hook()
+        # Versioned migrations from sql/migrations, a single fingerprint query when nothing changed
+        migrator = Migrator(mgr)
+        await migrator.sync(BaseAbstractModel.models())
+        await migrator.ensure_partitions(BaseAbstractModel.models())
 
-        # Tables creation
-        await mgr.create_tables(
-            tables=BaseAbstractModel.tables(),
-            _models=BaseAbstractModel.models()
-        )
+        if settings.POOL_WARMUP:
+            await mgr.warmup()
 
-        # Post init hook
-        await mgr.run_post_init_hook(
-            tables=BaseAbstractModel.tables(),
-            _models=BaseAbstractModel.models()
-        )
+        # The LISTEN connection of the change feed, outside the pool; it also carries cache invalidations
+        # between worker processes
+        if settings.CHANGES_ENABLED:
+            if settings.CACHE_ENABLED:
+                ChangeFeed.listen(RepositoryCache.on_change)
+            await ChangeFeed.start()
+
+        if settings.REMINDERS_ENABLED:
+            await ReminderScheduler.start()
 
     @staticmethod
     async def shutdown() -> None:
 
-        mgr = await AsyncPGPoolManager.instance()
+        # Undelivered claims are released by their lease
+        await ReminderScheduler.stop()
+        # Queued coalesced writes still need the pool
+        await WriteCoalescer.close_all()
+        await ChangeFeed.stop()
 
-        # Tables dropping
-        await mgr.drop_tables(
-            tables=BaseAbstractModel.tables()
-        )
+        mgr = await AsyncPGPoolManager.instance()
 
-        # After shutdown hook
-        await mgr.run_after_shutdown_hook()
+        await mgr.close()
 
         DBConfig.clear_extensions()
-        DBConfig.unset_sql_dir()
\ No newline at end of file
+        DBConfig.unset_sql_dir()
@@ -0,0 +1,78 @@
+import bisect
+import typing
+
+__all__ = (
+    "Histogram",
+    "Prometheus",
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+class Histogram:
+    DEFAULT_BUCKETS: typing.ClassVar[tuple[float, ...]] = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+    )
+
+    def __init__(self, buckets: typing.Sequence[float] | None = None) -> None:
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict[str, typing.Any]:
+        cumulative = 0
+        buckets: dict[str, int] = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class Prometheus:
+    # Text exposition format 0.0.4, series are keyed by their (name, value) label pairs
+    CONTENT_TYPE: typing.ClassVar[str] = "text/plain; version=0.0.4; charset=utf-8"
+
+    @staticmethod
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    @classmethod
+    def labels(cls, labels: Labels) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{name}="{cls.escape(value)}"' for name, value in labels) + "}"
+
+    @classmethod
+    def scalar(
+            cls,
+            kind: typing.Literal["counter", "gauge"],
+            name: str,
+            help_: str,
+            series: typing.Mapping[Labels, float]
+    ) -> list[str]:
+        lines = [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+        lines.extend(f"{name}{cls.labels(labels)} {value}" for labels, value in series.items())
+        return lines
+
+    @classmethod
+    def histogram(cls, name: str, help_: str, series: typing.Mapping[Labels, Histogram]) -> list[str]:
+        lines = [f"# HELP {name} {help_}", f"# TYPE {name} histogram"]
+        for labels, histogram in series.items():
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{cls.labels((*labels, ('le', str(bound))))} {cumulative}")
+            lines.append(f"{name}_bucket{cls.labels((*labels, ('le', '+Inf')))} {histogram.count}")
+            lines.append(f"{name}_sum{cls.labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{cls.labels(labels)} {histogram.count}")
+        return lines
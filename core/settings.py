@@ -1,3 +1,5 @@
+import typing
+import uuid
 from pydantic import BaseModel
 
 class Settings(BaseModel):
@@ -8,6 +10,89 @@ class Settings(BaseModel):
     PASSWD: str = "passwd"
     MIN_POOL: int = 1
     MAX_POOL: int = 5
+    MAX_INACTIVE_CONNECTION_LIFETIME: float = 300.0
+    POOL_WARMUP: bool = True
+    POOL_HEALTH_TIMEOUT: float = 2.0
+    STATEMENT_CACHE_SIZE: int = 256
+    # Read replicas as postgresql:// DSNs, each with its own pool; read-only UnitOfWork scopes go to a healthy one
+    REPLICA_DSNS: list[str] = []
+    REPLICA_STRATEGY: typing.Literal["round_robin", "least_connections"] = "round_robin"
+    # Replicas replaying further behind than this are ejected until they catch up
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_HEALTH_INTERVAL: float = 5.0
+    # Reads of a tenant stay on the primary for this long after its last write
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Admission control: requests in flight are capped at ADMISSION_PER_CONNECTION per pool connection (primary and
+    # replicas) unless ADMISSION_CONCURRENCY is set; the rest wait up to ADMISSION_QUEUE_TIMEOUT, then get 503
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CONCURRENCY: int | None = None
+    ADMISSION_PER_CONNECTION: float = 2.0
+    # Shares of the permits writes and bulk routes (bulk, import, export, stream) may hold, the rest is for reads
+    ADMISSION_WRITE_SHARE: float = 0.75
+    ADMISSION_BULK_SHARE: float = 0.25
+    ADMISSION_QUEUE_TIMEOUT: float = 1.0
+    # Requests waiting for a permit, per priority class
+    ADMISSION_MAX_QUEUE: int = 1000
+    ADMISSION_RETRY_AFTER: float = 1.0
+    # Token bucket per API key (or client address without the header), None disables rate limiting
+    RATE_LIMIT_PER_SECOND: float | None = None
+    RATE_LIMIT_BURST: float = 20.0
+    RATE_LIMIT_KEY_HEADER: str = "X-API-Key"
+    WRITE_SQL_FILES: bool = False
+    MIGRATIONS_AUTOGENERATE: bool = False
+    PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 500
+    CURSOR_PREFETCH: int = 500
+    MAX_RANGE_DAYS: int = 366
+    MAX_RECURRENCE_COUNT: int = 10000
+    BULK_CHUNK_SIZE: int = 1000
+    MAX_BULK_CHUNK_SIZE: int = 10000
+    # Write-behind for PUT /tasks/update without If-Match: updates of the same row within the window are
+    # coalesced (last write wins) and flushed as one UPDATE ... FROM UNNEST per tenant and batch
+    WRITE_COALESCING: bool = False
+    WRITE_COALESCE_SECONDS: float = 0.005
+    WRITE_COALESCE_MAX_BATCH: int = 500
+    # COPY output chunks buffered per export, a slow client pauses the COPY once they are all queued
+    EXPORT_QUEUE_SIZE: int = 16
+    IMPORT_MAX_LINE_BYTES: int = 1024 * 1024
+    # With several worker processes, entries written elsewhere are invalidated through the change feed; with
+    # CHANGES_ENABLED=False the cache is only coherent within one process (single worker or CACHE_ENABLED=False)
+    CACHE_ENABLED: bool = True
+    CACHE_TTL: float = 30.0
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Rendered .ics events are keyed by note version and never go stale, they only make room for others
+    ICS_CACHE_TTL: float = 24 * 60 * 60.0
+    METRICS_ENABLED: bool = True
+    # Share of requests whose queries are counted and timed, route latency is recorded for every request
+    METRICS_SAMPLE_RATE: float = 1.0
+    SLOW_QUERY_SECONDS: float = 0.1
+    SLOW_QUERY_SAMPLES: int = 100
+    CHANGES_ENABLED: bool = True
+    CHANGES_CHANNEL: str = "changes"
+    # Events buffered per subscriber, a subscriber that falls further behind is sent "resync" instead
+    CHANGES_QUEUE_SIZE: int = 256
+    CHANGES_MAX_SUBSCRIBERS: int = 1000
+    CHANGES_HEARTBEAT_SECONDS: float = 15.0
+    CHANGES_RECONNECT_SECONDS: float = 30.0
+    REMINDERS_ENABLED: bool = True
+    # Sink registered under this name (ReminderSink subclasses): "log" or "memory", the local fake
+    REMINDER_SINK: str = "log"
+    # Pending reminders due within the window are kept in memory (at most REMINDER_PREFETCH), reloaded every poll
+    REMINDER_WINDOW_SECONDS: float = 300.0
+    REMINDER_PREFETCH: int = 10000
+    REMINDER_POLL_SECONDS: float = 30.0
+    REMINDER_BATCH: int = 100
+    # A claimed reminder is not handed to another worker for this long, it must exceed REMINDER_SEND_TIMEOUT
+    REMINDER_LEASE_SECONDS: float = 60.0
+    REMINDER_SEND_TIMEOUT: float = 10.0
+    REMINDER_MAX_ATTEMPTS: int = 5
+    # Backoff of failed deliveries, doubled per attempt
+    REMINDER_RETRY_SECONDS: float = 30.0
+    # The header is trusted as is: only deploy behind a proxy that authenticates the caller and sets (or strips) it
+    TENANT_HEADER: str = "X-Tenant-ID"
+    # Tenant of requests without the header, None (the default) rejects them with 400. A shared fallback tenant
+    # would hand every headerless caller the same rows, only set it for single-tenant deployments
+    DEFAULT_TENANT: uuid.UUID | None = None
 
     @property
     def postgres_url(self) -> str:
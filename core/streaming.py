@@ -0,0 +1,47 @@
+import typing
+from litestar.response import Stream, ServerSentEvent
+from litestar.response.streaming import ASGIStreamingResponse
+from litestar.types import Send
+
+__all__ = (
+    "ClosingStream",
+    "ClosingServerSentEvent",
+    "aclose",
+)
+
+async def aclose(iterator: typing.Any) -> None:
+    # ServerSentEvent wraps the handler's iterator, that one is closed
+    iterator = getattr(iterator, "content_async_iterator", iterator)
+    close = getattr(iterator, "aclose", None)
+    if close is not None:
+        await close()
+
+
+class _ClosingStreamingResponse(ASGIStreamingResponse):
+    __slots__ = ()
+
+    async def _stream(self, send: Send) -> None:
+        # Litestar leaves the iterator suspended when send fails or the client disconnects; repository streams hold
+        # a Unit of Work (and its pool connection) across yield, so they are closed here, in the request's task
+        try:
+            await super()._stream(send)
+        finally:
+            await aclose(self.iterator)
+
+
+class _Closing:
+
+    def to_asgi_response(self, *args: typing.Any, **kwargs: typing.Any) -> ASGIStreamingResponse:
+        response = super().to_asgi_response(*args, **kwargs)
+        response.__class__ = _ClosingStreamingResponse
+        return response
+
+
+class ClosingStream(_Closing, Stream):
+    # Stream whose iterator is closed however the response ends, for iterators holding database resources
+    pass
+
+
+class ClosingServerSentEvent(_Closing, ServerSentEvent):
+    # Same for event streams, e.g. holding a change feed subscription
+    pass
@@ -0,0 +1,65 @@
+import contextlib
+import contextvars
+import typing
+import uuid
+from litestar.exceptions import ValidationException
+from litestar.middleware import ASGIMiddleware
+from litestar.types import ASGIApp, Receive, Scope, Send
+from core.settings import settings
+from core.exceptions import MissingTenantError
+
+__all__ = (
+    "Tenant",
+    "TenantMiddleware",
+)
+
+# Tenant of the current request (or task), every repository statement is scoped by it
+_current_tenant: contextvars.ContextVar[uuid.UUID | None] = contextvars.ContextVar(
+    "current_tenant", default=None
+)
+
+class Tenant:
+
+    @staticmethod
+    def get() -> uuid.UUID | None:
+        return _current_tenant.get()
+
+    @staticmethod
+    def current() -> uuid.UUID:
+        tenant = _current_tenant.get()
+        if tenant is None:
+            raise MissingTenantError("No tenant in the current context")
+        return tenant
+
+    @staticmethod
+    @contextlib.contextmanager
+    def scope(tenant: uuid.UUID) -> typing.Iterator[uuid.UUID]:
+        token = _current_tenant.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current_tenant.reset(token)
+
+
+class TenantMiddleware(ASGIMiddleware):
+    # Reads the tenant from settings.TENANT_HEADER, placeholder for the subject of a verified token once auth lands.
+    # Nothing here authenticates the header, it must be set by an authenticating proxy in front of the app.
+    # Probes, metrics and the OpenAPI schema are tenantless and answer without it
+    exclude_path_pattern = ("^/schema",)
+    exclude_opt_key = "tenantless"
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send, next_app: ASGIApp) -> None:
+        header = settings.TENANT_HEADER.lower().encode()
+        raw = next((value for name, value in scope["headers"] if name == header), None)
+        if raw is None:
+            tenant = settings.DEFAULT_TENANT
+            if tenant is None:
+                raise MissingTenantError(f"Missing {settings.TENANT_HEADER} header")
+        else:
+            try:
+                tenant = uuid.UUID(raw.decode("latin-1"))
+            except ValueError:
+                raise ValidationException(f"Invalid {settings.TENANT_HEADER} header, expected a UUID")
+
+        with Tenant.scope(tenant):
+            await next_app(scope, receive, send)
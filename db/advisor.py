@@ -0,0 +1,80 @@
+import asyncio
+import typing
+from loguru import logger as log
+from db.manager import AsyncPGPoolManager
+
+__all__ = (
+    "IndexAdvisor",
+)
+
+class IndexAdvisor:
+
+    def __init__(self, mgr: AsyncPGPoolManager) -> None:
+        self.mgr: AsyncPGPoolManager = mgr
+        self.log = log
+
+    async def unused(self) -> list[dict[str, typing.Any]]:
+        # Never scanned since the statistics were reset; constraint indexes are kept since they enforce something
+        conn = await self.mgr.acquire()
+        try:
+            rows = await conn.fetch(
+                """
+                SELECT s.relname AS table, s.indexrelname AS index, s.idx_scan AS scans,
+                       pg_relation_size(s.indexrelid) AS size
+                FROM pg_stat_user_indexes AS s
+                JOIN pg_index AS i ON i.indexrelid = s.indexrelid
+                WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+                ORDER BY size DESC;
+                """
+            )
+        finally:
+            await self.mgr.release(conn)
+        return [dict(row) for row in rows]
+
+    async def duplicates(self) -> list[dict[str, typing.Any]]:
+        # Same table, same key columns and operator classes, same expressions and predicate
+        conn = await self.mgr.acquire()
+        try:
+            rows = await conn.fetch(
+                """
+                SELECT i.indrelid::regclass::text AS table,
+                       array_agg(i.indexrelid::regclass::text ORDER BY i.indexrelid) AS indexes,
+                       sum(pg_relation_size(i.indexrelid)) AS size
+                FROM pg_index AS i
+                JOIN pg_class AS c ON c.oid = i.indrelid
+                JOIN pg_namespace AS n ON n.oid = c.relnamespace
+                WHERE n.nspname = current_schema()
+                GROUP BY i.indrelid, i.indkey::text, i.indclass::text,
+                         coalesce(i.indexprs::text, ''), coalesce(i.indpred::text, '')
+                HAVING count(*) > 1
+                ORDER BY size DESC;
+                """
+            )
+        finally:
+            await self.mgr.release(conn)
+        return [dict(row) for row in rows]
+
+    async def report(self) -> dict[str, list[dict[str, typing.Any]]]:
+        return {
+            "unused": await self.unused(),
+            "duplicates": await self.duplicates(),
+        }
+
+
+async def main() -> None:
+    mgr = await AsyncPGPoolManager.instance()
+    try:
+        report = await IndexAdvisor(mgr).report()
+    finally:
+        await mgr.close()
+
+    for row in report["unused"]:
+        print(f"unused     {row['table']}.{row['index']} ({row['size']} bytes, {row['scans']} scans)")
+    for row in report["duplicates"]:
+        print(f"duplicate  {row['table']}: {', '.join(row['indexes'])} ({row['size']} bytes)")
+    if not report["unused"] and not report["duplicates"]:
+        print("No unused or duplicate indexes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,212 @@
+import asyncio
+import typing
+import uuid
+import asyncpg
+import msgspec
+from loguru import logger as log
+from core.settings import settings
+from core.exceptions import ChangeFeedUnavailableError
+
+__all__ = (
+    "ChangeEvent",
+    "ChangeFeed",
+    "Subscription",
+    "RESYNC",
+)
+
+# Sent instead of the events a subscriber missed (its queue overflowed or the LISTEN connection was lost),
+# clients refetch what they display
+RESYNC: typing.Final[str] = "resync"
+
+class ChangeEvent(msgspec.Struct, gc=False):
+    tenant: uuid.UUID
+    table: str
+    op: str
+    id: int
+    version: int | None = None
+
+
+class Subscription:
+    __slots__ = ("tenant", "tables", "queue")
+
+    def __init__(self, tenant: uuid.UUID, tables: typing.Collection[str], size: int) -> None:
+        self.tenant: uuid.UUID = tenant
+        self.tables: frozenset[str] = frozenset(tables)
+        self.queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(maxsize=size)
+
+    def push(self, op: str, payload: str) -> bool:
+        # Never blocks the listener: a full queue is dropped and replaced by a single resync
+        try:
+            self.queue.put_nowait((op, payload))
+            return True
+        except asyncio.QueueFull:
+            self.resync()
+            return False
+
+    def resync(self) -> None:
+        # Queued like any event, so a consumer waiting without a timeout wakes up for it
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait((RESYNC, ""))
+
+    async def get(self, timeout: float | None = None) -> tuple[str, str] | None:
+        # (op, JSON payload), (RESYNC, "") in place of missed events, None when nothing came within timeout
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChangeFeed:
+    # Writes NOTIFY settings.CHANGES_CHANNEL in their own transaction, so events are only delivered once committed.
+    # One LISTEN connection per process, outside the pool (releasing a pool connection UNLISTENs it), fans them out
+    # to the subscribers of the event's tenant
+    PUBLISH: typing.ClassVar[str] = "SELECT pg_notify($1, payload) FROM UNNEST($2::text[]) AS payload;"
+
+    _conn: typing.ClassVar[asyncpg.Connection | None] = None
+    _reconnect: typing.ClassVar[asyncio.Task | None] = None
+    _subscribers: typing.ClassVar[dict[uuid.UUID, set[Subscription]]] = {}
+    # In-process consumers of every event (cache invalidation), called with None when events were missed
+    _listeners: typing.ClassVar[list[typing.Callable[[ChangeEvent | None], None]]] = []
+    _count: typing.ClassVar[int] = 0
+    _encoder: typing.ClassVar[msgspec.json.Encoder] = msgspec.json.Encoder()
+    _decoder: typing.ClassVar[msgspec.json.Decoder[ChangeEvent]] = msgspec.json.Decoder(ChangeEvent)
+    received: typing.ClassVar[int] = 0
+    delivered: typing.ClassVar[int] = 0
+    dropped: typing.ClassVar[int] = 0
+    reconnects: typing.ClassVar[int] = 0
+
+    @classmethod
+    async def publish(
+            cls,
+            conn: asyncpg.Connection,
+            tenant: uuid.UUID,
+            table: str,
+            op: str,
+            rows: typing.Iterable[asyncpg.Record]
+    ) -> None:
+        # One statement for any number of rows, run on the writer's connection inside its transaction
+        payloads = [
+            cls._encoder.encode(ChangeEvent(tenant, table, op, row["id"], row.get("version"))).decode()
+            for row in rows
+        ]
+        if payloads:
+            await conn.execute(cls.PUBLISH, settings.CHANGES_CHANNEL, payloads)
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls._conn is None:
+            await cls._listen()
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._reconnect is not None:
+            cls._reconnect.cancel()
+            cls._reconnect = None
+        conn, cls._conn = cls._conn, None
+        if conn is not None:
+            conn.remove_termination_listener(cls._terminated)
+            await conn.close()
+
+    @classmethod
+    def listen(cls, callback: typing.Callable[[ChangeEvent | None], None]) -> None:
+        if callback not in cls._listeners:
+            cls._listeners.append(callback)
+
+    @classmethod
+    async def _listen(cls) -> None:
+        conn = await asyncpg.connect(
+            user=settings.USER,
+            password=settings.PASSWD,
+            database=settings.DB,
+            host=settings.HOST,
+            port=settings.PORT,
+        )
+        await conn.add_listener(settings.CHANGES_CHANNEL, cls._dispatch)
+        conn.add_termination_listener(cls._terminated)
+        cls._conn = conn
+        log.warning(f"Listening for changes on {settings.CHANGES_CHANNEL!r}")
+
+    @classmethod
+    def _terminated(cls, conn: asyncpg.Connection) -> None:
+        if conn is not cls._conn:
+            return
+        cls._conn = None
+        log.warning("Change feed connection lost, reconnecting...")
+        cls._reconnect = asyncio.get_running_loop().create_task(cls._reconnect_loop())
+
+    @classmethod
+    async def _reconnect_loop(cls) -> None:
+        delay = 0.5
+        while cls._conn is None:
+            try:
+                await cls._listen()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                log.warning(f"Change feed reconnect failed ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.CHANGES_RECONNECT_SECONDS)
+        cls.reconnects += 1
+        cls._reconnect = None
+        # Whatever was notified while disconnected is lost
+        for listener in cls._listeners:
+            listener(None)
+        for subscriptions in cls._subscribers.values():
+            for subscription in subscriptions:
+                subscription.resync()
+
+    @classmethod
+    def _dispatch(cls, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        cls.received += 1
+        if not cls._subscribers and not cls._listeners:
+            return
+        event = cls._decoder.decode(payload)
+        for listener in cls._listeners:
+            listener(event)
+        subscriptions = cls._subscribers.get(event.tenant)
+        if not subscriptions:
+            return
+        for subscription in subscriptions:
+            if subscription.tables and event.table not in subscription.tables:
+                continue
+            if subscription.push(event.op, payload):
+                cls.delivered += 1
+            else:
+                cls.dropped += 1
+
+    @classmethod
+    def check(cls) -> None:
+        # Lets a stream fail with 503 before it starts, subscribe() checks again
+        if cls._conn is None and cls._reconnect is None:
+            raise ChangeFeedUnavailableError("Change feed is not running")
+        if cls._count >= settings.CHANGES_MAX_SUBSCRIBERS:
+            raise ChangeFeedUnavailableError("Too many change feed subscribers")
+
+    @classmethod
+    def subscribe(cls, tenant: uuid.UUID, tables: typing.Collection[str] = ()) -> Subscription:
+        cls.check()
+        subscription = Subscription(tenant, tables, settings.CHANGES_QUEUE_SIZE)
+        cls._subscribers.setdefault(tenant, set()).add(subscription)
+        cls._count += 1
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, subscription: Subscription) -> None:
+        subscriptions = cls._subscribers.get(subscription.tenant)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del cls._subscribers[subscription.tenant]
+        cls._count -= 1
+
+    @classmethod
+    def stats(cls) -> dict[str, typing.Any]:
+        return {
+            "listening": cls._conn is not None,
+            "subscribers": cls._count,
+            "tenants": len(cls._subscribers),
+            "received": cls.received,
+            "delivered": cls.delivered,
+            "dropped": cls.dropped,
+            "reconnects": cls.reconnects,
+        }
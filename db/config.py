@@ -14,6 +14,12 @@ class DBConfig:
     def sql_dir(cls) -> pathlib.Path:
         return cls._sql_dir
 
+    @classmethod
+    def migrations_dir(cls) -> pathlib.Path:
+        path = cls._sql_dir / "migrations"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
     @classmethod
     def unset_sql_dir(cls) -> None:
         cls._sql_dir = None
@@ -1,4 +1,10 @@
+import asyncio
+import datetime
+import itertools
 import textwrap
+import time
+import urllib.parse
+import uuid
 
 import aiofiles
 import asyncpg
@@ -8,45 +14,289 @@ import typing
 from loguru import logger as log
 from db.config import DBConfig
 import db.types as types
+from core.metrics import Histogram
+from db.statements import StatementRegistry, PreparedConnection
+from core.tenant import Tenant
+
+class ReplicaPool:
+    __slots__ = ("dsn", "name", "pool", "healthy", "lag")
+
+    def __init__(self, dsn: str) -> None:
+        self.dsn: str = dsn
+        # host:port/db, the DSN itself may hold a password
+        parts = urllib.parse.urlsplit(dsn)
+        self.name: str = f"{parts.hostname}:{parts.port or 5432}{parts.path}"
+        self.pool: asyncpg.pool.Pool | None = None
+        self.healthy: bool = False
+        self.lag: float | None = None
+
+    @property
+    def in_use(self) -> int:
+        return self.pool.get_size() - self.pool.get_idle_size() if self.pool is not None else 0
+
 
 class AsyncPGPoolManager:
+    # Replay lag of a standby, 0 when it has replayed everything it received (or isn't a standby)
+    REPLICA_LAG_QUERY: typing.ClassVar[str] = textwrap.dedent(
+        """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END::float8;
+        """
+    ).strip()
+
     __instance: typing.ClassVar["AsyncPGPoolManager | None"] = None
 
     def __init__(self) -> None:
         self.pool: asyncpg.pool.Pool | None = None
         self.log = log
+        self._lock = asyncio.Lock()
+        self.acquire_wait = Histogram()
+        self.acquired_total: int = 0
+        self.acquire_timeouts: int = 0
+        # asyncpg query loggers attached to every connection while it is checked out
+        self.query_loggers: set[typing.Callable[[asyncpg.connection.LoggedQuery], None]] = set()
+        self.replicas: list[ReplicaPool] = [ReplicaPool(dsn) for dsn in settings.REPLICA_DSNS]
+        self.replica_reads: int = 0
+        self.fallback_reads: int = 0
+        self.pinned_reads: int = 0
+        self._round_robin = itertools.count()
+        self._leases: dict[asyncpg.Connection, ReplicaPool] = {}
+        # Tenant -> monotonic time until which its reads stay on the primary (read-your-writes)
+        self._pinned: dict[uuid.UUID | None, float] = {}
+        self._monitor_task: asyncio.Task | None = None
 
     @classmethod
     async def instance(cls) -> "AsyncPGPoolManager":
         if not cls.__instance:
             cls.__instance = cls()
-        cls.__instance.pool = await cls.__instance.__create_connection_pool()
+        if cls.__instance.pool is None:
+            await cls.__instance.connect()
         return cls.__instance
 
     @staticmethod
-    async def __create_connection_pool() -> asyncpg.pool.Pool:
-        pool = asyncpg.create_pool(
+    async def __create_connection_pool(dsn: str | None = None) -> asyncpg.pool.Pool:
+        # The primary comes from HOST/PORT/DB/USER/PASSWD, replicas from their DSN
+        target = dict(dsn=dsn) if dsn is not None else dict(
             user=settings.USER,
             password=settings.PASSWD,
             database=settings.DB,
             host=settings.HOST,
             port=settings.PORT,
+        )
+        pool = asyncpg.create_pool(
+            **target,
             min_size=settings.MIN_POOL,
             max_size=settings.MAX_POOL,
+            max_inactive_connection_lifetime=settings.MAX_INACTIVE_CONNECTION_LIFETIME,
+            statement_cache_size=settings.STATEMENT_CACHE_SIZE,
+            connection_class=PreparedConnection,
+            init=StatementRegistry.prepare,
         )
         return await pool
 
+    async def connect(self) -> asyncpg.pool.Pool:
+        async with self._lock:
+            if self.pool is None:
+                self.log.warning(
+                    f"Creating connection pool (min_size={settings.MIN_POOL}, max_size={settings.MAX_POOL})"
+                )
+                self.pool = await self.__create_connection_pool()
+                if self.replicas:
+                    await asyncio.gather(*(self._connect_replica(replica) for replica in self.replicas))
+                    self._monitor_task = asyncio.get_running_loop().create_task(self._monitor_replicas())
+        return self.pool
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._monitor_task is not None:
+                self._monitor_task.cancel()
+                self._monitor_task = None
+            for replica in self.replicas:
+                if replica.pool is not None:
+                    await replica.pool.close()
+                    replica.pool = None
+                    replica.healthy = False
+            if self.pool is not None:
+                self.log.warning("Closing connection pool...")
+                await self.pool.close()
+                self.pool = None
+
+    async def _connect_replica(self, replica: ReplicaPool) -> None:
+        # An unreachable replica doesn't stop startup, it stays ejected and is retried by _monitor_replicas
+        try:
+            self.log.warning(f"Creating replica connection pool {replica.name}")
+            replica.pool = await self.__create_connection_pool(replica.dsn)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+            self.log.warning(f"Replica {replica.name} unavailable: {e!r}")
+            return
+        await self._check_replica(replica)
+
+    async def _check_replica(self, replica: ReplicaPool) -> None:
+        try:
+            conn = await replica.pool.acquire(timeout=settings.POOL_HEALTH_TIMEOUT)
+            try:
+                lag = await conn.fetchval(self.REPLICA_LAG_QUERY, timeout=settings.POOL_HEALTH_TIMEOUT)
+            finally:
+                await replica.pool.release(conn)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            lag = None
+            self.log.warning(f"Replica {replica.name} health check failed: {e!r}")
+        healthy = lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if healthy != replica.healthy:
+            self.log.warning(
+                f"Replica {replica.name} {'admitted' if healthy else 'ejected'} (lag={lag})"
+            )
+        replica.healthy, replica.lag = healthy, lag
+
+    async def _monitor_replicas(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REPLICA_HEALTH_INTERVAL)
+            await asyncio.gather(*(
+                self._check_replica(replica) if replica.pool is not None else self._connect_replica(replica)
+                for replica in self.replicas
+            ))
+            now = time.monotonic()
+            self._pinned = {tenant: until for tenant, until in self._pinned.items() if until > now}
+
+    def wrote(self) -> None:
+        # Called when a read-write scope commits, the tenant's reads go to the primary for a while
+        if self.replicas:
+            self._pinned[Tenant.get()] = time.monotonic() + settings.READ_YOUR_WRITES_SECONDS
+
+    def _route(self) -> ReplicaPool | None:
+        # Replica for a read-only scope, None for the primary
+        if not self.replicas:
+            return None
+        until = self._pinned.get(Tenant.get())
+        if until is not None and until > time.monotonic():
+            self.pinned_reads += 1
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.fallback_reads += 1
+            return None
+        if settings.REPLICA_STRATEGY == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_use)
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    async def warmup(self) -> None:
+        # Touch min_size connections concurrently so the first requests don't pay for the handshake,
+        # statements are prepared again since init may have run before the tables existed
+        results = await asyncio.gather(
+            *(self.acquire() for _ in range(self.pool.get_min_size())), return_exceptions=True
+        )
+        conns = [result for result in results if isinstance(result, asyncpg.Connection)]
+        try:
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+            await asyncio.gather(*(StatementRegistry.prepare(conn) for conn in conns))
+        finally:
+            for conn in conns:
+                await self.release(conn)
+        self.log.warning(f"Warmed up {len(conns)} pool connections")
+
+    async def acquire(self, timeout: float | None = None, readonly: bool = False) -> asyncpg.Connection:
+        pool = self.pool or await self.connect()
+        replica = self._route() if readonly else None
+        started = time.perf_counter()
+        conn = None
+        if replica is not None:
+            try:
+                conn = await replica.pool.acquire(timeout=timeout)
+                self._leases[conn] = replica
+                self.replica_reads += 1
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, asyncio.TimeoutError) as e:
+                # Ejected until the next successful health check, this read falls back to the primary.
+                # A replica that doesn't hand out a connection in time is treated as down too, the primary
+                # gets a timeout of its own rather than what is left of this one
+                self.log.warning(f"Replica {replica.name} failed, ejecting it: {e!r}")
+                replica.healthy = False
+                self.fallback_reads += 1
+        if conn is None:
+            try:
+                conn = await pool.acquire(timeout=timeout)
+            except asyncio.TimeoutError:
+                self.acquire_timeouts += 1
+                raise
+        self.acquire_wait.observe(time.perf_counter() - started)
+        self.acquired_total += 1
+        for callback in self.query_loggers:
+            conn.add_query_logger(callback)
+        return conn
+
+    async def release(self, conn: asyncpg.Connection) -> None:
+        for callback in self.query_loggers:
+            conn.remove_query_logger(callback)
+        replica = self._leases.pop(conn, None)
+        await (replica.pool if replica is not None else self.pool).release(conn)
+
+    def add_query_logger(self, callback: typing.Callable[[asyncpg.connection.LoggedQuery], None]) -> None:
+        self.query_loggers.add(callback)
+
+    def remove_query_logger(self, callback: typing.Callable[[asyncpg.connection.LoggedQuery], None]) -> None:
+        self.query_loggers.discard(callback)
+
+    async def health(self) -> bool:
+        try:
+            conn = await self.acquire(timeout=settings.POOL_HEALTH_TIMEOUT)
+        except (asyncio.TimeoutError, OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            return False
+        try:
+            await conn.fetchval("SELECT 1;", timeout=settings.POOL_HEALTH_TIMEOUT)
+            return True
+        except (asyncio.TimeoutError, OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            return False
+        finally:
+            await self.release(conn)
+
+    def stats(self) -> dict[str, typing.Any]:
+        if self.pool is None:
+            size = idle = 0
+        else:
+            size, idle = self.pool.get_size(), self.pool.get_idle_size()
+        return {
+            "min_size": settings.MIN_POOL,
+            "max_size": settings.MAX_POOL,
+            "size": size,
+            "idle": idle,
+            "acquired": size - idle,
+            "acquired_total": self.acquired_total,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_seconds": self.acquire_wait.snapshot(),
+            "replica_reads": self.replica_reads,
+            "fallback_reads": self.fallback_reads,
+            "pinned_reads": self.pinned_reads,
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag,
+                    "size": replica.pool.get_size() if replica.pool is not None else 0,
+                    "in_use": replica.in_use,
+                }
+                for replica in self.replicas
+            ],
+        }
+
     async def __aenter__(self) -> typing.Self:
-        self.pool = await self.__create_connection_pool()
+        await self.connect()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        self.pool = None
+        pass
 
     def _get_constraints_based_on_class_db_type(
             self,
-            anno_cls_instance: types.AbstractDBType
+            anno_cls_instance: types.AbstractDBType,
+            inline: bool = True
     ) -> str:
+        generated = anno_cls_instance.__generated__()
+        if generated:
+            return f"GENERATED ALWAYS AS ({generated}) STORED"
+
         val = anno_cls_instance.__default__()
 
         if anno_cls_instance.__class__.__name__ == "String":
@@ -54,13 +304,16 @@ class AsyncPGPoolManager:
         else:
             default = f"DEFAULT {val}" if val else ""
 
+        # PRIMARY KEY already implies UNIQUE NOT NULL, repeating it builds a second unique index
+        # Keys of tenant scoped or partitioned tables are table constraints instead (see _get_table_constraints)
         parts = []
-        if anno_cls_instance.__pk__():
+        if anno_cls_instance.__pk__() and inline:
             parts.append("PRIMARY KEY")
-        if anno_cls_instance.__unique__():
-            parts.append("UNIQUE")
-        if not anno_cls_instance.__nullable__():
-            parts.append("NOT NULL")
+        else:
+            if anno_cls_instance.__unique__() and inline and not anno_cls_instance.__pk__():
+                parts.append("UNIQUE")
+            if not anno_cls_instance.__nullable__():
+                parts.append("NOT NULL")
         if default:
             parts.append(default)
 
@@ -77,14 +330,139 @@ class AsyncPGPoolManager:
             "Boolean": "BOOLEAN",
             "UUID": "UUID",
             "DateTime": "TIMESTAMPTZ",
-            "SERIAL": "SERIAL"
+            "SERIAL": "SERIAL",
+            "Version": "BIGINT",
+            "Modified": "TIMESTAMPTZ",
+            "TSVector": "TSVECTOR",
+            "Tenant": "UUID"
         }
+        inline = not (_model.__tenant__ or _model.__partitioning__)
         returning = []
         columns: typing.Sequence[tuple[str, types.AbstractDBType]] = _model.__sequence_fields__()
         for column in columns:
-            returning.append(f"{column[0]} {conventions[column[1].__call__()]} {self._get_constraints_based_on_class_db_type(column[1])}") # may coz issues, change to .__call__()
+            returning.append(f"{column[0]} {conventions[column[1].__call__()]} {self._get_constraints_based_on_class_db_type(column[1], inline)}") # may coz issues, change to .__call__()
+        return returning
+
+    @staticmethod
+    def _get_table_constraints(_model: typing.Type[BaseAbstractModel]) -> list[str]:
+        # Keys are unique per tenant, and a partitioned table's keys have to contain the partition column
+        if not (_model.__tenant__ or _model.__partitioning__):
+            return []
+        prefix = [_model.__tenant__] if _model.__tenant__ else []
+        suffix = [_model.__partitioning__.column] if _model.__partitioning__ else []
+        returning = []
+        for attr, instance in _model.__sequence_fields__():
+            if instance.__pk__() or instance.__unique__():
+                columns = list(dict.fromkeys([*prefix, attr, *suffix]))
+                returning.append(f"{'PRIMARY KEY' if instance.__pk__() else 'UNIQUE'} ({', '.join(columns)})")
+        return returning
+
+    def table_ddl(
+            self,
+            table: str,
+            _model: typing.Type[BaseAbstractModel]
+    ) -> str:
+        columns = [
+            column for column in self._get_columns_based_on_attrs_and_type_instances(_model)
+        ]
+        columns.extend(self._get_table_constraints(_model))
+        partitioning = f" {_model.__partitioning__.__ddl__()}" if _model.__partitioning__ else ""
+        return textwrap.dedent(
+            f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {", ".join(columns)}
+                ){partitioning};
+            """
+        )
+
+    @staticmethod
+    def partition_ddl(
+            table: str,
+            _model: typing.Type[BaseAbstractModel],
+            today: datetime.date | None = None
+    ) -> list[tuple[str, str]]:
+        # Hash or default partitions, plus the monthly ones due by `today` for range partitioning
+        partitioning = _model.__partitioning__
+        if partitioning is None:
+            return []
+        returning = partitioning.__partitions__(table)
+        if today is not None:
+            returning.extend(partitioning.__range_partitions__(table, today))
+        return returning
+
+    def index_ddl(
+            self,
+            table: str,
+            _model: typing.Type[BaseAbstractModel]
+    ) -> list[tuple[str, str]]:
+        returning = []
+        for index in _model.__sequence_indexes__():
+            name = index.__name_for__(table)
+            if name in (existing for existing, _ in returning):
+                raise ValueError(f"Duplicate index name {name!r} on {_model.__cls_repr__()}")
+            returning.append((name, index.__ddl__(table)))
         return returning
 
+    def trigger_ddl(
+            self,
+            table: str,
+            _model: typing.Type[BaseAbstractModel]
+    ) -> list[tuple[str, str]]:
+        # Bumps the version column on updates that change the row, so it can back a strong ETag, and stamps
+        # the Modified column if there is one
+        column = _model.__version_field__()
+        if column is None:
+            return []
+        modified = _model.__modified_field__()
+        name = f"{table}_version_trigger"
+        # Generated columns can't be read in a BEFORE trigger's WHEN, so compare the stored ones
+        compared = [
+            attr for attr, instance in _model.__sequence_fields__()
+            if attr not in (column, modified) and instance.__generated__() is None
+        ]
+        stamp = f"\n                    NEW.{modified} := now();" if modified is not None else ""
+        old, new = (", ".join(f"{row}.{attr}" for attr in compared) for row in ("OLD", "NEW"))
+        return [(
+            name,
+            textwrap.dedent(
+                f"""
+                CREATE OR REPLACE FUNCTION {table}_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    NEW.{column} := OLD.{column} + 1;{stamp}
+                    RETURN NEW;
+                END;
+                $$;
+                DROP TRIGGER IF EXISTS {name} ON {table};
+                CREATE TRIGGER {name} BEFORE UPDATE ON {table}
+                    FOR EACH ROW WHEN (({old}) IS DISTINCT FROM ({new})) EXECUTE FUNCTION {table}_bump_version();
+                """
+            ).strip()
+        )]
+
+    @staticmethod
+    def extension_ddl(extension: str) -> str:
+        return f"CREATE EXTENSION IF NOT EXISTS \"{extension}\";"
+
+    async def _run_script(
+            self,
+            statements: typing.Sequence[str],
+            files: typing.Mapping[str, str]
+    ) -> None:
+        # One connection and one round trip for the whole batch, .sql files only when asked for
+        if statements:
+            conn = await self.acquire()
+            try:
+                await conn.execute("\n".join(statements))
+            finally:
+                await self.release(conn)
+        if settings.WRITE_SQL_FILES and files:
+            await asyncio.gather(*(self._write_sql_file(name, content) for name, content in files.items()))
+
+    @staticmethod
+    async def _write_sql_file(name: str, content: str) -> None:
+        async with aiofiles.open(DBConfig.sql_dir() / name, "w") as file:
+            await file.write(content)
+
     async def create_tables(
             self,
             tables: typing.Sequence[str],
@@ -93,111 +471,60 @@ class AsyncPGPoolManager:
         self.log.warning(
             f"Creating tables {tables!r} using models {[model.__cls_repr__() for model in _models]}"
         )
-        async with self as conn:
-            try:
-                for idx, table in enumerate(tables):
-                    self.log.warning(f"Creating table {table}...")
-                    columns = [
-                        column for column in self._get_columns_based_on_attrs_and_type_instances(_models[idx])
-                    ]
-                    query = textwrap.dedent(
-                        f"""
-                            CREATE TABLE IF NOT EXISTS {table} (
-                                {", ".join(columns)}
-                            );
-                        """
-                    )
-                    # self.log.critical(query)
-                    async with aiofiles.open(DBConfig.sql_dir() / f"{table}_table_created.sql", "w") as file:
-                        await file.write(query)
-                    await conn.pool.execute(
-                        query
-                    )
-                    self.log.warning(f"Created table {table}")
-            except Exception as e:
-                self.log.warning(f"Error creating table {table}...")
-                raise e
+        try:
+            files = {
+                f"{table}_table_created.sql": self.table_ddl(table, _models[idx])
+                for idx, table in enumerate(tables)
+            }
+            await self._run_script(list(files.values()), files)
+            self.log.warning(f"Created tables {tables!r}")
+        except Exception as e:
+            self.log.warning(f"Error creating tables {tables!r}...")
+            raise e
 
     async def drop_tables(self, tables: typing.Sequence[str] | typing.Iterable[str]) -> None:
-        async with self as conn:
-            try:
-                for table in tables:
-                    self.log.warning(f"Dropping table {table}...")
-                    query = f"DROP TABLE IF EXISTS {table};"
-                    async with aiofiles.open(DBConfig.sql_dir() / f"{table}_table_dropped.sql", "w") as file:
-                        await file.write(query)
-                    await conn.pool.execute(
-                        query
-                    )
-                    self.log.warning(f"Dropped table {table}")
-            except Exception as e:
-                self.log.warning(f"Error dropping table {table}...")
-                raise e
+        tables = list(tables)
+        try:
+            self.log.warning(f"Dropping tables {tables!r}...")
+            files = {
+                f"{table}_table_dropped.sql": f"DROP TABLE IF EXISTS {table};"
+                for table in tables
+            }
+            await self._run_script(list(files.values()), files)
+            self.log.warning(f"Dropped tables {tables!r}")
+        except Exception as e:
+            self.log.warning(f"Error dropping tables {tables!r}...")
+            raise e
 
     async def run_pre_init_hook(self) -> None:
-        async with self as conn:
-            statements = []
-            try:
-                extensions = DBConfig.extensions()
-                self.log.warning("Running pre-init hook...")
-                for extension in extensions:
-                    self.log.warning(
-                        f"Creating extensions {extension!r}"
-                    )
-                    query = f"CREATE EXTENSION IF NOT EXISTS \"{extension}\";"
-                    statements.append(query)
-                    await conn.pool.execute(
-                        query
-                    )
-                async with aiofiles.open(DBConfig.sql_dir() / "extensions_created.sql", "w") as file:
-                    await file.write(
-                        "\n".join(statements)
-                    )
-                log.warning("Pre init hook completed successfully")
-            except Exception as e:
-                log.warning(f"Pre init hook failed...")
-                raise e
+        try:
+            self.log.warning("Running pre-init hook...")
+            statements = [self.extension_ddl(extension) for extension in DBConfig.extensions()]
+            await self._run_script(statements, {"extensions_created.sql": "\n".join(statements)})
+            log.warning("Pre init hook completed successfully")
+        except Exception as e:
+            log.warning(f"Pre init hook failed...")
+            raise e
 
     async def run_post_init_hook(self, tables: list[str], _models: list[typing.Type[BaseAbstractModel]]) -> None:
-        async with self as conn:
-            try:
-                log.warning("Running post init hook...")
-                for table, model in zip(tables, _models):
-                    indexes = model.__sequence_indexes__()
-
-                    for index in indexes:
-                        self.log.warning(
-                            f"Creating index {index} in table {table}..."
-                        )
-                        stmt = f"CREATE INDEX {table}_{index}_index ON {table} ({index});"
-                        async with aiofiles.open(DBConfig.sql_dir() / f"{table}_{index}_index_created.sql", "w") as file:
-                            await file.write(stmt)
-                        await conn.pool.execute(stmt)
-
-                log.warning("Post init hook completed successfully")
-            except Exception as e:
-                log.warning(f"Post init hook failed...")
-                raise e
+        try:
+            log.warning("Running post init hook...")
+            files = {
+                f"{index}_created.sql": stmt
+                for table, model in zip(tables, _models)
+                for index, stmt in self.index_ddl(table, model)
+            }
+            await self._run_script(list(files.values()), files)
+            log.warning("Post init hook completed successfully")
+        except Exception as e:
+            log.warning(f"Post init hook failed...")
+            raise e
 
     async def run_after_shutdown_hook(self) -> None:
-        async with self as conn:
-            statements = []
-            try:
-                extensions = DBConfig.extensions()
-                for extension in extensions:
-                    self.log.warning(
-                        f"Dropping extension {extension!r}"
-                    )
-                    query = f"DROP EXTENSION IF EXISTS \"{extension}\";"
-                    statements.append(query)
-                    await conn.pool.execute(
-                        query
-                    )
-                async with aiofiles.open(DBConfig.sql_dir() / f"extensions_dropped.sql", "w") as file:
-                    await file.write(
-                        "\n".join(statements)
-                    )
-                log.warning("After shutdown hook completed successfully")
-            except Exception as e:
-                log.warning(f"After shutdown hook failed...")
-                raise e
\ No newline at end of file
+        try:
+            statements = [f"DROP EXTENSION IF EXISTS \"{extension}\";" for extension in DBConfig.extensions()]
+            await self._run_script(statements, {"extensions_dropped.sql": "\n".join(statements)})
+            log.warning("After shutdown hook completed successfully")
+        except Exception as e:
+            log.warning(f"After shutdown hook failed...")
+            raise e
@@ -0,0 +1,367 @@
+import asyncio
+import dataclasses
+import datetime
+import hashlib
+import pathlib
+import re
+import sys
+import typing
+import asyncpg
+from loguru import logger as log
+from db.config import DBConfig
+from db.manager import AsyncPGPoolManager
+from db.models import BaseAbstractModel
+from core.settings import settings
+
+__all__ = (
+    "Migration",
+    "MigrationError",
+    "Migrator",
+)
+
+class MigrationError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def filename(self) -> str:
+        return f"{self.version:04d}_{self.name}.sql"
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+
+class Migrator:
+    TABLE: typing.ClassVar[str] = "schema_migrations"
+    FINGERPRINT_TABLE: typing.ClassVar[str] = "schema_fingerprint"
+    # pg_advisory_lock key shared by every worker running migrations against the same database
+    LOCK_KEY: typing.ClassVar[int] = 0x7461736B
+    GENERATE_LOCK_KEY: typing.ClassVar[int] = LOCK_KEY + 1
+    FILENAME: typing.ClassVar[re.Pattern] = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+    _fingerprints: typing.ClassVar[dict[tuple[type, ...], str]] = {}
+
+    def __init__(self, mgr: AsyncPGPoolManager, directory: pathlib.Path | None = None) -> None:
+        self.mgr: AsyncPGPoolManager = mgr
+        self.directory: pathlib.Path = directory or DBConfig.migrations_dir()
+        self.log = log
+
+    def migrations(self) -> list[Migration]:
+        returning = []
+        for path in self.directory.glob("*.sql"):
+            match = self.FILENAME.match(path.name)
+            if not match:
+                continue
+            returning.append(
+                Migration(version=int(match.group(1)), name=match.group(2), sql=path.read_text())
+            )
+        returning.sort(key=lambda migration: migration.version)
+        versions = [migration.version for migration in returning]
+        if len(versions) != len(set(versions)):
+            raise MigrationError(f"Duplicate migration versions in {self.directory}")
+        return returning
+
+    async def current_version(self, conn: asyncpg.Connection) -> int:
+        try:
+            return await conn.fetchval(f"SELECT coalesce(max(version), 0) FROM {self.TABLE};")
+        except asyncpg.UndefinedTableError:
+            return 0
+
+    async def applied(self, conn: asyncpg.Connection) -> dict[int, str]:
+        try:
+            rows = await conn.fetch(f"SELECT version, checksum FROM {self.TABLE} ORDER BY version;")
+        except asyncpg.UndefinedTableError:
+            return {}
+        return {row["version"]: row["checksum"] for row in rows}
+
+    async def pending(self, conn: asyncpg.Connection) -> list[Migration]:
+        applied = await self.applied(conn)
+        returning = []
+        for migration in self.migrations():
+            checksum = applied.get(migration.version)
+            if checksum is None:
+                returning.append(migration)
+            elif checksum != migration.checksum:
+                raise MigrationError(
+                    f"Migration {migration.filename} was changed after it had been applied"
+                )
+        return returning
+
+    async def upgrade(self) -> list[Migration]:
+        migrations = self.migrations()
+        latest = migrations[-1].version if migrations else 0
+        conn = await self.mgr.acquire()
+        try:
+            # Fast path for every worker boot but the first one: a single query, no locks, no DDL
+            if await self.current_version(conn) >= latest:
+                return []
+
+            await conn.execute("SELECT pg_advisory_lock($1);", self.LOCK_KEY)
+            try:
+                await conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        checksum TEXT NOT NULL,
+                        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                    );
+                    """
+                )
+                # Another worker may have applied them while we were waiting for the lock
+                pending = await self.pending(conn)
+                for migration in pending:
+                    self.log.warning(f"Applying migration {migration.filename}...")
+                    async with conn.transaction():
+                        await conn.execute(migration.sql)
+                        await conn.execute(
+                            f"INSERT INTO {self.TABLE} (version, name, checksum) VALUES ($1, $2, $3);",
+                            migration.version, migration.name, migration.checksum
+                        )
+                    self.log.warning(f"Applied migration {migration.filename}")
+                return pending
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1);", self.LOCK_KEY)
+        finally:
+            await self.mgr.release(conn)
+
+    def fingerprint(self, _models: typing.Sequence[typing.Type[BaseAbstractModel]]) -> str:
+        # Hash of the DDL the models would generate on an empty database plus the migrations on disk,
+        # computed once per process
+        key = tuple(_models)
+        fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            digest = hashlib.sha256()
+            for stmt in self.plan(set(), {}, set(), set(), _models):
+                digest.update(stmt.encode())
+            for migration in self.migrations():
+                digest.update(f"{migration.filename}:{migration.checksum}".encode())
+            fingerprint = self._fingerprints[key] = digest.hexdigest()
+        return fingerprint
+
+    async def stored_fingerprint(self, conn: asyncpg.Connection) -> str | None:
+        try:
+            return await conn.fetchval(f"SELECT fingerprint FROM {self.FINGERPRINT_TABLE};")
+        except asyncpg.UndefinedTableError:
+            return None
+
+    async def store_fingerprint(self, fingerprint: str) -> None:
+        conn = await self.mgr.acquire()
+        try:
+            await conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.FINGERPRINT_TABLE} (
+                    singleton BOOLEAN PRIMARY KEY DEFAULT true CHECK (singleton),
+                    fingerprint TEXT NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                """
+            )
+            await conn.execute(
+                f"""
+                INSERT INTO {self.FINGERPRINT_TABLE} (fingerprint) VALUES ($1)
+                ON CONFLICT (singleton) DO UPDATE SET fingerprint = excluded.fingerprint, updated_at = now();
+                """,
+                fingerprint
+            )
+        finally:
+            await self.mgr.release(conn)
+
+    async def sync(self, _models: typing.Sequence[typing.Type[BaseAbstractModel]]) -> bool:
+        # Startup entrypoint: one query on one connection when neither the models nor the migrations changed
+        fingerprint = self.fingerprint(_models)
+        conn = await self.mgr.acquire()
+        try:
+            if await self.stored_fingerprint(conn) == fingerprint:
+                return False
+        finally:
+            await self.mgr.release(conn)
+
+        await self.upgrade()
+        statements = [stmt for stmt in await self.diff(_models) if not stmt.startswith("--")]
+        if statements:
+            if not settings.MIGRATIONS_AUTOGENERATE:
+                self.log.warning(
+                    f"Models differ from the database schema by {len(statements)} statement(s), "
+                    f"run `python -m db.migrations make <name>`"
+                )
+                return True
+            await self.generate(_models)
+            # The new migration file is part of the fingerprint
+            self._fingerprints.clear()
+            fingerprint = self.fingerprint(_models)
+        await self.store_fingerprint(fingerprint)
+        return True
+
+    async def generate(self, _models: typing.Sequence[typing.Type[BaseAbstractModel]]) -> Migration | None:
+        # Development only (MIGRATIONS_AUTOGENERATE): one worker writes and applies the migration,
+        # the others wait and find nothing left to do
+        conn = await self.mgr.acquire()
+        try:
+            await conn.execute("SELECT pg_advisory_lock($1);", self.GENERATE_LOCK_KEY)
+            try:
+                migration = await self.make("auto", _models)
+                if migration is not None:
+                    await self.upgrade()
+                return migration
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1);", self.GENERATE_LOCK_KEY)
+        finally:
+            await self.mgr.release(conn)
+
+    async def ensure_partitions(
+            self,
+            _models: typing.Sequence[typing.Type[BaseAbstractModel]],
+            today: datetime.date | None = None
+    ) -> list[str]:
+        # Range partitions roll forward with time so they are not part of the migrations, every boot makes sure
+        # the upcoming months exist (one catalog query when they do)
+        today = today or datetime.datetime.now(datetime.UTC).date()
+        wanted = [
+            (name, stmt)
+            for model in _models
+            for name, stmt in self.mgr.partition_ddl(model.__table__, model, today)
+        ]
+        if not wanted:
+            return []
+        conn = await self.mgr.acquire()
+        try:
+            existing = {
+                row["relname"]
+                for row in await conn.fetch("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid;")
+            }
+            missing = [(name, stmt) for name, stmt in wanted if name not in existing]
+            if not missing:
+                return []
+
+            await conn.execute("SELECT pg_advisory_lock($1);", self.LOCK_KEY)
+            try:
+                # A failure leaves that month's rows in the default partition, so startup stops on it
+                created = []
+                for name, stmt in missing:
+                    await conn.execute(stmt)
+                    created.append(name)
+                self.log.warning(f"Created partitions {created!r}")
+                return created
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1);", self.LOCK_KEY)
+        finally:
+            await self.mgr.release(conn)
+
+    def plan(
+            self,
+            extensions: typing.Collection[str],
+            columns: typing.Mapping[str, typing.Collection[str]],
+            indexes: typing.Collection[str],
+            triggers: typing.Collection[str],
+            _models: typing.Sequence[typing.Type[BaseAbstractModel]]
+    ) -> list[str]:
+        # Diff the models against the existing extensions, table columns, index and trigger names
+        statements = []
+        for extension in DBConfig.extensions():
+            if extension not in extensions:
+                statements.append(self.mgr.extension_ddl(extension))
+
+        for model in _models:
+            table = model.__table__
+            if table not in columns:
+                statements.append(self.mgr.table_ddl(table, model).strip())
+                statements.extend(stmt for _, stmt in self.mgr.partition_ddl(table, model))
+            else:
+                names = [name for name, _ in model.__sequence_fields__()]
+                definitions = self.mgr._get_columns_based_on_attrs_and_type_instances(model)
+                for name, definition in zip(names, definitions):
+                    if name not in columns[table]:
+                        statements.append(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {definition.strip()};")
+                for name in sorted(set(columns[table]) - set(names)):
+                    statements.append(f"-- {table}.{name} is not declared by {model.__cls_repr__()}, drop it manually")
+
+            for name, stmt in self.mgr.index_ddl(table, model):
+                if name not in indexes:
+                    statements.append(stmt)
+
+            for name, stmt in self.mgr.trigger_ddl(table, model):
+                if name not in triggers:
+                    statements.append(stmt)
+        return statements
+
+    async def diff(self, _models: typing.Sequence[typing.Type[BaseAbstractModel]]) -> list[str]:
+        conn = await self.mgr.acquire()
+        try:
+            extensions = {row["extname"] for row in await conn.fetch("SELECT extname FROM pg_extension;")}
+            columns: dict[str, set[str]] = {}
+            for row in await conn.fetch(
+                "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema();"
+            ):
+                columns.setdefault(row["table_name"], set()).add(row["column_name"])
+            indexes = {
+                row["indexname"]
+                for row in await conn.fetch("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema();")
+            }
+            triggers = {
+                row["tgname"]
+                for row in await conn.fetch("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal;")
+            }
+        finally:
+            await self.mgr.release(conn)
+        return self.plan(extensions, columns, indexes, triggers, _models)
+
+    def write(self, name: str, statements: typing.Sequence[str]) -> Migration:
+        migrations = self.migrations()
+        migration = Migration(
+            version=(migrations[-1].version if migrations else 0) + 1,
+            name=re.sub(r"\W+", "_", name).strip("_").lower() or "auto",
+            sql="\n\n".join(statements) + "\n",
+        )
+        (self.directory / migration.filename).write_text(migration.sql)
+        self.log.warning(f"Written migration {migration.filename}")
+        return migration
+
+    async def make(
+            self,
+            name: str,
+            _models: typing.Sequence[typing.Type[BaseAbstractModel]]
+    ) -> Migration | None:
+        statements = await self.diff(_models)
+        if not any(not stmt.startswith("--") for stmt in statements):
+            return None
+        return self.write(name, statements)
+
+
+async def main(argv: typing.Sequence[str]) -> None:
+    from core.lifespan import ASGILifespan
+
+    ASGILifespan.configure()
+    mgr = await AsyncPGPoolManager.instance()
+    migrator = Migrator(mgr)
+    try:
+        command = argv[0] if argv else "upgrade"
+        if command == "make":
+            migration = await migrator.make(argv[1] if len(argv) > 1 else "auto", BaseAbstractModel.models())
+            print(migration.filename if migration else "No changes detected")
+        elif command == "upgrade":
+            applied = await migrator.upgrade()
+            print("\n".join(m.filename for m in applied) or "Already up to date")
+        elif command == "status":
+            conn = await mgr.acquire()
+            try:
+                pending = await migrator.pending(conn)
+                print(f"current: {await migrator.current_version(conn)}")
+            finally:
+                await mgr.release(conn)
+            print("\n".join(f"pending: {m.filename}" for m in pending) or "Already up to date")
+        else:
+            raise SystemExit(f"Unknown command {command!r}, expected make [name] | upgrade | status")
+    finally:
+        await mgr.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
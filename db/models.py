@@ -7,6 +7,10 @@ class BaseAbstractModel:
     _models: typing.ClassVar[list[typing.Type["BaseAbstractModel"]]] = []
     _pre_assigned: typing.ClassVar[list[str]] = []
     __table__: typing.ClassVar[str | None] = None
+    __indexes__: typing.ClassVar[tuple[types.Index, ...]] = ()
+    # Tenant column added to the model (types.Tenant) and table partitioning, both optional
+    __tenant__: typing.ClassVar[str | None] = None
+    __partitioning__: typing.ClassVar[types.Partitioning | None] = None
 
     @classmethod
     def __cls_repr__(cls) -> str:
@@ -45,6 +49,9 @@ class BaseAbstractModel:
         BaseAbstractModel.assign_table(getattr(cls, '__table__'))
         BaseAbstractModel.assign_model(cls)
 
+        if cls.__tenant__ and cls.__tenant__ not in cls.__annotations__:
+            cls.__annotations__[cls.__tenant__] = types.Tenant
+
         for attr, anno in cls.__annotations__.items():
             existing_val = getattr(cls, attr, None)
             if isinstance(existing_val, anno):
@@ -73,26 +80,64 @@ class BaseAbstractModel:
                 item for item in self.__dict__.values()
             )
 
-        def __sequence_indexes__(cls) -> typing.Sequence[str] | typing.Iterable[str]:
+        def __sequence_indexes__(cls) -> typing.Sequence[types.Index]:
+            # Primary keys and unique columns are already backed by the index of their constraint
             returning = []
             for attr, val in cls.__annotations__.items():
                 if val is not None and hasattr(cls, attr):
-                    if attr in BaseAbstractModel.pre_assigned():
-                        continue
-                    elif attr == "__table__":
+                    if attr == "__table__":
                         continue
                     instance = getattr(cls, attr)
+                    if instance.__trigram__():
+                        returning.append(types.Index(
+                            attr, name=f"{cls.__table__}_{attr}_trgm_index", index_type="gist", opclass="gist_trgm_ops"
+                        ))
+                    if instance.__pk__() or instance.__unique__():
+                        continue
                     if instance.__index__():
-                        returning.append(attr)
+                        # Every tenant scoped query filters on the tenant first
+                        if cls.__tenant__ and instance.__index_type__() == "btree" and attr != cls.__tenant__:
+                            returning.append(types.Index(cls.__tenant__, attr))
+                        else:
+                            returning.append(types.Index(attr, index_type=instance.__index_type__()))
 
+            returning.extend(cls.__indexes__)
             return returning
 
+        def __version_field__(cls) -> str | None:
+            for attr, instance in cls.__sequence_fields__():
+                if isinstance(instance, types.Version):
+                    return attr
+            return None
+
+        def __modified_field__(cls) -> str | None:
+            for attr, instance in cls.__sequence_fields__():
+                if isinstance(instance, types.Modified):
+                    return attr
+            return None
+
+        def __search_field__(cls) -> tuple[str, types.TSVector] | None:
+            for attr, instance in cls.__sequence_fields__():
+                if isinstance(instance, types.TSVector):
+                    return attr, instance
+            return None
+
         cls.__sequence_indexes__ = classmethod(__sequence_indexes__)
+        cls.__version_field__ = classmethod(__version_field__)
+        cls.__modified_field__ = classmethod(__modified_field__)
+        cls.__search_field__ = classmethod(__search_field__)
         cls.__sequence_fields__ = classmethod(__sequence_fields__)
         cls.__to_args__ = property(__to_args__)
 
 class _TaskModel(BaseAbstractModel):
     __table__ = "tasks"
+    __tenant__ = "owner_id"
+    __partitioning__ = types.Partitioning("hash", "owner_id", modulus=8)
+    __indexes__ = (
+        # Keyset listing of open tasks (GET /tasks?done=false) without visiting finished ones, the primary key
+        # (owner_id, id) serves the other listings
+        types.Index("owner_id", "id", where="done = false", name="tasks_open_index"),
+    )
 
     id: types.Integer = types.Integer(
         autoincrement=True,
@@ -104,7 +149,8 @@ class _TaskModel(BaseAbstractModel):
     title: types.String = types.String(
         index=True, # remove later
         unique=True, # remove later
-        nullable=False
+        nullable=False,
+        trigram=True
     )
     description: types.String = types.String(
         nullable=True
@@ -118,6 +164,8 @@ class _TaskModel(BaseAbstractModel):
         nullable=False,
         default="uuid_generate_v4()"
     )
+    version: types.Version = types.Version()
+    search: types.TSVector = types.TSVector("title", "description")
 
 #
 # class InstanceSupportsSequence(BaseModel):
@@ -137,6 +185,8 @@ class _TaskModel(BaseAbstractModel):
 
 class _CalendarNoteModel(BaseAbstractModel):
     __table__ = "calendar_notes"
+    __tenant__ = "owner_id"
+    __partitioning__ = types.Partitioning("range", "date", ahead=3)
 
     id: types.Integer = types.Integer(
         index=True,
@@ -152,13 +202,143 @@ class _CalendarNoteModel(BaseAbstractModel):
         default="uuid_generate_v4()"
     )
     date: types.DateTime = types.DateTime(
+        index=True,
+        index_type="btree", # "brin" fits append-only notes whose date follows insertion order
         default="now()",
         nullable=False
     )
     title: types.String = types.String(
+        nullable=False,
+        trigram=True
+    )
+
+    note: types.String = types.String(
+        nullable=True
+    )
+    version: types.Version = types.Version()
+    # Last-Modified of the .ics feed, with calendar_notes_deletions (sql/migrations/0008)
+    modified: types.Modified = types.Modified()
+    search: types.TSVector = types.TSVector("title", "note")
+
+
+class _CalendarSeriesModel(BaseAbstractModel):
+    # Recurring calendar note stored once, occurrences are expanded from the rule on read (repository.recurrence)
+    __table__ = "calendar_series"
+    __tenant__ = "owner_id"
+    __indexes__ = (
+        # Series overlapping a range: first occurrence before its end, bound (NULL: forever) after its start
+        types.Index("owner_id", "starts", include=("ends",)),
+    )
+
+    id: types.Integer = types.Integer(
+        index=True,
+        unique=True,
+        nullable=False,
+        autoincrement=True,
+        pk=True
+    )
+    uid: types.UUID = types.UUID(
+        index=True,
+        unique=True,
+        nullable=False,
+        default="uuid_generate_v4()"
+    )
+    starts: types.DateTime = types.DateTime(
+        nullable=False
+    )
+    ends: types.DateTime = types.DateTime(
+        nullable=True
+    )
+    rule: types.String = types.String(
         nullable=False
     )
+    tz: types.String = types.String(
+        nullable=False,
+        default="UTC"
+    )
+    title: types.String = types.String(
+        nullable=False
+    )
+    note: types.String = types.String(
+        nullable=True
+    )
+    version: types.Version = types.Version()
 
+
+class _CalendarSeriesExceptionModel(BaseAbstractModel):
+    # Cancels one occurrence of a series or overrides its date, title or note
+    __table__ = "calendar_series_exceptions"
+    __tenant__ = "owner_id"
+    __indexes__ = (
+        types.Index(
+            "owner_id", "series_id", "occurrence", unique=True, name="calendar_series_exceptions_occurrence_index"
+        ),
+        # Occurrences moved by date, looked up by range reads
+        types.Index("owner_id", "date", where="date IS NOT NULL"),
+    )
+
+    id: types.Integer = types.Integer(
+        index=True,
+        unique=True,
+        nullable=False,
+        autoincrement=True,
+        pk=True
+    )
+    series_id: types.Integer = types.Integer(
+        nullable=False
+    )
+    occurrence: types.DateTime = types.DateTime(
+        nullable=False
+    )
+    cancelled: types.Boolean = types.Boolean(
+        default="false"
+    )
+    date: types.DateTime = types.DateTime(
+        nullable=True
+    )
+    title: types.String = types.String(
+        nullable=True
+    )
     note: types.String = types.String(
         nullable=True
     )
+
+
+class _CalendarReminderModel(BaseAbstractModel):
+    # Reminder of a calendar note, delivered by repository.scheduler.ReminderScheduler once due. Pending while
+    # sent_at is NULL, claimed_until is the lease of the worker delivering it (or when a failed delivery is retried)
+    __table__ = "calendar_reminders"
+    __tenant__ = "owner_id"
+    __indexes__ = (
+        # Pending reminders of every tenant in due order, scanned by the scheduler's window and claim queries
+        types.Index("due", where="sent_at IS NULL", name="calendar_reminders_pending_index"),
+        types.Index("owner_id", "note_id"),
+    )
+
+    id: types.Integer = types.Integer(
+        index=True,
+        unique=True,
+        nullable=False,
+        autoincrement=True,
+        pk=True
+    )
+    note_id: types.Integer = types.Integer(
+        nullable=False
+    )
+    due: types.DateTime = types.DateTime(
+        nullable=False
+    )
+    claimed_until: types.DateTime = types.DateTime(
+        nullable=True
+    )
+    attempts: types.Integer = types.Integer(
+        nullable=False,
+        default="0"
+    )
+    sent_at: types.DateTime = types.DateTime(
+        nullable=True
+    )
+    # Last delivery error, kept on reminders given up after REMINDER_MAX_ATTEMPTS
+    error: types.String = types.String(
+        nullable=True
+    )
@@ -0,0 +1,64 @@
+import datetime
+import typing
+import uuid
+import msgspec
+import db.types as types
+from db.models import BaseAbstractModel
+
+__all__ = (
+    "RecordEncoder",
+)
+
+class RecordEncoder:
+    # Encodes asyncpg Records straight to JSON: a Record is a tuple in the order of the model's fields
+    # (every statement selects {columns}), so it is unpacked positionally into a msgspec Struct
+    # precomputed once per model, no dict and no TypedDict introspection per row
+    PYTHON_TYPES: typing.ClassVar[dict[typing.Type[types.AbstractDBType], type]] = {
+        types.Integer: int,
+        types.String: str,
+        types.Boolean: bool,
+        types.UUID: uuid.UUID,
+        types.DateTime: datetime.datetime,
+        types.Version: int,
+    }
+
+    _encoders: typing.ClassVar[dict[str, "RecordEncoder"]] = {}
+
+    def __init__(self, model: typing.Type[BaseAbstractModel]) -> None:
+        fields = []
+        for name, instance in model.__sequence_fields__():
+            if not instance.__selectable__():
+                continue
+            type_ = self.PYTHON_TYPES[type(instance)]
+            fields.append((name, type_ | None if instance.__nullable__() else type_))
+
+        self.row: typing.Type[msgspec.Struct] = msgspec.defstruct(
+            f"{model.__cls_repr__()}Row", fields, gc=False
+        )
+        self.page: typing.Type[msgspec.Struct] = msgspec.defstruct(
+            f"{model.__cls_repr__()}Page", [("items", list[self.row]), ("next", str | None)], gc=False
+        )
+        self._encoder = msgspec.json.Encoder()
+
+    @classmethod
+    def for_model(cls, model: typing.Type[BaseAbstractModel]) -> "RecordEncoder":
+        encoder = cls._encoders.get(model.__table__)
+        if encoder is None:
+            encoder = cls._encoders[model.__table__] = cls(model)
+        return encoder
+
+    def encode(self, record: typing.Sequence[typing.Any]) -> bytes:
+        return self._encoder.encode(self.row(*record))
+
+    def encode_many(self, records: typing.Iterable[typing.Sequence[typing.Any]]) -> bytes:
+        row = self.row
+        return self._encoder.encode([row(*record) for record in records])
+
+    def encode_page(self, records: typing.Iterable[typing.Sequence[typing.Any]], next_cursor: str | None) -> bytes:
+        row = self.row
+        return self._encoder.encode(self.page([row(*record) for record in records], next_cursor))
+
+    def encode_lines(self, records: typing.Iterable[typing.Sequence[typing.Any]]) -> bytes:
+        # NDJSON, one line per record including the trailing newline
+        row = self.row
+        return self._encoder.encode_lines([row(*record) for record in records])
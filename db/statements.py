@@ -0,0 +1,98 @@
+import textwrap
+import typing
+import asyncpg
+from loguru import logger as log
+from db.models import BaseAbstractModel
+
+__all__ = (
+    "StatementRegistry",
+    "PreparedConnection",
+)
+
+class PreparedConnection(asyncpg.Connection):
+
+    async def prepare_cached(self, query: str) -> None:
+        # Parses and plans the query into the connection's statement cache, the same text is then reused
+        # by fetch/fetchrow/execute for as long as the connection lives, across pool acquisitions.
+        # The public prepare() bypasses that cache (use_cache=False), so this relies on the private
+        # _get_statement(query, timeout): asyncpg is pinned to the exact version it was checked against
+        await self._get_statement(query, None)
+
+
+class StatementRegistry:
+    _statements: typing.ClassVar[dict[str, str]] = {}
+    _owners: typing.ClassVar[dict[tuple[str, type], dict[str, str]]] = {}
+    prepared: typing.ClassVar[int] = 0
+    skipped: typing.ClassVar[int] = 0
+
+    @staticmethod
+    def columns(model: typing.Type[BaseAbstractModel]) -> list[str]:
+        return [name for name, instance in model.__sequence_fields__() if instance.__selectable__()]
+
+    @classmethod
+    def register(
+            cls,
+            model: typing.Type[BaseAbstractModel],
+            owner: type,
+            templates: typing.Mapping[str, str],
+            related: typing.Mapping[str, typing.Type[BaseAbstractModel]] | None = None
+    ) -> dict[str, str]:
+        # Templates are formatted once per model with {table}, {columns} and {json_columns}, plus {tenant} for tenant
+        # scoped models and {search}, {search_config} and {search_document} for models with a TSVector column.
+        # Each related model adds {<name>} for its table and {<name>_tenant} for its tenant column
+        registered = cls._owners.get((model.__table__, owner))
+        if registered is not None:
+            return registered
+
+        columns = cls.columns(model)
+        context = {
+            "table": model.__table__,
+            "columns": ", ".join(columns),
+            "json_columns": ", ".join(f"'{column}', {column}" for column in columns),
+        }
+        if model.__tenant__:
+            context.update(tenant=model.__tenant__)
+        search = model.__search_field__()
+        if search is not None:
+            name, instance = search
+            context.update(search=name, search_config=instance.config, search_document=instance.__document__())
+        for name, other in (related or {}).items():
+            context[name] = other.__table__
+            if other.__tenant__:
+                context[f"{name}_tenant"] = other.__tenant__
+        statements: dict[str, str] = {}
+        for name, template in templates.items():
+            query = textwrap.dedent(template).strip().format(**context)
+            key = f"{model.__table__}.{name}"
+            if cls._statements.setdefault(key, query) != query:
+                raise ValueError(f"Statement {key!r} is already registered with a different query")
+            statements[name] = query
+
+        cls._owners[(model.__table__, owner)] = statements
+        return statements
+
+    @classmethod
+    def statements(cls) -> dict[str, str]:
+        return cls._statements
+
+    @classmethod
+    async def prepare(cls, conn: PreparedConnection) -> None:
+        # Used as the pool's init callback: every new (or recycled) connection starts with a warm cache
+        for key, query in cls._statements.items():
+            try:
+                await conn.prepare_cached(query)
+                cls.prepared += 1
+            except (asyncpg.UndefinedTableError, asyncpg.UndefinedColumnError):
+                # Schema is not there yet (first boot), the statement gets prepared on first use
+                cls.skipped += 1
+            except asyncpg.PostgresError as e:
+                log.warning(f"Could not prepare statement {key!r}: {e}")
+                cls.skipped += 1
+
+    @classmethod
+    def stats(cls) -> dict[str, typing.Any]:
+        return {
+            "registered": len(cls._statements),
+            "prepared": cls.prepared,
+            "skipped": cls.skipped,
+        }
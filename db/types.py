@@ -1,5 +1,10 @@
+import datetime
+import re
+import textwrap
 import typing
 
+INDEX_TYPES: frozenset[str] = frozenset({"btree", "brin", "hash", "gin", "gist"})
+PARTITION_METHODS: frozenset[str] = frozenset({"hash", "range"})
 
 class AbstractDBType:
     def __init__(
@@ -8,8 +13,15 @@ class AbstractDBType:
         unique: bool = False,
         nullable: bool = False,
         default: str = None,
-        pk: bool = False
+        pk: bool = False,
+        index_type: str = "btree",
+        trigram: bool = False
     ) -> None:
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type {index_type!r}, expected one of {sorted(INDEX_TYPES)}")
+        self._index_type = index_type
+        self._trigram = trigram
+
         if pk:
             self._pk = True
             self._unique = True
@@ -29,6 +41,9 @@ class AbstractDBType:
     def __index__(self) -> bool:
         return self._index
 
+    def __index_type__(self) -> str:
+        return self._index_type
+
     def __unique__(self) -> bool:
         return self._unique
 
@@ -41,6 +56,15 @@ class AbstractDBType:
     def __autoincrement__(self) -> bool:
         return getattr(self, "_autoincrement", False)
 
+    def __trigram__(self) -> bool:
+        return self._trigram
+
+    def __generated__(self) -> str | None:
+        return None
+
+    def __selectable__(self) -> bool:
+        return True
+
     def __init_subclass__(cls, **kwargs):
         def __construct_call__(subclass_name: str) -> typing.Callable[[typing.Self], str]:
             def __call__(self) -> str:
@@ -52,6 +76,7 @@ class AbstractDBType:
 
 
 class String(AbstractDBType):
+    # trigram=True adds a pg_trgm GiST index for ILIKE prefix matching ordered by distance (autocomplete)
     pass
 
 
@@ -67,7 +92,8 @@ class Integer(AbstractDBType):
         nullable: bool = False,
         default: typing.Any = None,
         pk: bool = False,
-        autoincrement: bool = False
+        autoincrement: bool = False,
+        index_type: str = "btree"
     ) -> None:
         self._autoincrement = autoincrement
 
@@ -83,7 +109,8 @@ class Integer(AbstractDBType):
             unique=unique,
             nullable=nullable,
             default=default,
-            pk=pk
+            pk=pk,
+            index_type=index_type
         )
 
     def __call__(self) -> str:
@@ -98,3 +125,176 @@ class UUID(AbstractDBType):
 
 class DateTime(AbstractDBType):
     pass
+
+
+class Version(AbstractDBType):
+    # Row version starting at 1, bumped by a BEFORE UPDATE trigger generated with the table on every change
+    def __init__(self) -> None:
+        super().__init__(nullable=False, default="1")
+
+
+class Modified(AbstractDBType):
+    # Time of the row's last change: now() on insert, set again by the version trigger. Not part of the selected
+    # columns, statements that need it select it by name
+    def __init__(self) -> None:
+        super().__init__(nullable=False, default="now()")
+
+    def __selectable__(self) -> bool:
+        return False
+
+
+class Tenant(AbstractDBType):
+    # Owner of the row, declared by a model's __tenant__; repositories filter every statement on it and never select it
+    def __init__(self) -> None:
+        super().__init__(nullable=False)
+
+    def __selectable__(self) -> bool:
+        return False
+
+
+class TSVector(AbstractDBType):
+    # Generated full-text document over text columns, weighted A, B, ... in the given order and GIN indexed.
+    # It is not part of the selected columns, repositories only search with it
+    def __init__(self, *sources: str, config: str = "english") -> None:
+        if not sources:
+            raise ValueError("TSVector needs at least one source column")
+        if len(sources) > 4:
+            raise ValueError("TSVector supports at most 4 source columns (weights A to D)")
+        self.sources: tuple[str, ...] = sources
+        self.config: str = config
+        super().__init__(index=True, nullable=True, index_type="gin")
+
+    def __generated__(self) -> str:
+        return " || ".join(
+            f"setweight(to_tsvector('{self.config}', coalesce({source}, '')), '{weight}')"
+            for source, weight in zip(self.sources, "ABCD")
+        )
+
+    def __document__(self) -> str:
+        # Text the snippets are cut from, same sources as the vector
+        return " || ' ' || ".join(f"coalesce({source}, '')" for source in self.sources)
+
+    def __selectable__(self) -> bool:
+        return False
+
+
+class Index:
+    # Table level index declaration for composite (several columns), partial (where) and covering (include) indexes
+    def __init__(
+        self,
+        *columns: str,
+        name: str | None = None,
+        index_type: str = "btree",
+        unique: bool = False,
+        where: str | None = None,
+        include: typing.Sequence[str] = (),
+        opclass: str | None = None
+    ) -> None:
+        if not columns:
+            raise ValueError("Index needs at least one column")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type {index_type!r}, expected one of {sorted(INDEX_TYPES)}")
+        self.columns: tuple[str, ...] = columns
+        self.name: str | None = name
+        self.index_type: str = index_type
+        self.unique: bool = unique
+        self.where: str | None = where
+        self.include: tuple[str, ...] = tuple(include)
+        self.opclass: str | None = opclass
+
+    def __name_for__(self, table: str) -> str:
+        if self.name:
+            return self.name
+        return re.sub(r"\W+", "_", f"{table}_{'_'.join(self.columns)}_index")
+
+    def __ddl__(self, table: str) -> str:
+        parts = [
+            f"CREATE {'UNIQUE ' if self.unique else ''}INDEX IF NOT EXISTS {self.__name_for__(table)}",
+            f"ON {table} USING {self.index_type} "
+            f"({', '.join(f'{column} {self.opclass}' if self.opclass else column for column in self.columns)})",
+        ]
+        if self.include:
+            parts.append(f"INCLUDE ({', '.join(self.include)})")
+        if self.where:
+            parts.append(f"WHERE {self.where}")
+        return " ".join(parts) + ";"
+
+
+class Partitioning:
+    # Declarative partitioning of a model's table: hash on a column into `modulus` partitions created with the
+    # table, or range on a timestamp column into monthly partitions created ahead of time plus a default one
+    def __init__(self, method: str, column: str, modulus: int = 8, ahead: int = 3) -> None:
+        if method not in PARTITION_METHODS:
+            raise ValueError(f"Unsupported partition method {method!r}, expected one of {sorted(PARTITION_METHODS)}")
+        if method == "hash" and modulus < 2:
+            raise ValueError("Hash partitioning needs a modulus of at least 2")
+        self.method: str = method
+        self.column: str = column
+        self.modulus: int = modulus
+        self.ahead: int = ahead
+
+    def __ddl__(self) -> str:
+        return f"PARTITION BY {self.method.upper()} ({self.column})"
+
+    def __partitions__(self, table: str) -> list[tuple[str, str]]:
+        # Partitions that exist for the whole life of the table
+        if self.method == "hash":
+            return [
+                (
+                    f"{table}_p{remainder}",
+                    f"CREATE TABLE IF NOT EXISTS {table}_p{remainder} PARTITION OF {table} "
+                    f"FOR VALUES WITH (MODULUS {self.modulus}, REMAINDER {remainder});"
+                )
+                for remainder in range(self.modulus)
+            ]
+        return [(f"{table}_default", f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;")]
+
+    def __range_partitions__(self, table: str, today: datetime.date) -> list[tuple[str, str]]:
+        # Monthly partitions from the current month to `ahead` months later. Rows dated past the existing
+        # partitions sit in the default one, which would make a plain CREATE fail: the default partition is
+        # detached while that month's rows move over, without firing the table's triggers
+        if self.method != "range":
+            return []
+        returning = []
+        start = today.replace(day=1)
+        for _ in range(self.ahead + 1):
+            end = (start + datetime.timedelta(days=32)).replace(day=1)
+            name = f"{table}_y{start.year}m{start.month:02d}"
+            bounds = f"FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+            rows = (
+                f"{self.column} >= '{start.isoformat()} 00:00:00+00' AND {self.column} < '{end.isoformat()} 00:00:00+00'"
+            )
+            returning.append((
+                name,
+                textwrap.dedent(
+                    f"""
+                    DO $$
+                    DECLARE
+                        columns text;
+                    BEGIN
+                        IF to_regclass('{name}') IS NOT NULL THEN
+                            RETURN;
+                        END IF;
+                        IF NOT EXISTS (SELECT 1 FROM {table}_default WHERE {rows}) THEN
+                            CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds};
+                            RETURN;
+                        END IF;
+                        -- Generated columns are computed again on insert
+                        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columns
+                        FROM pg_attribute
+                        WHERE attrelid = '{table}'::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+                        ALTER TABLE {table} DETACH PARTITION {table}_default;
+                        CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds};
+                        EXECUTE format(
+                            'INSERT INTO {name} (%1$s) SELECT %1$s FROM {table}_default WHERE {rows.replace("'", "''")};',
+                            columns
+                        );
+                        DELETE FROM {table}_default WHERE {rows};
+                        ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT;
+                    END;
+                    $$;
+                    """
+                ).strip()
+            ))
+            start = end
+        return returning
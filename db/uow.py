@@ -1,34 +1,74 @@
+import contextvars
 import asyncpg
+from asyncpg.transaction import Transaction
 from db.manager import AsyncPGPoolManager
 import typing
 
 __all__ = (
-    "AsyncPGPoolManager"
+    "UnitOfWork",
+)
+
+# Connection owned by the outermost UnitOfWork of the current task
+_current_connection: contextvars.ContextVar[asyncpg.Connection | None] = contextvars.ContextVar(
+    "current_connection", default=None
 )
 
 class UnitOfWork:
-    __instance: typing.ClassVar["UnitOfWork | None"] = None
 
-    def __init__(self) -> None:
+    def __init__(self, readonly: bool = False, autocommit: bool = False) -> None:
+        self.readonly: bool = readonly
+        self.autocommit: bool = autocommit
         self.mgr: AsyncPGPoolManager | None = None
         self.conn: asyncpg.Connection | None = None
-        self.transaction: typing.Any | None = None
+        self.transaction: Transaction | None = None
+        self._token: contextvars.Token | None = None
 
-    @classmethod
-    def instance(cls) -> "UnitOfWork":
-        if not cls.__instance:
-            cls.__instance = cls()
-        return cls.__instance
+    @staticmethod
+    def current() -> asyncpg.Connection | None:
+        return _current_connection.get()
 
     async def __aenter__(self) -> asyncpg.Connection:
+        outer = _current_connection.get()
+        if outer is not None:
+            # Nested scope: reuse the outer connection, savepoint when the outer scope is transactional
+            self.conn = outer
+            if not self.autocommit:
+                self.transaction = outer.transaction()
+                await self.transaction.start()
+            return self.conn
+
         self.mgr = await AsyncPGPoolManager.instance()
-        self.conn = await self.mgr.pool.acquire()
-        self.transaction = self.conn.transaction()
-        await self.transaction.__aenter__()
+        # Read-only scopes may be served by a replica (see AsyncPGPoolManager._route)
+        self.conn = await self.mgr.acquire(readonly=self.readonly)
+        try:
+            if not self.autocommit:
+                self.transaction = self.conn.transaction(readonly=self.readonly)
+                await self.transaction.start()
+        except BaseException:
+            await self.mgr.release(self.conn)
+            raise
+        self._token = _current_connection.set(self.conn)
         return self.conn
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.transaction:
-            await self.transaction.__aexit__(exc_type, exc_val, exc_tb)
-        if self.mgr and self.conn:
-            await self.mgr.pool.release(self.conn)
\ No newline at end of file
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            if self.transaction:
+                if exc_type is None:
+                    await self.transaction.commit()
+                else:
+                    await self.transaction.rollback()
+            if exc_type is None and self._token is not None and not self.readonly:
+                self.mgr.wrote()
+        finally:
+            if self._token is not None:
+                try:
+                    _current_connection.reset(self._token)
+                except ValueError:
+                    # An abandoned async generator is finalized by asyncio in another Context, the token can't be
+                    # reset there; the variable dies with its original Context anyway
+                    pass
+                finally:
+                    await self.mgr.release(self.conn)
+            self.transaction = None
+            self.conn = None
+            self._token = None
@@ -1,24 +1,61 @@
-from datetime import datetime
-from dataclasses import dataclass
+from datetime import datetime, date
 import typing
 import uuid
+import msgspec
 # from typeguard import typechecked
 
+# Request bodies are decoded and validated by Litestar straight into these Structs, which the repositories take as is
+PositiveInt = typing.Annotated[int, msgspec.Meta(gt=0)]
+
 class TaskDTO(typing.TypedDict):
     id: int
     title: str
     description: str
     done: bool
     uid: uuid.UUID
+    version: int
 
-@dataclass
-class AddTaskDTO:
-    title: str
+class TaskPageDTO(typing.TypedDict):
+    items: list[TaskDTO]
+    next: str | None
+
+class TaskSearchHitDTO(typing.TypedDict):
+    item: TaskDTO
+    rank: float
+    headline: str
+
+class TaskSearchPageDTO(typing.TypedDict):
+    items: list[TaskSearchHitDTO]
+    next: str | None
+
+class TaskBulkResultDTO(typing.TypedDict):
+    index: int
+    status: str
+    item: TaskDTO | None
+
+class ImportResultDTO(typing.TypedDict):
+    imported: int
+    chunks: int
+
+class AddTaskDTO(msgspec.Struct, kw_only=True):
+    title: str = "New task"
     description: str
 
-@dataclass
-class TaskUpdateDTO:
-    id: int
+# One record of an import file, exported files can be imported as is: other columns (id, uid, version) are ignored
+class TaskImportDTO(msgspec.Struct, kw_only=True):
+    title: str = "New task"
+    # Nullable like the columns, exports write null for them
+    description: str | None = None
+    done: bool = False
+
+class TaskIdDTO(msgspec.Struct):
+    id: PositiveInt
+
+class TaskIdsDTO(msgspec.Struct):
+    ids: list[PositiveInt]
+
+class TaskUpdateDTO(msgspec.Struct):
+    id: PositiveInt
     title: str
     description: str
     done: bool
@@ -29,14 +66,116 @@ class CalendarNoteDTO(typing.TypedDict):
     date: datetime
     title: str
     note: str
+    version: int
+
+class CalendarNotePageDTO(typing.TypedDict):
+    items: list[CalendarNoteDTO]
+    next: str | None
+
+class CalendarOccurrenceDTO(typing.TypedDict):
+    series_id: int
+    # Start given by the rule, identifies the occurrence; date differs when an exception moved it
+    occurrence: datetime
+    date: datetime
+    title: str
+    note: str | None
+
+class CalendarDayDTO(typing.TypedDict):
+    day: date
+    count: int
+    # Notes and occurrences of recurring series, in time order
+    notes: list[CalendarNoteDTO | CalendarOccurrenceDTO]
+
+class CalendarNoteSearchHitDTO(typing.TypedDict):
+    item: CalendarNoteDTO
+    rank: float
+    headline: str
+
+class CalendarNoteSearchPageDTO(typing.TypedDict):
+    items: list[CalendarNoteSearchHitDTO]
+    next: str | None
+
+class CalendarNoteBulkResultDTO(typing.TypedDict):
+    index: int
+    status: str
+    item: CalendarNoteDTO | None
+
+class AddCalendarNoteDTO(msgspec.Struct, kw_only=True):
+    title: str = "New note"
+    note: str
+    date: datetime | None = None
+
+class CalendarNoteImportDTO(msgspec.Struct, kw_only=True):
+    title: str = "New note"
+    note: str | None = None
+    date: datetime | None = None
 
-@dataclass
-class AddCalendarNoteDTO:
+class CalendarNoteIdDTO(msgspec.Struct):
+    id: PositiveInt
+
+class CalendarNoteIdsDTO(msgspec.Struct):
+    ids: list[PositiveInt]
+
+class CalendarNoteUpdateDTO(msgspec.Struct):
+    id: PositiveInt
     title: str
     note: str
 
-@dataclass
-class CalendarNoteUpdateDTO:
+class CalendarSeriesDTO(typing.TypedDict):
     id: int
+    uid: uuid.UUID
+    starts: datetime
+    ends: datetime | None
+    rule: str
+    tz: str
     title: str
-    note: str
\ No newline at end of file
+    note: str | None
+    version: int
+
+class CalendarSeriesExceptionDTO(typing.TypedDict):
+    series_id: int
+    occurrence: datetime
+    cancelled: bool
+    date: datetime | None
+    title: str | None
+    note: str | None
+
+class AddCalendarSeriesDTO(msgspec.Struct, kw_only=True):
+    title: str = "New note"
+    note: str | None = None
+    # First occurrence, a naive value is read in tz
+    starts: datetime
+    rule: str
+    tz: str = "UTC"
+
+class CalendarSeriesIdDTO(msgspec.Struct):
+    id: PositiveInt
+
+class CalendarSeriesOccurrenceIdDTO(msgspec.Struct):
+    series_id: PositiveInt
+    occurrence: datetime
+
+class CalendarSeriesExceptionUpdateDTO(msgspec.Struct, kw_only=True):
+    series_id: PositiveInt
+    occurrence: datetime
+    cancelled: bool = False
+    date: datetime | None = None
+    title: str | None = None
+    note: str | None = None
+
+class CalendarReminderDTO(typing.TypedDict):
+    id: int
+    note_id: int
+    due: datetime
+    claimed_until: datetime | None
+    attempts: int
+    sent_at: datetime | None
+    error: str | None
+
+class AddCalendarReminderDTO(msgspec.Struct, kw_only=True):
+    note_id: PositiveInt
+    # Seconds before the note's date
+    before: typing.Annotated[int, msgspec.Meta(ge=0)] = 0
+
+class CalendarReminderIdDTO(msgspec.Struct):
+    id: PositiveInt
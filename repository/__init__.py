@@ -1,3 +1,5 @@
 from .base import BaseRepository
 from .task import TaskRepository
-from .calendar import CalendarNoteRepository
\ No newline at end of file
+from .calendar import CalendarNoteRepository
+from .series import CalendarSeriesRepository
+from .reminders import CalendarReminderRepository
\ No newline at end of file
@@ -1,19 +1,388 @@
-from dto import TaskDTO, TaskUpdateDTO, AddTaskDTO
+import asyncio
 import typing
+import uuid
+import asyncpg
 from loguru import logger as log
 from db.uow import UnitOfWork
 from db.models import BaseAbstractModel
+from core.settings import settings
+from repository.pagination import Cursor
+from repository.cache import RepositoryCache
+from db.statements import StatementRegistry
+from db.serialization import RecordEncoder
+from core.tenant import Tenant
+from db.changes import ChangeFeed
+from core.exceptions import InvalidImportError
+
+BulkResult = tuple[int, str, asyncpg.Record | None]
+
+CREATED: typing.Final[str] = "created"
+UPDATED: typing.Final[str] = "updated"
+DELETED: typing.Final[str] = "deleted"
+CONFLICT: typing.Final[str] = "conflict"
+NOT_FOUND: typing.Final[str] = "not_found"
 
 class BaseRepository:
+    # Per repository SQL templates, formatted and registered once per model by StatementRegistry
+    __statements__: typing.ClassVar[dict[str, str]] = {}
+    # Other models the templates read, by placeholder name
+    __related__: typing.ClassVar[dict[str, typing.Type[BaseAbstractModel]]] = {}
+
     def __init__(
             self,
             return_dto: typing.Type[typing.TypedDict],
-            table: str
+            model: typing.Type[BaseAbstractModel]
     ) -> None:
-        self.uow: typing.Callable[[], UnitOfWork | None] = UnitOfWork.instance
+        self.uow: typing.Callable[..., UnitOfWork] = UnitOfWork
         self.return_dto: typing.Type[typing.TypedDict] = return_dto
-        self.table: str = table
+        self.table: str = model.__table__
+        # Repositories only work on tenant scoped models, $1 of every statement is the tenant
+        if not model.__tenant__:
+            raise ValueError(f"{model.__cls_repr__()} has no __tenant__ column")
+        self.tenant_column: str = model.__tenant__
+        self.columns: list[str] = StatementRegistry.columns(model)
+        self.sql: dict[str, str] = self.register(model)
+        self.cache: RepositoryCache | None = RepositoryCache.for_table(self.table, return_dto)
+        self.encoder: RecordEncoder = RecordEncoder.for_model(model)
         self.log = log
 
-    async def transaction(self) -> UnitOfWork:
-        return self.uow()
\ No newline at end of file
+    @classmethod
+    def register(cls, model: typing.Type[BaseAbstractModel]) -> dict[str, str]:
+        return StatementRegistry.register(model, cls, cls.__statements__, cls.__related__)
+
+    @property
+    def tenant(self) -> uuid.UUID:
+        return Tenant.current()
+
+    async def transaction(self, readonly: bool = False, autocommit: bool = False) -> UnitOfWork:
+        return self.uow(readonly=readonly, autocommit=autocommit)
+
+    async def _read_through(
+            self,
+            key: typing.Any,
+            loader: typing.Callable[[typing.Any], typing.Awaitable[typing.Any]],
+            min_version: int | None = None
+    ) -> typing.Any:
+        if self.cache is None:
+            return await loader(key)
+        # Cache entries are per tenant, the loader still gets the bare key
+        scoped = (self.tenant, key)
+        value = await self.cache.get_or_load(scoped, lambda _: loader(key))
+        if value is not None and min_version is not None and value["version"] < min_version:
+            # The cached copy predates a write made through another process
+            await self.cache.invalidate(scoped)
+            value = await self.cache.get_or_load(scoped, lambda _: loader(key))
+        return value
+
+    async def _invalidate(self, *keys: typing.Any) -> None:
+        if self.cache is not None:
+            tenant = self.tenant
+            await self.cache.invalidate(*((tenant, key) for key in keys))
+
+    async def _publish(self, uow: asyncpg.Connection, op: str, *rows: typing.Mapping[str, typing.Any] | None) -> None:
+        # Change feed events of the written rows, NOTIFY is delivered on commit and discarded on rollback
+        if settings.CHANGES_ENABLED:
+            await ChangeFeed.publish(uow, self.tenant, self.table, op, [row for row in rows if row is not None])
+
+    @staticmethod
+    def _like_prefix(prefix: str | None) -> str | None:
+        if not prefix:
+            return None
+        return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    async def _page(
+            self,
+            query: str,
+            filters: typing.Sequence[typing.Any],
+            cursor: str | None,
+            limit: int
+    ) -> tuple[typing.Sequence[asyncpg.Record], str | None]:
+        # List statements take ($1 tenant, $2 after id, ...filters, $n limit), ids start at 1 so 0 means "from the start"
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            rows = await uow.fetch(
+                query,
+                self.tenant, Cursor.decode(cursor) or 0, *filters, limit + 1
+            )
+        return Cursor.page(rows, limit)
+
+    async def _stream(
+            self,
+            query: str,
+            filters: typing.Sequence[typing.Any]
+    ) -> typing.AsyncIterator[asyncpg.Record]:
+        # Server-side cursors only live inside a transaction, LIMIT NULL means no limit
+        async with await self.transaction(readonly=True) as uow:
+            async for row in uow.cursor(query, self.tenant, 0, *filters, None, prefetch=settings.CURSOR_PREFETCH):
+                yield row
+
+    async def _stream_chunks(
+            self,
+            query: str,
+            filters: typing.Sequence[typing.Any]
+    ) -> typing.AsyncIterator[list[asyncpg.Record]]:
+        # Same as _stream, one batch of CURSOR_PREFETCH rows at a time so callers can encode them at once
+        async with await self.transaction(readonly=True) as uow:
+            cursor = await uow.cursor(query, self.tenant, 0, *filters, None)
+            while rows := await cursor.fetch(settings.CURSOR_PREFETCH):
+                yield rows
+
+    async def _copy_out(
+            self,
+            query: str,
+            filters: typing.Sequence[typing.Any]
+    ) -> typing.AsyncIterator[bytes]:
+        # COPY (list statement) TO STDOUT as CSV with a header. The COPY runs in a task feeding a queue of
+        # EXPORT_QUEUE_SIZE chunks, once it's full the COPY waits for the client instead of buffering
+        queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=settings.EXPORT_QUEUE_SIZE)
+        tenant = self.tenant
+
+        async def copy() -> None:
+            try:
+                async with await self.transaction(readonly=True) as uow:
+                    await uow.copy_from_query(
+                        query.rstrip().rstrip(";"), tenant, 0, *filters, None,
+                        output=queue.put, format="csv", header=True
+                    )
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _copy_in(
+            self,
+            columns: typing.Sequence[str],
+            records: typing.AsyncIterable[tuple[typing.Any, ...]],
+            chunk_size: int
+    ) -> tuple[int, int]:
+        # COPY into the table in chunks of chunk_size records, one transaction each, so a single chunk is held in
+        # memory; ids, uids and versions come from the column defaults. Returns (rows, chunks)
+        tenant = self.tenant
+        imported = chunks = 0
+        chunk: list[tuple[typing.Any, ...]] = []
+
+        async def flush() -> None:
+            nonlocal imported, chunks
+            async with await self.transaction() as uow:
+                await uow.copy_records_to_table(
+                    self.table, records=chunk, columns=[self.tenant_column, *columns]
+                )
+            imported += len(chunk)
+            chunks += 1
+            chunk.clear()
+
+        try:
+            async for record in records:
+                chunk.append((tenant, *record))
+                if len(chunk) >= chunk_size:
+                    await flush()
+        except InvalidImportError as e:
+            raise InvalidImportError(f"{e} ({imported} rows were imported before it)") from e
+        if chunk:
+            await flush()
+        return imported, chunks
+
+    async def _search(
+            self,
+            query: str,
+            cursor: str | None,
+            limit: int
+    ) -> tuple[typing.Sequence[asyncpg.Record], str | None]:
+        # The search statement takes ($1 tenant, $2 query, $3 after rank, $4 after id, $5 limit)
+        rank, last_id = Cursor.decode_ranked(cursor) or (None, None)
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            rows = await uow.fetch(
+                self.sql["search"],
+                self.tenant, query, rank, last_id, limit + 1
+            )
+        return Cursor.page_ranked(rows, limit)
+
+    async def _autocomplete(self, prefix: str, limit: int) -> typing.Sequence[asyncpg.Record]:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            return await uow.fetch(
+                self.sql["autocomplete"],
+                self.tenant, prefix, self._like_prefix(prefix), limit
+            )
+
+    def _hits(self, rows: typing.Sequence[asyncpg.Record]) -> list[dict[str, typing.Any]]:
+        # Search rows are the model columns followed by rank and headline
+        return [
+            {
+                "item": self.return_dto(**dict(zip(self.columns, row))),
+                "rank": row["rank"],
+                "headline": row["headline"],
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _chunks(items: typing.Sequence[typing.Any], size: int) -> typing.Iterator[tuple[int, typing.Sequence[typing.Any]]]:
+        for offset in range(0, len(items), size):
+            yield offset, items[offset:offset + size]
+
+    @staticmethod
+    def _split_ord(row: asyncpg.Record) -> tuple[int, asyncpg.Record | None]:
+        item = dict(row)
+        ord_ = item.pop("_ord")
+        return ord_, item if item["id"] is not None else None
+
+    async def _bulk_insert(
+            self,
+            columns: typing.Sequence[tuple[str, str]],
+            records: typing.Sequence[tuple[typing.Any, ...]],
+            chunk_size: int,
+            expressions: typing.Mapping[str, str] | None = None,
+            merge: typing.Sequence[str] = ()
+    ) -> list[BulkResult]:
+        # columns are (name, type) pairs of the staging table, expressions may wrap a staged column (e.g. COALESCE).
+        # merge names the staged columns of a unique key (with the tenant): an item matching an existing row
+        # updates it, otherwise items conflicting with any key are skipped
+        expressions = expressions or {}
+        names = [name for name, _ in columns]
+        stage = f"{self.table}_stage"
+        select = ", ".join(expressions.get(name, name) for name in names)
+        if merge:
+            keys = [names.index(name) for name in merge]
+            target = ", ".join([self.tenant_column, *merge])
+            assignments = ", ".join(f"{name} = EXCLUDED.{name}" for name in names if name not in merge)
+            conflict = f"ON CONFLICT ({target}) DO UPDATE SET {assignments}"
+            # An updated row keeps its id, so rows are matched on the key and told apart by the drawn id
+            match = " AND ".join(f"ins.{name} = src.{name}" for name in merge)
+        else:
+            conflict, match = "ON CONFLICT DO NOTHING", "ins.id = src.id"
+        results: list[BulkResult] = []
+        for offset, chunk in self._chunks(records, chunk_size):
+            staged = list(enumerate(chunk, offset))
+            if merge:
+                # A key twice in one statement can't be merged, the last occurrence wins
+                last = {tuple(record[idx] for idx in keys): ord_ for ord_, record in staged}
+                results.extend(
+                    (ord_, CONFLICT, None) for ord_, record in staged
+                    if last[tuple(record[idx] for idx in keys)] != ord_
+                )
+                staged = [(ord_, record) for ord_, record in staged if last[tuple(record[idx] for idx in keys)] == ord_]
+            async with await self.transaction() as uow:
+                await uow.execute(
+                    f"""
+                    CREATE TEMP TABLE IF NOT EXISTS {stage} (
+                        _ord INTEGER, {", ".join(f"{name} {type_}" for name, type_ in columns)}
+                    ) ON COMMIT DELETE ROWS;
+                    TRUNCATE {stage};
+                    """
+                )
+                await uow.copy_records_to_table(
+                    stage,
+                    records=[(ord_, *record) for ord_, record in staged],
+                    columns=["_ord", *names]
+                )
+                # Ids are drawn up front so every staged row can be matched to what was inserted
+                rows = await uow.fetch(
+                    f"""
+                    WITH src AS (
+                        SELECT _ord, nextval(pg_get_serial_sequence('{self.table}', 'id')) AS id, {", ".join(names)}
+                        FROM {stage}
+                    ), ins AS (
+                        INSERT INTO {self.table} (id, {self.tenant_column}, {", ".join(names)})
+                        SELECT id, $1, {select} FROM src ORDER BY _ord
+                        {conflict}
+                        RETURNING {", ".join(self.columns)}
+                    )
+                    SELECT src._ord, src.id = ins.id AS _created, {", ".join(f"ins.{column}" for column in self.columns)}
+                    FROM src LEFT JOIN ins ON {match} ORDER BY src._ord;
+                    """,
+                    self.tenant
+                )
+                chunk_results = []
+                for row in rows:
+                    row = dict(row)
+                    created = row.pop("_created")
+                    ord_, item = self._split_ord(row)
+                    chunk_results.append((ord_, CONFLICT if item is None else CREATED if created else UPDATED, item))
+                await self._publish(uow, CREATED, *(item for _, status, item in chunk_results if status == CREATED))
+                await self._publish(uow, UPDATED, *(item for _, status, item in chunk_results if status == UPDATED))
+            results.extend(chunk_results)
+        results.sort(key=lambda result: result[0])
+        await self._invalidate(*(item["id"] for _, status, item in results if status == UPDATED))
+        return results
+
+    async def _bulk_update(
+            self,
+            columns: typing.Sequence[tuple[str, str]],
+            records: typing.Sequence[tuple[typing.Any, ...]],
+            chunk_size: int
+    ) -> list[BulkResult]:
+        # columns[0] must be ("id", ...), records hold values in the same order, $1 is the tenant
+        names = [name for name, _ in columns]
+        query = f"""
+            WITH u AS (
+                SELECT * FROM UNNEST($2::integer[], {", ".join(f"${idx + 3}::{type_}[]" for idx, (_, type_) in enumerate(columns))})
+                AS u(_ord, {", ".join(names)})
+            ), upd AS (
+                UPDATE {self.table} AS t SET {", ".join(f"{name} = u.{name}" for name in names[1:])}
+                FROM u WHERE t.{self.tenant_column} = $1 AND t.id = u.id
+                RETURNING {", ".join(f"t.{column}" for column in self.columns)}
+            )
+            SELECT u._ord, {", ".join(f"upd.{column}" for column in self.columns)}
+            FROM u LEFT JOIN upd ON upd.id = u.id ORDER BY u._ord;
+        """
+        single = f"""
+            UPDATE {self.table} SET {", ".join(f"{name} = ${idx + 3}" for idx, name in enumerate(names[1:]))}
+            WHERE {self.tenant_column} = $1 AND id = $2 RETURNING {", ".join(self.columns)};
+        """
+        results: list[BulkResult] = []
+        for offset, chunk in self._chunks(records, chunk_size):
+            # The same id twice in one UPDATE ... FROM is applied only once, the last occurrence wins
+            last: dict[typing.Any, int] = {record[0]: idx for idx, record in enumerate(chunk)}
+            staged = [(offset + idx, *record) for idx, record in enumerate(chunk) if last[record[0]] == idx]
+            results.extend((offset + idx, CONFLICT, None) for idx, record in enumerate(chunk) if last[record[0]] != idx)
+            start = len(results)
+            async with await self.transaction() as uow:
+                try:
+                    async with await self.transaction():
+                        rows = await uow.fetch(query, self.tenant, *(list(column) for column in zip(*staged)))
+                    for row in rows:
+                        ord_, item = self._split_ord(row)
+                        results.append((ord_, UPDATED if item else NOT_FOUND, item))
+                except asyncpg.UniqueViolationError:
+                    # Fall back to row-by-row savepoints to find out which items conflict
+                    for ord_, *record in staged:
+                        try:
+                            async with await self.transaction():
+                                row = await uow.fetchrow(single, self.tenant, *record)
+                            results.append((ord_, UPDATED if row else NOT_FOUND, row))
+                        except asyncpg.UniqueViolationError:
+                            results.append((ord_, CONFLICT, None))
+                await self._publish(uow, UPDATED, *(item for _, status, item in results[start:] if status == UPDATED))
+        results.sort(key=lambda result: result[0])
+        await self._invalidate(*(item["id"] for _, status, item in results if status == UPDATED))
+        return results
+
+    async def _bulk_delete(
+            self,
+            ids: typing.Sequence[int],
+            chunk_size: int
+    ) -> list[BulkResult]:
+        results: list[BulkResult] = []
+        for offset, chunk in self._chunks(ids, chunk_size):
+            async with await self.transaction() as uow:
+                rows = await uow.fetch(
+                    f"""
+                    DELETE FROM {self.table} WHERE {self.tenant_column} = $1 AND id = ANY($2::integer[])
+                    RETURNING {", ".join(self.columns)};
+                    """,
+                    self.tenant, list(chunk)
+                )
+                await self._publish(uow, DELETED, *rows)
+            deleted = {row["id"]: row for row in rows}
+            for idx, id_ in enumerate(chunk):
+                row = deleted.pop(id_, None)
+                results.append((offset + idx, DELETED if row else NOT_FOUND, row))
+        await self._invalidate(*(item["id"] for _, status, item in results if status == DELETED))
+        return results
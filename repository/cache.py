@@ -0,0 +1,256 @@
+import abc
+import asyncio
+import collections
+import time
+import typing
+import msgspec
+from loguru import logger as log
+from core.settings import settings
+from db.changes import ChangeEvent
+
+# Change feed operations that can leave a cached row stale
+STALE_OPS: typing.Final[frozenset[str]] = frozenset({"updated", "deleted"})
+
+__all__ = (
+    "AbstractCacheBackend",
+    "MemoryCacheBackend",
+    "DictCacheBackend",
+    "RepositoryCache",
+)
+
+class AbstractCacheBackend(abc.ABC):
+    # Values are opaque bytes so the same interface fits out-of-process stores
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> bytes | None: ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    @abc.abstractmethod
+    async def delete(self, *keys: str) -> None: ...
+
+    def stats(self) -> dict[str, typing.Any]:
+        return {}
+
+
+class MemoryCacheBackend(AbstractCacheBackend):
+    # In-process LRU bounded by the total size of keys and values, entries also expire after their ttl
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+        self._entries: collections.OrderedDict[str, tuple[float, bytes]] = collections.OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        cost = len(key) + len(value)
+        if cost > self.max_bytes:
+            return
+        self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size += cost
+        while self.size > self.max_bytes:
+            evicted, (_, evicted_value) = self._entries.popitem(last=False)
+            self.size -= len(evicted) + len(evicted_value)
+            self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(key) + len(entry[1])
+
+    def stats(self) -> dict[str, typing.Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class DictCacheBackend(AbstractCacheBackend):
+    # Unbounded local stand-in for an external store (Redis, Memcached) in development and tests
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.data.pop(key, None)
+
+    def stats(self) -> dict[str, typing.Any]:
+        return {
+            "entries": len(self.data),
+        }
+
+
+class RepositoryCache:
+    _backend: typing.ClassVar[AbstractCacheBackend | None] = None
+    _caches: typing.ClassVar[dict[str, "RepositoryCache"]] = {}
+    # Invalidations of writes made by other processes, scheduled from the change feed
+    _pending: typing.ClassVar[set[asyncio.Task]] = set()
+
+    def __init__(
+            self,
+            namespace: str,
+            dto: typing.Type[typing.TypedDict],
+            backend: AbstractCacheBackend,
+            ttl: float
+    ) -> None:
+        self.namespace: str = namespace
+        self.backend: AbstractCacheBackend = backend
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0
+        self.invalidations: int = 0
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder(dto)
+        self._inflight: dict[typing.Any, asyncio.Future] = {}
+        # Bumped on every invalidation, a load that raced with a write is not stored
+        self._generation: int = 0
+        # Part of every key, bumped to drop all entries at once (they age out of the backend)
+        self._epoch: int = 0
+        self.log = log
+
+    @classmethod
+    def configure(cls, backend: AbstractCacheBackend | None) -> None:
+        cls._backend = backend
+        cls._caches = {}
+
+    @classmethod
+    def backend(cls) -> AbstractCacheBackend:
+        if cls._backend is None:
+            cls._backend = MemoryCacheBackend(settings.CACHE_MAX_BYTES)
+        return cls._backend
+
+    @classmethod
+    def for_table(cls, table: str, dto: typing.Type[typing.TypedDict]) -> "RepositoryCache | None":
+        if not settings.CACHE_ENABLED:
+            return None
+        cache = cls._caches.get(table)
+        if cache is None:
+            cache = cls._caches[table] = cls(table, dto, cls.backend(), settings.CACHE_TTL)
+        return cache
+
+    @classmethod
+    def on_change(cls, event: ChangeEvent | None) -> None:
+        # Change feed listener: each process drops its copy of rows updated or deleted anywhere, and everything
+        # after the feed lost events. The writing process already invalidated, the echo is harmless
+        if event is None:
+            for cache in cls._caches.values():
+                cache.clear()
+            return
+        if event.op not in STALE_OPS:
+            return
+        cache = cls._caches.get(event.table)
+        if cache is None:
+            return
+        task = asyncio.get_running_loop().create_task(cache.invalidate((event.tenant, event.id)))
+        cls._pending.add(task)
+        task.add_done_callback(cls._pending.discard)
+
+    @classmethod
+    def stats(cls) -> dict[str, typing.Any]:
+        return {
+            "enabled": settings.CACHE_ENABLED,
+            "backend": cls.backend().stats(),
+            "tables": {
+                table: {
+                    "hits": cache.hits,
+                    "misses": cache.misses,
+                    "coalesced": cache.coalesced,
+                    "invalidations": cache.invalidations,
+                }
+                for table, cache in cls._caches.items()
+            },
+        }
+
+    def _key(self, key: typing.Any) -> str:
+        return f"{self.namespace}:{self._epoch}:{key}"
+
+    async def get_or_load(
+            self,
+            key: typing.Any,
+            loader: typing.Callable[[typing.Any], typing.Awaitable[typing.Any]]
+    ) -> typing.Any:
+        raw = await self.backend.get(self._key(key))
+        if raw is not None:
+            self.hits += 1
+            return self._decoder.decode(raw)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the leading request was cancelled, load on our own
+                if not inflight.cancelled():
+                    raise
+                return await loader(key)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await loader(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a future nobody waited on doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(value)
+
+        if value is not None and generation == self._generation:
+            await self.backend.set(self._key(key), self._encoder.encode(value), self.ttl)
+        return value
+
+    async def invalidate(self, *keys: typing.Any) -> None:
+        if not keys:
+            return
+        self._generation += 1
+        self.invalidations += len(keys)
+        for key in keys:
+            self._inflight.pop(key, None)
+        await self.backend.delete(*(self._key(key) for key in keys))
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._generation += 1
+        self._inflight.clear()
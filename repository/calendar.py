@@ -1,45 +1,349 @@
 from db.models import BaseAbstractModel
 from repository import BaseRepository
-from dto import CalendarNoteDTO, CalendarNoteUpdateDTO, AddCalendarNoteDTO
+from repository.base import BulkResult, CREATED, UPDATED, DELETED
+import datetime
+import heapq
+import itertools
+import zoneinfo
+from dto import (
+    CalendarNoteDTO, CalendarNoteUpdateDTO, AddCalendarNoteDTO, CalendarNotePageDTO, CalendarDayDTO,
+    CalendarNoteBulkResultDTO, CalendarNoteSearchPageDTO, CalendarOccurrenceDTO, CalendarNoteImportDTO, ImportResultDTO
+)
+from core.settings import settings
+from core.exceptions import VersionConflictError
+from repository.ical import ICalendar
 import typing
+import asyncpg
+import msgspec
 
 class CalendarNoteRepository(BaseRepository):
+    # $1 is always the tenant
+    __statements__ = {
+        "add": """
+            INSERT INTO {table} ({tenant}, title, note, date) VALUES ($1, $2, $3, COALESCE($4, now()))
+            RETURNING {columns};
+        """,
+        "get": "SELECT {columns} FROM {table} WHERE {tenant} = $1 AND id = $2;",
+        "delete": "DELETE FROM {table} WHERE {tenant} = $1 AND id = $2 RETURNING {columns};",
+        "update": "UPDATE {table} SET title = $3, note = $4 WHERE {tenant} = $1 AND id = $2 RETURNING {columns};",
+        # If-Match: only when the row still has one of the versions the client has seen
+        "update_if_match": """
+            UPDATE {table} SET title = $3, note = $4
+            WHERE {tenant} = $1 AND id = $2 AND version = ANY($5::bigint[])
+            RETURNING {columns};
+        """,
+        "version": "SELECT version FROM {table} WHERE {tenant} = $1 AND id = $2;",
+        # Ranked full-text search on the GIN indexed tsvector, snippets are only cut for the returned page
+        "search": """
+            WITH query AS (SELECT websearch_to_tsquery('{search_config}', $2) AS q),
+            hits AS (
+                SELECT {columns}, ts_rank_cd({search}, query.q) AS rank
+                FROM {table}, query
+                WHERE {tenant} = $1 AND {search} @@ query.q
+            )
+            SELECT page.*,
+                   ts_headline('{search_config}', {search_document}, query.q, 'MaxFragments=2, MaxWords=20, MinWords=5')
+                       AS headline
+            FROM (
+                SELECT * FROM hits
+                WHERE $3::real IS NULL OR (rank, id) < ($3::real, $4::integer)
+                ORDER BY rank DESC, id DESC
+                LIMIT $5
+            ) page, query
+            ORDER BY rank DESC, id DESC;
+        """,
+        # Autocomplete: the trigram GiST index answers both the ILIKE prefix and the distance ordering
+        "autocomplete": """
+            SELECT {columns}, similarity(title, $2) AS rank, title AS headline
+            FROM {table}
+            WHERE {tenant} = $1 AND title ILIKE $3
+            ORDER BY title <-> $2, id
+            LIMIT $4;
+        """,
+        "list": """
+            SELECT {columns} FROM {table}
+            WHERE {tenant} = $1
+              AND id > $2
+              AND ($3::text IS NULL OR title LIKE $3)
+            ORDER BY id
+            LIMIT $4;
+        """,
+        # .ics feed: its version from aggregates only, the (id, version) index in feed order, then the notes to render.
+        # It was last modified by its latest insert or update, or by a deletion ({table}_deletions, kept by a trigger)
+        "feed_version": """
+            SELECT count(*) AS count, COALESCE(sum(id), 0)::bigint AS id_sum, COALESCE(sum(version), 0)::bigint AS version_sum,
+                   GREATEST(max(modified), (SELECT deleted_at FROM {table}_deletions WHERE {tenant} = $1)) AS modified
+            FROM {table} WHERE {tenant} = $1;
+        """,
+        "feed_index": "SELECT id, version, modified FROM {table} WHERE {tenant} = $1 ORDER BY date, id;",
+        "feed_deleted": "SELECT deleted_at FROM {table}_deletions WHERE {tenant} = $1;",
+        "feed_notes": "SELECT {columns} FROM {table} WHERE {tenant} = $1 AND id = ANY($2::integer[]);",
+        # One index range scan on (tenant, date) over the partitions of the window, bucketed per local day
+        "range": """
+            SELECT date_trunc('day', date AT TIME ZONE $4)::date AS day,
+                   count(*) AS count,
+                   jsonb_agg(jsonb_build_object({json_columns}) ORDER BY date, id)::text AS notes
+            FROM {table}
+            WHERE {tenant} = $1 AND date >= $2 AND date < $3
+            GROUP BY day
+            ORDER BY day;
+        """,
+    }
+    _notes_decoder: typing.ClassVar[msgspec.json.Decoder] = msgspec.json.Decoder(typing.List[CalendarNoteDTO])
 
     def __init__(
             self,
             model: typing.Type[BaseAbstractModel]
     ) -> None:
-        super().__init__(CalendarNoteDTO, model.__table__)
+        super().__init__(CalendarNoteDTO, model)
 
     async def add(self, note: AddCalendarNoteDTO) -> CalendarNoteDTO:
         async with await self.transaction() as uow:
             row = await uow.fetchrow(
-                f"INSERT INTO {self.table} (title, note) VALUES ($1, $2) RETURNING *;",
-                note.title, note.note
+                self.sql["add"],
+                self.tenant, note.title, note.note, note.date
             )
+            await self._publish(uow, CREATED, row)
         return self.return_dto(**row)
 
 
-    async def get(self, note_id: int) -> CalendarNoteDTO:
-        async with await self.transaction() as uow:
+    async def get(self, note_id: int, min_version: int | None = None) -> CalendarNoteDTO | None:
+        return await self._read_through(note_id, self._get, min_version)
+
+    async def _get(self, note_id: int) -> CalendarNoteDTO | None:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
             row = await uow.fetchrow(
-                f"SELECT * FROM {self.table} WHERE id = $1;",
-                note_id
+                self.sql["get"],
+                self.tenant, note_id
+            )
+        return self.return_dto(**row) if row else None
+
+    async def version(self, note_id: int) -> int | None:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            return await uow.fetchval(
+                self.sql["version"],
+                self.tenant, note_id
             )
-        return self.return_dto(**row)
 
-    async def delete(self, note_id: int) -> CalendarNoteDTO:
+    async def delete(self, note_id: int) -> CalendarNoteDTO | None:
         async with await self.transaction() as uow:
             row = await uow.fetchrow(
-                f"DELETE FROM {self.table} WHERE id = $1 RETURNING *;",
-                note_id
+                self.sql["delete"],
+                self.tenant, note_id
             )
-        return self.return_dto(**row)
+            await self._publish(uow, DELETED, row)
+        await self._invalidate(note_id)
+        return self.return_dto(**row) if row else None
 
-    async def update(self, task: CalendarNoteUpdateDTO) -> CalendarNoteDTO:
+    async def update(
+            self,
+            task: CalendarNoteUpdateDTO,
+            versions: typing.Sequence[int] | None = None
+    ) -> CalendarNoteDTO | None:
+        # versions comes from If-Match, a row that exists with another version raises VersionConflictError
         async with await self.transaction() as uow:
-            row = await uow.fetchrow(
-                f"UPDATE {self.table} SET title = $2, note = $3 WHERE id = $1 RETURNING *;",
-                task.id, task.title, task.note
+            if versions is None:
+                row = await uow.fetchrow(
+                    self.sql["update"],
+                    self.tenant, task.id, task.title, task.note
+                )
+            else:
+                row = await uow.fetchrow(
+                    self.sql["update_if_match"],
+                    self.tenant, task.id, task.title, task.note, list(versions)
+                )
+                if row is None and await uow.fetchval(self.sql["version"], self.tenant, task.id) is not None:
+                    raise VersionConflictError(task.id)
+            await self._publish(uow, UPDATED, row)
+        await self._invalidate(task.id)
+        return self.return_dto(**row) if row else None
+
+    async def list(
+            self,
+            cursor: str | None = None,
+            limit: int = settings.PAGE_SIZE,
+            title_prefix: str | None = None
+    ) -> CalendarNotePageDTO:
+        rows, next_cursor = await self._page(
+            self.sql["list"], (self._like_prefix(title_prefix),), cursor, limit
+        )
+        return CalendarNotePageDTO(
+            items=[self.return_dto(**row) for row in rows],
+            next=next_cursor
+        )
+
+    async def list_json(
+            self,
+            cursor: str | None = None,
+            limit: int = settings.PAGE_SIZE,
+            title_prefix: str | None = None
+    ) -> bytes:
+        rows, next_cursor = await self._page(
+            self.sql["list"], (self._like_prefix(title_prefix),), cursor, limit
+        )
+        return self.encoder.encode_page(rows, next_cursor)
+
+    async def stream(self, title_prefix: str | None = None) -> typing.AsyncIterator[CalendarNoteDTO]:
+        async for row in self._stream(self.sql["list"], (self._like_prefix(title_prefix),)):
+            yield self.return_dto(**row)
+
+    async def stream_json(self, title_prefix: str | None = None) -> typing.AsyncIterator[bytes]:
+        async for rows in self._stream_chunks(self.sql["list"], (self._like_prefix(title_prefix),)):
+            yield self.encoder.encode_lines(rows)
+
+    async def feed_version(self) -> tuple[int, datetime.datetime]:
+        # (version, last modified)
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            row = await uow.fetchrow(self.sql["feed_version"], self.tenant)
+        return ICalendar.version(row["count"], row["id_sum"], row["version_sum"]), ICalendar.last_modified(
+            row["modified"]
+        )
+
+    async def feed(self) -> tuple[int, datetime.datetime, typing.AsyncIterator[bytes]]:
+        # The version is computed from the index the feed is rendered from, so it always matches the body
+        tenant = self.tenant
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            index = await uow.fetch(self.sql["feed_index"], tenant)
+            deleted = await uow.fetchval(self.sql["feed_deleted"], tenant)
+        version = ICalendar.version(
+            len(index), sum(row["id"] for row in index), sum(row["version"] for row in index)
+        )
+        stamps = [row["modified"] for row in index]
+        if deleted is not None:
+            stamps.append(deleted)
+        modified = ICalendar.last_modified(max(stamps, default=None))
+
+        async def load(note_ids: list[int]) -> typing.Sequence[asyncpg.Record]:
+            async with await self.transaction(readonly=True, autocommit=True) as uow:
+                return await uow.fetch(self.sql["feed_notes"], tenant, note_ids)
+
+        return version, modified, ICalendar.render(tenant, index, load)
+
+    def export_csv(self) -> typing.AsyncIterator[bytes]:
+        return self._copy_out(self.sql["list"], (None,))
+
+    async def import_records(
+            self,
+            notes: typing.AsyncIterable[CalendarNoteImportDTO],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> ImportResultDTO:
+        # COPY doesn't go through the date column's default, notes without one are dated at the start of the import
+        now = datetime.datetime.now(datetime.UTC)
+        imported, chunks = await self._copy_in(
+            ("title", "note", "date"),
+            ((note.title, note.note, note.date or now) async for note in notes),
+            chunk_size
+        )
+        return ImportResultDTO(imported=imported, chunks=chunks)
+
+    async def range(
+            self,
+            start: datetime.datetime,
+            end: datetime.datetime,
+            tz: str = "UTC",
+            occurrences: typing.Iterable[CalendarOccurrenceDTO] = ()
+    ) -> typing.List[CalendarDayDTO]:
+        # occurrences are those of recurring series in the same range, in time order, merged into the days
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            rows = await uow.fetch(
+                self.sql["range"],
+                self.tenant, start, end, tz
             )
-        return self.return_dto(**row)
\ No newline at end of file
+        days = (
+            CalendarDayDTO(
+                day=row["day"],
+                count=row["count"],
+                notes=self._notes_decoder.decode(row["notes"])
+            )
+            for row in rows
+        )
+        return list(self._merge_days(days, occurrences, zoneinfo.ZoneInfo(tz)))
+
+    @staticmethod
+    def _merge_days(
+            days: typing.Iterable[CalendarDayDTO],
+            occurrences: typing.Iterable[CalendarOccurrenceDTO],
+            zone: zoneinfo.ZoneInfo
+    ) -> typing.Iterator[CalendarDayDTO]:
+        # Both sides are in time order: walk the days and each local day's occurrences side by side
+        days = iter(days)
+        day = next(days, None)
+        for local_day, group in itertools.groupby(occurrences, key=lambda item: item["date"].astimezone(zone).date()):
+            while day is not None and day["day"] < local_day:
+                yield day
+                day = next(days, None)
+            if day is not None and day["day"] == local_day:
+                notes = list(heapq.merge(day["notes"], group, key=lambda item: item["date"]))
+                day = next(days, None)
+            else:
+                notes = list(group)
+            yield CalendarDayDTO(day=local_day, count=len(notes), notes=notes)
+        if day is not None:
+            yield day
+        yield from days
+
+    async def search(
+            self,
+            query: str,
+            cursor: str | None = None,
+            limit: int = settings.PAGE_SIZE
+    ) -> CalendarNoteSearchPageDTO:
+        rows, next_cursor = await self._search(query, cursor, limit)
+        return CalendarNoteSearchPageDTO(
+            items=self._hits(rows),
+            next=next_cursor
+        )
+
+    async def autocomplete(
+            self,
+            prefix: str,
+            limit: int = settings.PAGE_SIZE
+    ) -> CalendarNoteSearchPageDTO:
+        return CalendarNoteSearchPageDTO(
+            items=self._hits(await self._autocomplete(prefix, limit)),
+            next=None
+        )
+
+    def _bulk_results(self, results: typing.Sequence[BulkResult]) -> typing.List[CalendarNoteBulkResultDTO]:
+        return [
+            CalendarNoteBulkResultDTO(
+                index=index,
+                status=status,
+                item=self.return_dto(**item) if item else None
+            )
+            for index, status, item in results
+        ]
+
+    async def bulk_add(
+            self,
+            notes: typing.Sequence[AddCalendarNoteDTO],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> typing.List[CalendarNoteBulkResultDTO]:
+        # Notes carry no natural key (uid is generated), so every item is a new note
+        results = await self._bulk_insert(
+            [("title", "TEXT"), ("note", "TEXT"), ("date", "TIMESTAMPTZ")],
+            [(note.title, note.note, note.date) for note in notes],
+            chunk_size,
+            expressions={"date": "COALESCE(date, now())"}
+        )
+        return self._bulk_results(results)
+
+    async def bulk_update(
+            self,
+            notes: typing.Sequence[CalendarNoteUpdateDTO],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> typing.List[CalendarNoteBulkResultDTO]:
+        results = await self._bulk_update(
+            [("id", "INTEGER"), ("title", "TEXT"), ("note", "TEXT")],
+            [(note.id, note.title, note.note) for note in notes],
+            chunk_size
+        )
+        return self._bulk_results(results)
+
+    async def bulk_delete(
+            self,
+            note_ids: typing.Sequence[int],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> typing.List[CalendarNoteBulkResultDTO]:
+        results = await self._bulk_delete(note_ids, chunk_size)
+        return self._bulk_results(results)
@@ -0,0 +1,162 @@
+import asyncio
+import collections
+import contextvars
+import time
+import typing
+import uuid
+from loguru import logger as log
+from core.settings import settings
+from core.metrics import Histogram
+from core.tenant import Tenant
+
+__all__ = (
+    "WriteCoalescer",
+)
+
+# flush(items) writes the items of one tenant (set as the current tenant) in one transaction and returns the
+# resulting rows by key, keys missing from the result resolve to None (not found)
+Flush = typing.Callable[[typing.Sequence[typing.Any]], typing.Awaitable[typing.Mapping[typing.Any, typing.Any]]]
+
+class _Pending:
+    __slots__ = ("item", "futures")
+
+    def __init__(self, item: typing.Any, future: asyncio.Future) -> None:
+        self.item: typing.Any = item
+        self.futures: list[asyncio.Future] = [future]
+
+
+class WriteCoalescer:
+    # Group commit for single-row writes of one table: submissions go through an asyncio queue to a worker that
+    # collects them for WRITE_COALESCE_SECONDS after the first one (or WRITE_COALESCE_MAX_BATCH rows), keeps the
+    # last write per (tenant, key) and flushes the batch; every caller's future resolves after the commit
+    BATCH_BUCKETS: typing.ClassVar[tuple[float, ...]] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    _coalescers: typing.ClassVar[dict[str, "WriteCoalescer"]] = {}
+
+    def __init__(self, name: str, flush: Flush) -> None:
+        self.name: str = name
+        self.flush: Flush = flush
+        self.submitted: int = 0
+        self.written: int = 0
+        self.batches: int = 0
+        self.failed: int = 0
+        self.batch_rows: Histogram = Histogram(self.BATCH_BUCKETS)
+        self.flush_seconds: Histogram = Histogram()
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self.log = log
+
+    @classmethod
+    def for_table(cls, table: str, flush: Flush) -> "WriteCoalescer":
+        coalescer = cls._coalescers.get(table)
+        if coalescer is None:
+            coalescer = cls._coalescers[table] = cls(table, flush)
+        return coalescer
+
+    @classmethod
+    def coalescers(cls) -> typing.Sequence["WriteCoalescer"]:
+        return list(cls._coalescers.values())
+
+    @classmethod
+    async def close_all(cls) -> None:
+        # Flushes what is queued, called on shutdown before the pool closes
+        await asyncio.gather(*(coalescer.close() for coalescer in cls._coalescers.values()))
+
+    @classmethod
+    def stats(cls) -> dict[str, typing.Any]:
+        return {
+            "enabled": settings.WRITE_COALESCING,
+            "tables": {
+                name: {
+                    "submitted": coalescer.submitted,
+                    "written": coalescer.written,
+                    "batches": coalescer.batches,
+                    "failed": coalescer.failed,
+                    # Submitted updates per row written, 1.0 means nothing was coalesced
+                    "coalescing_ratio": round(coalescer.submitted / coalescer.written, 3) if coalescer.written else None,
+                    "batch_rows": coalescer.batch_rows.snapshot(),
+                    "flush_seconds": coalescer.flush_seconds.snapshot(),
+                }
+                for name, coalescer in cls._coalescers.items()
+            },
+        }
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not asyncio.get_running_loop():
+            self._queue = asyncio.Queue()
+            # A fresh context: the worker must not inherit the submitting request's tenant, connection or metrics
+            self._worker = asyncio.get_running_loop().create_task(self._run(self._queue), context=contextvars.Context())
+        return self._queue
+
+    async def submit(self, key: typing.Any, item: typing.Any) -> typing.Any:
+        # key identifies the row within the current tenant, item is what flush receives
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_worker().put_nowait((Tenant.current(), key, item, future, time.perf_counter()))
+        self.submitted += 1
+        return await future
+
+    async def close(self) -> None:
+        if self._worker is not None and not self._worker.done() and self._queue is not None:
+            self._queue.put_nowait(None)
+            await self._worker
+        self._worker = self._queue = None
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            started = entry[4]
+            pending: dict[tuple[uuid.UUID, typing.Any], _Pending] = {}
+            closing = False
+            while True:
+                tenant, key, item, future, _ = entry
+                known = pending.get((tenant, key))
+                if known is None:
+                    pending[(tenant, key)] = _Pending(item, future)
+                else:
+                    known.item = item
+                    known.futures.append(future)
+                if len(pending) >= settings.WRITE_COALESCE_MAX_BATCH:
+                    break
+                timeout = started + settings.WRITE_COALESCE_SECONDS - time.perf_counter()
+                if timeout <= 0 and queue.empty():
+                    break
+                try:
+                    entry = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+            await self._flush(pending, started)
+            if closing:
+                return
+
+    async def _flush(self, pending: dict[tuple[uuid.UUID, typing.Any], _Pending], started: float) -> None:
+        tenants: dict[uuid.UUID, list[tuple[typing.Any, _Pending]]] = collections.defaultdict(list)
+        for (tenant, key), entry in pending.items():
+            tenants[tenant].append((key, entry))
+        await asyncio.gather(*(self._flush_tenant(tenant, entries) for tenant, entries in tenants.items()))
+        self.batches += 1
+        self.written += len(pending)
+        self.batch_rows.observe(len(pending))
+        self.flush_seconds.observe(time.perf_counter() - started)
+
+    async def _flush_tenant(self, tenant: uuid.UUID, entries: list[tuple[typing.Any, _Pending]]) -> None:
+        try:
+            with Tenant.scope(tenant):
+                rows = await self.flush([entry.item for _, entry in entries])
+        except Exception as e:
+            # Every caller of the batch gets the error, as it would have from its own transaction
+            self.failed += 1
+            self.log.warning(f"Coalesced write of {len(entries)} {self.name} rows failed: {e!r}")
+            for _, entry in entries:
+                for future in entry.futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, entry in entries:
+            for future in entry.futures:
+                if not future.done():
+                    future.set_result(rows.get(key))
@@ -0,0 +1,129 @@
+import datetime
+import hashlib
+import typing
+import uuid
+import asyncpg
+from core.settings import settings
+from repository.cache import RepositoryCache
+
+__all__ = (
+    "ICalendar",
+)
+
+class ICalendar:
+    # RFC 5545 feed of calendar notes. Each VEVENT block is rendered once per (note id, version) and kept in the
+    # repository cache backend, a feed is the concatenation of the blocks in date order
+
+    # Part of every cache key and feed version, bump it when the rendering changes
+    FORMAT: typing.ClassVar[int] = 1
+    PRODID: typing.ClassVar[str] = "-//Task-Calendar-API//Calendar notes//EN"
+    HEADER: typing.ClassVar[bytes] = b"".join(
+        line.encode() + b"\r\n" for line in (
+            "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+            "X-WR-CALNAME:Calendar notes",
+        )
+    )
+    FOOTER: typing.ClassVar[bytes] = b"END:VCALENDAR\r\n"
+    # Last-Modified of a tenant that never had a note
+    EPOCH: typing.ClassVar[datetime.datetime] = datetime.datetime.fromtimestamp(0, datetime.UTC)
+    rendered: typing.ClassVar[int] = 0
+    reused: typing.ClassVar[int] = 0
+
+    @classmethod
+    def version(cls, count: int, id_sum: int, version_sum: int) -> int:
+        # Ids only grow and versions only go up, so any insert, update or delete changes one of the three
+        digest = hashlib.blake2b(f"{cls.FORMAT}:{count}:{id_sum}:{version_sum}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest)
+
+    @classmethod
+    def last_modified(cls, modified: datetime.datetime | None) -> datetime.datetime:
+        # HTTP dates have a resolution of one second, a change within the second of a previous response is only
+        # seen through the ETag
+        if modified is None:
+            return cls.EPOCH
+        return modified.astimezone(datetime.UTC).replace(microsecond=0)
+
+    @staticmethod
+    def escape(text: str) -> str:
+        return (
+            text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+        )
+
+    @staticmethod
+    def fold(line: str) -> bytes:
+        # Content lines are at most 75 octets, continuations start with a space; UTF-8 sequences aren't split
+        raw = line.encode()
+        if len(raw) <= 75:
+            return raw + b"\r\n"
+        parts = []
+        start, limit = 0, 75
+        while start < len(raw):
+            end = min(start + limit, len(raw))
+            while end < len(raw) and raw[end] & 0xC0 == 0x80:
+                end -= 1
+            parts.append(raw[start:end])
+            start, limit = end, 74
+        return b"\r\n ".join(parts) + b"\r\n"
+
+    @staticmethod
+    def timestamp(value: datetime.datetime) -> str:
+        return value.astimezone(datetime.UTC).strftime("%Y%m%dT%H%M%SZ")
+
+    @classmethod
+    def event(cls, note: typing.Mapping[str, typing.Any]) -> bytes:
+        # Deterministic for a given version: DTSTAMP is the note's date rather than the time of rendering
+        start = cls.timestamp(note["date"])
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{note['uid']}",
+            f"DTSTAMP:{start}",
+            f"DTSTART:{start}",
+            f"SEQUENCE:{note['version']}",
+            f"SUMMARY:{cls.escape(note['title'])}",
+        ]
+        if note["note"]:
+            lines.append(f"DESCRIPTION:{cls.escape(note['note'])}")
+        lines.append("END:VEVENT")
+        return b"".join(cls.fold(line) for line in lines)
+
+    @classmethod
+    def _key(cls, tenant: uuid.UUID, note_id: int, version: int) -> str:
+        return f"ics:{cls.FORMAT}:{tenant}:{note_id}:{version}"
+
+    @classmethod
+    async def render(
+            cls,
+            tenant: uuid.UUID,
+            index: typing.Sequence[asyncpg.Record],
+            load: typing.Callable[[list[int]], typing.Awaitable[typing.Sequence[asyncpg.Record]]],
+            batch: int = settings.CURSOR_PREFETCH
+    ) -> typing.AsyncIterator[bytes]:
+        # index holds (id, version) in feed order; blocks are taken from the cache, only the notes missing from it
+        # (new or changed since) are loaded, one query per batch, and rendered
+        backend = RepositoryCache.backend()
+        yield cls.HEADER
+        for offset in range(0, len(index), batch):
+            rows = index[offset:offset + batch]
+            blocks: list[bytes | None] = [
+                await backend.get(cls._key(tenant, row["id"], row["version"])) for row in rows
+            ]
+            missing = [row["id"] for row, block in zip(rows, blocks) if block is None]
+            loaded: dict[int, asyncpg.Record] = {}
+            if missing:
+                loaded = {note["id"]: note for note in await load(missing)}
+            chunk = []
+            for row, block in zip(rows, blocks):
+                if block is None:
+                    note = loaded.get(row["id"])
+                    if note is None:
+                        # Deleted since the index was read
+                        continue
+                    block = cls.event(note)
+                    cls.rendered += 1
+                    await backend.set(cls._key(tenant, note["id"], note["version"]), block, settings.ICS_CACHE_TTL)
+                else:
+                    cls.reused += 1
+                chunk.append(block)
+            yield b"".join(chunk)
+        yield cls.FOOTER
@@ -0,0 +1,66 @@
+import base64
+import binascii
+import json
+import typing
+from core.exceptions import InvalidCursorError
+
+__all__ = (
+    "Cursor",
+)
+
+class Cursor:
+
+    @staticmethod
+    def encode(last_id: int) -> str:
+        raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    @staticmethod
+    def decode(token: str | None) -> int | None:
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            last_id = json.loads(raw)["id"]
+        except (binascii.Error, ValueError, KeyError, TypeError) as e:
+            raise InvalidCursorError(token) from e
+        if not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise InvalidCursorError(token)
+        return last_id
+
+    @staticmethod
+    def encode_ranked(rank: float, last_id: int) -> str:
+        # Search pages are ordered by (rank DESC, id DESC), the rank is the float4 the database returned
+        raw = json.dumps({"rank": rank, "id": last_id}, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    @staticmethod
+    def decode_ranked(token: str | None) -> tuple[float, int] | None:
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            payload = json.loads(raw)
+            rank, last_id = payload["rank"], payload["id"]
+        except (binascii.Error, ValueError, KeyError, TypeError) as e:
+            raise InvalidCursorError(token) from e
+        if not isinstance(rank, (int, float)) or isinstance(rank, bool):
+            raise InvalidCursorError(token)
+        if not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise InvalidCursorError(token)
+        return float(rank), last_id
+
+    @staticmethod
+    def page(rows: typing.Sequence[typing.Any], limit: int) -> tuple[typing.Sequence[typing.Any], str | None]:
+        # Rows are fetched with LIMIT limit + 1, the extra row only tells that another page exists
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, Cursor.encode(rows[-1]["id"])
+        return rows, None
+
+    @staticmethod
+    def page_ranked(rows: typing.Sequence[typing.Any], limit: int) -> tuple[typing.Sequence[typing.Any], str | None]:
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, Cursor.encode_ranked(rows[-1]["rank"], rows[-1]["id"])
+        return rows, None
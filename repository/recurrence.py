@@ -0,0 +1,222 @@
+import calendar
+import datetime
+import typing
+import zoneinfo
+from core.exceptions import InvalidRecurrenceError
+from core.settings import settings
+
+__all__ = (
+    "RecurrenceRule",
+)
+
+FREQUENCIES: typing.Final[tuple[str, ...]] = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS: typing.Final[tuple[str, ...]] = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+class RecurrenceRule:
+    # Subset of RFC 5545 RRULE: FREQ, INTERVAL, COUNT, UNTIL, BYDAY (weekly) and BYMONTHDAY (monthly).
+    # Occurrences keep the wall-clock time of the first one in the series' time zone, across DST changes,
+    # and are generated lazily period by period
+
+    # Periods in a row without an occurrence after which expansion stops, e.g. BYMONTHDAY=31;INTERVAL=12
+    # started in a 30 day month can never match again
+    MAX_EMPTY_PERIODS: typing.ClassVar[int] = 1000
+    # Larger intervals only serve to reach the end of the datetime range
+    MAX_INTERVAL: typing.ClassVar[int] = 1000
+
+    def __init__(
+            self,
+            freq: str,
+            interval: int = 1,
+            count: int | None = None,
+            until: datetime.datetime | None = None,
+            by_day: typing.Sequence[int] = (),
+            by_month_day: typing.Sequence[int] = ()
+    ) -> None:
+        self.freq: str = freq
+        self.interval: int = interval
+        self.count: int | None = count
+        self.until: datetime.datetime | None = until
+        self.by_day: tuple[int, ...] = tuple(sorted(set(by_day)))
+        self.by_month_day: tuple[int, ...] = tuple(sorted(set(by_month_day)))
+
+    @classmethod
+    def parse(cls, rule: str) -> "RecurrenceRule":
+        parts: dict[str, str] = {}
+        for part in rule.strip().removeprefix("RRULE:").split(";"):
+            name, sep, value = part.partition("=")
+            if not sep or not value or name.upper() in parts:
+                raise InvalidRecurrenceError(f"Invalid recurrence rule part {part!r}")
+            parts[name.upper()] = value.upper()
+
+        freq = parts.pop("FREQ", None)
+        if freq not in FREQUENCIES:
+            raise InvalidRecurrenceError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+        interval, count, until, by_day, by_month_day = (
+            parts.pop(name, None) for name in ("INTERVAL", "COUNT", "UNTIL", "BYDAY", "BYMONTHDAY")
+        )
+        try:
+            interval = int(interval) if interval is not None else 1
+            count = int(count) if count is not None else None
+            until = cls._parse_until(until) if until is not None else None
+            by_day = [WEEKDAYS.index(day) for day in by_day.split(",")] if by_day is not None else []
+            by_month_day = [int(day) for day in by_month_day.split(",")] if by_month_day is not None else []
+        except ValueError as e:
+            raise InvalidRecurrenceError(f"Invalid recurrence rule {rule!r}") from e
+
+        if parts:
+            raise InvalidRecurrenceError(f"Unsupported recurrence rule parts {', '.join(sorted(parts))}")
+        if not 1 <= interval <= cls.MAX_INTERVAL:
+            raise InvalidRecurrenceError(f"INTERVAL must be between 1 and {cls.MAX_INTERVAL}")
+        if count is not None and not 1 <= count <= settings.MAX_RECURRENCE_COUNT:
+            raise InvalidRecurrenceError(f"COUNT must be between 1 and {settings.MAX_RECURRENCE_COUNT}")
+        if count is not None and until is not None:
+            raise InvalidRecurrenceError("COUNT and UNTIL are mutually exclusive")
+        if by_day and freq != "WEEKLY":
+            raise InvalidRecurrenceError("BYDAY is only supported with FREQ=WEEKLY")
+        if by_month_day and freq != "MONTHLY":
+            raise InvalidRecurrenceError("BYMONTHDAY is only supported with FREQ=MONTHLY")
+        if any(day == 0 or not -31 <= day <= 31 for day in by_month_day):
+            raise InvalidRecurrenceError("BYMONTHDAY days must be between -31 and 31, except 0")
+        return cls(freq, interval, count, until, by_day, by_month_day)
+
+    @staticmethod
+    def _parse_until(value: str) -> datetime.datetime:
+        # UTC date-time (20250131T235959Z) or date (20250131, the whole day is included)
+        if len(value) == 8:
+            return datetime.datetime.strptime(value, "%Y%m%d").replace(
+                hour=23, minute=59, second=59, tzinfo=datetime.UTC
+            )
+        return datetime.datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=datetime.UTC)
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.astimezone(datetime.UTC):%Y%m%dT%H%M%SZ}")
+        if self.by_day:
+            parts.append(f"BYDAY={','.join(WEEKDAYS[day] for day in self.by_day)}")
+        if self.by_month_day:
+            parts.append(f"BYMONTHDAY={','.join(str(day) for day in self.by_month_day)}")
+        return ";".join(parts)
+
+    @staticmethod
+    def _add_months(wall: datetime.datetime, months: int) -> tuple[int, int]:
+        total = wall.year * 12 + wall.month - 1 + months
+        return total // 12, total % 12 + 1
+
+    def _period_offset(self, wall: datetime.datetime, at: datetime.datetime) -> int:
+        # Number of whole periods between the first occurrence and `at` (both wall-clock), one period early
+        # so the time zone offset can't make us skip an occurrence
+        if self.freq == "DAILY":
+            elapsed = (at.date() - wall.date()).days
+        elif self.freq == "WEEKLY":
+            elapsed = ((at.date() - datetime.timedelta(days=at.weekday()))
+                       - (wall.date() - datetime.timedelta(days=wall.weekday()))).days // 7
+        elif self.freq == "MONTHLY":
+            elapsed = (at.year - wall.year) * 12 + at.month - wall.month
+        else:
+            elapsed = at.year - wall.year
+        return max(0, elapsed // self.interval - 1)
+
+    def _period(self, wall: datetime.datetime, k: int) -> tuple[datetime.datetime, list[datetime.datetime]]:
+        # Start of the k-th period and its candidate wall-clock times, in order
+        step = k * self.interval
+        if self.freq == "DAILY":
+            day = wall + datetime.timedelta(days=step)
+            return day, [day]
+        if self.freq == "WEEKLY":
+            monday = wall - datetime.timedelta(days=wall.weekday()) + datetime.timedelta(weeks=step)
+            days = self.by_day or (wall.weekday(),)
+            return monday.replace(hour=0, minute=0, second=0, microsecond=0), [
+                monday + datetime.timedelta(days=day) for day in days
+            ]
+        if self.freq == "MONTHLY":
+            year, month = self._add_months(wall, step)
+            length = calendar.monthrange(year, month)[1]
+            days = sorted({
+                day if day > 0 else length + day + 1
+                for day in self.by_month_day or (wall.day,)
+                if -length <= day <= length
+            })
+            return wall.replace(year=year, month=month, day=1, hour=0, minute=0, second=0, microsecond=0), [
+                wall.replace(year=year, month=month, day=day) for day in days
+            ]
+        year = wall.year + step
+        start = wall.replace(year=year, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        if wall.month == 2 and wall.day == 29 and not calendar.isleap(year):
+            return start, []
+        return start, [wall.replace(year=year)]
+
+    def occurrences(
+            self,
+            start: datetime.datetime,
+            tz: str,
+            window_start: datetime.datetime | None = None,
+            window_end: datetime.datetime | None = None
+    ) -> typing.Iterator[datetime.datetime]:
+        # Occurrences in [window_start, window_end) in time order, as aware datetimes in the series' time zone.
+        # Without COUNT, expansion jumps straight to the period of window_start instead of walking from `start`
+        zone = zoneinfo.ZoneInfo(tz)
+        try:
+            yield from self._expand(start, zone, window_start, window_end)
+        except (OverflowError, ValueError):
+            # The next period is past year 9999, nothing follows; stored rows must not break range reads
+            return
+
+    def _expand(
+            self,
+            start: datetime.datetime,
+            zone: zoneinfo.ZoneInfo,
+            window_start: datetime.datetime | None,
+            window_end: datetime.datetime | None
+    ) -> typing.Iterator[datetime.datetime]:
+        first = start.astimezone(zone)
+        wall = first.replace(tzinfo=None)
+        k = 0
+        if self.count is None and window_start is not None:
+            k = self._period_offset(wall, window_start.astimezone(zone).replace(tzinfo=None))
+        emitted = 0
+        empty = 0
+        while True:
+            period_start, candidates = self._period(wall, k)
+            if window_end is not None and period_start.replace(tzinfo=zone) >= window_end:
+                return
+            found = False
+            for candidate in candidates:
+                at = candidate.replace(tzinfo=zone)
+                if at < first:
+                    continue
+                if self.until is not None and at > self.until:
+                    return
+                found = True
+                emitted += 1
+                if window_end is not None and at >= window_end:
+                    return
+                if window_start is None or at >= window_start:
+                    yield at
+                if self.count is not None and emitted >= self.count:
+                    return
+            empty = 0 if found else empty + 1
+            if empty >= self.MAX_EMPTY_PERIODS:
+                return
+            k += 1
+
+    def bound(self, start: datetime.datetime, tz: str) -> datetime.datetime | None:
+        # Upper bound of the occurrences (UNTIL, or the last one for COUNT), None when the series repeats forever
+        if self.until is not None:
+            return self.until
+        if self.count is None:
+            return None
+        returning = None
+        try:
+            for returning in self._expand(start, zoneinfo.ZoneInfo(tz), None, None):
+                pass
+        except (OverflowError, ValueError):
+            raise InvalidRecurrenceError("Recurrence rule runs past the supported date range (year 9999)")
+        return returning
+
+    def occurs(self, start: datetime.datetime, tz: str, at: datetime.datetime) -> bool:
+        return next(self.occurrences(start, tz, at, at + datetime.timedelta(microseconds=1)), None) == at
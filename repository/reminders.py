@@ -0,0 +1,117 @@
+import typing
+import uuid
+import asyncpg
+from db.models import BaseAbstractModel, _CalendarNoteModel
+from repository import BaseRepository
+from repository.base import CREATED, DELETED
+from dto import CalendarReminderDTO, AddCalendarReminderDTO
+
+class CalendarReminderRepository(BaseRepository):
+    # $1 is the tenant, except in the scheduler statements (upcoming, claim, sent, failed) which see every tenant
+    __related__ = {"notes": _CalendarNoteModel}
+    __statements__ = {
+        # Due `before` seconds ahead of the note's date, nothing is inserted when the note doesn't exist
+        "add": """
+            INSERT INTO {table} ({tenant}, note_id, due)
+            SELECT $1, id, date - make_interval(secs => $3) FROM {notes} WHERE {notes_tenant} = $1 AND id = $2
+            RETURNING {columns};
+        """,
+        "list": "SELECT {columns} FROM {table} WHERE {tenant} = $1 AND note_id = $2 ORDER BY due, id;",
+        "delete": "DELETE FROM {table} WHERE {tenant} = $1 AND id = $2 RETURNING {columns};",
+        # Pending reminders due within $1 seconds (by the database clock), retries at the end of their backoff
+        "upcoming": """
+            SELECT {tenant} AS tenant, id, EXTRACT(EPOCH FROM GREATEST(due, claimed_until) - now())::float8 AS delay
+            FROM {table}
+            WHERE sent_at IS NULL
+              AND due < now() + make_interval(secs => $1)
+              AND (claimed_until IS NULL OR claimed_until < now() + make_interval(secs => $1))
+            ORDER BY due
+            LIMIT $2;
+        """,
+        # Leases up to $1 due reminders for $2 seconds; rows claimed by another worker are skipped rather than
+        # waited for, an expired lease (crashed worker) makes the reminder claimable again
+        "claim": """
+            WITH claimed AS (
+                UPDATE {table} SET claimed_until = now() + make_interval(secs => $2), attempts = attempts + 1
+                WHERE ({tenant}, id) IN (
+                    SELECT {tenant}, id FROM {table}
+                    WHERE sent_at IS NULL AND due <= now() AND (claimed_until IS NULL OR claimed_until <= now())
+                    ORDER BY due
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {tenant}, id, note_id, due, attempts
+            )
+            SELECT claimed.{tenant} AS tenant, claimed.id, claimed.note_id, claimed.due, claimed.attempts,
+                   notes.uid, notes.title, notes.note, notes.date
+            FROM claimed
+            LEFT JOIN {notes} notes ON notes.{notes_tenant} = claimed.{tenant} AND notes.id = claimed.note_id;
+        """,
+        "sent": """
+            UPDATE {table} SET sent_at = now(), claimed_until = NULL, error = NULL
+            FROM UNNEST($1::uuid[], $2::integer[]) AS s(_tenant, _id)
+            WHERE {tenant} = s._tenant AND id = s._id;
+        """,
+        # Retried after _retry seconds, or given up (sent_at set, error kept) when _retry is NULL
+        "failed": """
+            UPDATE {table}
+            SET error = f._error,
+                claimed_until = now() + make_interval(secs => f._retry),
+                sent_at = CASE WHEN f._retry IS NULL THEN now() END
+            FROM UNNEST($1::uuid[], $2::integer[], $3::text[], $4::float8[]) AS f(_tenant, _id, _error, _retry)
+            WHERE {tenant} = f._tenant AND id = f._id;
+        """,
+    }
+
+    def __init__(
+            self,
+            model: typing.Type[BaseAbstractModel]
+    ) -> None:
+        super().__init__(CalendarReminderDTO, model)
+
+    async def add(self, reminder: AddCalendarReminderDTO) -> CalendarReminderDTO | None:
+        async with await self.transaction() as uow:
+            row = await uow.fetchrow(
+                self.sql["add"],
+                self.tenant, reminder.note_id, reminder.before
+            )
+            await self._publish(uow, CREATED, row)
+        return self.return_dto(**row) if row else None
+
+    async def list(self, note_id: int) -> typing.List[CalendarReminderDTO]:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            rows = await uow.fetch(
+                self.sql["list"],
+                self.tenant, note_id
+            )
+        return [self.return_dto(**row) for row in rows]
+
+    async def delete(self, reminder_id: int) -> CalendarReminderDTO | None:
+        async with await self.transaction() as uow:
+            row = await uow.fetchrow(
+                self.sql["delete"],
+                self.tenant, reminder_id
+            )
+            await self._publish(uow, DELETED, row)
+        return self.return_dto(**row) if row else None
+
+    async def upcoming(self, window: float, limit: int) -> typing.List[asyncpg.Record]:
+        # Not routed to a replica: a lagging one would report reminders that were already sent
+        async with await self.transaction(autocommit=True) as uow:
+            return await uow.fetch(self.sql["upcoming"], window, limit)
+
+    async def claim(self, limit: int, lease: float) -> typing.List[asyncpg.Record]:
+        async with await self.transaction() as uow:
+            return await uow.fetch(self.sql["claim"], limit, lease)
+
+    async def finish(
+            self,
+            sent: typing.Sequence[tuple[uuid.UUID, int]],
+            failed: typing.Sequence[tuple[uuid.UUID, int, str, float | None]]
+    ) -> None:
+        # sent: (tenant, id), failed: (tenant, id, error, seconds until the retry or None to give up)
+        async with await self.transaction() as uow:
+            if sent:
+                await uow.execute(self.sql["sent"], *(list(column) for column in zip(*sent)))
+            if failed:
+                await uow.execute(self.sql["failed"], *(list(column) for column in zip(*failed)))
@@ -0,0 +1,224 @@
+import abc
+import asyncio
+import datetime
+import heapq
+import typing
+import uuid
+import msgspec
+from loguru import logger as log
+from core.settings import settings
+from db.models import _CalendarReminderModel
+from repository.reminders import CalendarReminderRepository
+
+__all__ = (
+    "Reminder",
+    "ReminderSink",
+    "LogSink",
+    "MemorySink",
+    "ReminderScheduler",
+)
+
+class Reminder(msgspec.Struct, gc=False):
+    tenant: uuid.UUID
+    id: int
+    note_id: int
+    due: datetime.datetime
+    attempts: int
+    uid: uuid.UUID
+    title: str
+    note: str | None
+    date: datetime.datetime
+
+
+class ReminderSink(abc.ABC):
+    # Where due reminders are delivered; subclasses register under `name` and are picked by REMINDER_SINK.
+    # send raises to have the reminder retried
+    name: typing.ClassVar[str] = ""
+    _sinks: typing.ClassVar[dict[str, typing.Type["ReminderSink"]]] = {}
+
+    def __init_subclass__(cls, **kw) -> None:
+        super().__init_subclass__(**kw)
+        if cls.name:
+            ReminderSink._sinks[cls.name] = cls
+
+    @classmethod
+    def create(cls, name: str) -> "ReminderSink":
+        sink = cls._sinks.get(name)
+        if sink is None:
+            raise ValueError(f"Unknown reminder sink {name!r}, expected one of {sorted(cls._sinks)}")
+        return sink()
+
+    @abc.abstractmethod
+    async def send(self, reminder: Reminder) -> None: ...
+
+
+class LogSink(ReminderSink):
+    name = "log"
+
+    async def send(self, reminder: Reminder) -> None:
+        log.info(f"Reminder {reminder.id} of note {reminder.note_id} ({reminder.title!r}) for tenant {reminder.tenant}")
+
+
+class MemorySink(ReminderSink):
+    # Local fake: keeps what it was sent, `fail` makes the next deliveries raise
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.sent: list[Reminder] = []
+        self.fail: int = 0
+
+    async def send(self, reminder: Reminder) -> None:
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("MemorySink failure")
+        self.sent.append(reminder)
+
+
+class ReminderScheduler:
+    # One per process, started by ASGILifespan. Every REMINDER_POLL_SECONDS the pending reminders due within
+    # REMINDER_WINDOW_SECONDS (at most REMINDER_PREFETCH of them) are loaded into a heap of wake-up times; when
+    # one is reached the due reminders are claimed in batches with FOR UPDATE SKIP LOCKED, so the workers of
+    # every process share them without delivering one twice while its lease holds
+    sink: typing.ClassVar[ReminderSink | None] = None
+    _heap: typing.ClassVar[list[tuple[float, uuid.UUID, int]]] = []
+    _wake: typing.ClassVar[asyncio.Event | None] = None
+    _task: typing.ClassVar[asyncio.Task | None] = None
+    _repo: typing.ClassVar[CalendarReminderRepository | None] = None
+    delivered: typing.ClassVar[int] = 0
+    retried: typing.ClassVar[int] = 0
+    given_up: typing.ClassVar[int] = 0
+    orphaned: typing.ClassVar[int] = 0
+    claims: typing.ClassVar[int] = 0
+    log = log
+
+    @classmethod
+    def use(cls, sink: ReminderSink) -> None:
+        cls.sink = sink
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls._task is not None and not cls._task.done():
+            return
+        if cls.sink is None:
+            cls.sink = ReminderSink.create(settings.REMINDER_SINK)
+        cls._repo = CalendarReminderRepository(_CalendarReminderModel)
+        cls._heap = []
+        cls._wake = asyncio.Event()
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        task, cls._task = cls._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        cls._heap = []
+
+    @classmethod
+    def nudge(cls, tenant: uuid.UUID, reminder_id: int, due: datetime.datetime) -> None:
+        # A reminder added by this process, scheduled without waiting for the next poll; the other processes
+        # pick it up with theirs
+        if cls._task is None or cls._wake is None:
+            return
+        delay = (due - datetime.datetime.now(datetime.UTC)).total_seconds()
+        if delay < settings.REMINDER_WINDOW_SECONDS:
+            heapq.heappush(cls._heap, (asyncio.get_running_loop().time() + max(delay, 0.0), tenant, reminder_id))
+            cls._wake.set()
+
+    @classmethod
+    def stats(cls) -> dict[str, typing.Any]:
+        return {
+            "running": cls._task is not None and not cls._task.done(),
+            "sink": cls.sink.name if cls.sink is not None else settings.REMINDER_SINK,
+            "scheduled": len(cls._heap),
+            "claims": cls.claims,
+            "delivered": cls.delivered,
+            "retried": cls.retried,
+            "given_up": cls.given_up,
+            "orphaned": cls.orphaned,
+        }
+
+    @classmethod
+    async def _refresh(cls) -> bool:
+        # Replaces the heap with the window, True when the window held more than REMINDER_PREFETCH reminders
+        rows = await cls._repo.upcoming(settings.REMINDER_WINDOW_SECONDS, settings.REMINDER_PREFETCH)
+        now = asyncio.get_running_loop().time()
+        cls._heap = [(now + max(row["delay"], 0.0), row["tenant"], row["id"]) for row in rows]
+        heapq.heapify(cls._heap)
+        return len(rows) >= settings.REMINDER_PREFETCH
+
+    @classmethod
+    async def _run(cls) -> None:
+        loop = asyncio.get_running_loop()
+        refresh_at = loop.time()
+        truncated = False
+        while True:
+            try:
+                now = loop.time()
+                if now >= refresh_at or (truncated and not cls._heap):
+                    truncated = await cls._refresh()
+                    refresh_at = now + settings.REMINDER_POLL_SECONDS
+                    continue
+                if cls._heap and cls._heap[0][0] <= now:
+                    while cls._heap and cls._heap[0][0] <= now:
+                        heapq.heappop(cls._heap)
+                    await cls._deliver_due()
+                    continue
+                wake_at = min(refresh_at, cls._heap[0][0]) if cls._heap else refresh_at
+                cls._wake.clear()
+                try:
+                    await asyncio.wait_for(cls._wake.wait(), max(wake_at - now, 0.0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Database unavailable or the like: retried at the next poll, the leases of claimed rows expire
+                cls.log.warning(f"Reminder scheduler: {e!r}")
+                refresh_at = loop.time() + settings.REMINDER_POLL_SECONDS
+                cls._heap = []
+                await asyncio.sleep(settings.REMINDER_POLL_SECONDS)
+
+    @classmethod
+    async def _deliver_due(cls) -> None:
+        while True:
+            rows = await cls._repo.claim(settings.REMINDER_BATCH, settings.REMINDER_LEASE_SECONDS)
+            cls.claims += 1
+            if rows:
+                await cls._deliver(rows)
+            if len(rows) < settings.REMINDER_BATCH:
+                return
+
+    @classmethod
+    async def _deliver(cls, rows: typing.Sequence[typing.Mapping[str, typing.Any]]) -> None:
+        sent: list[tuple[uuid.UUID, int]] = []
+        failed: list[tuple[uuid.UUID, int, str, float | None]] = []
+        reminders = []
+        for row in rows:
+            if row["title"] is None:
+                # The note was deleted after the reminder was set
+                failed.append((row["tenant"], row["id"], "Note deleted", None))
+                cls.orphaned += 1
+            else:
+                reminders.append(Reminder(**row))
+        results = await asyncio.gather(
+            *(asyncio.wait_for(cls.sink.send(reminder), settings.REMINDER_SEND_TIMEOUT) for reminder in reminders),
+            return_exceptions=True
+        )
+        for reminder, result in zip(reminders, results):
+            if not isinstance(result, BaseException):
+                sent.append((reminder.tenant, reminder.id))
+                cls.delivered += 1
+            elif reminder.attempts >= settings.REMINDER_MAX_ATTEMPTS:
+                cls.log.warning(f"Giving up reminder {reminder.id} after {reminder.attempts} attempts: {result!r}")
+                failed.append((reminder.tenant, reminder.id, repr(result), None))
+                cls.given_up += 1
+            else:
+                # Exponential backoff from the attempt count the claim incremented
+                retry = settings.REMINDER_RETRY_SECONDS * 2 ** (reminder.attempts - 1)
+                failed.append((reminder.tenant, reminder.id, repr(result), retry))
+                cls.retried += 1
+        await cls._repo.finish(sent, failed)
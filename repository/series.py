@@ -0,0 +1,220 @@
+import datetime
+import heapq
+import typing
+import zoneinfo
+import asyncpg
+from db.models import BaseAbstractModel
+from repository import BaseRepository
+from repository.base import CREATED, DELETED
+from repository.recurrence import RecurrenceRule
+from dto import (
+    CalendarSeriesDTO, AddCalendarSeriesDTO, CalendarSeriesExceptionDTO, CalendarSeriesExceptionUpdateDTO,
+    CalendarOccurrenceDTO
+)
+from core.exceptions import InvalidRecurrenceError
+
+class CalendarSeriesRepository(BaseRepository):
+    # $1 is always the tenant, exceptions live in {table}_exceptions (_CalendarSeriesExceptionModel)
+    __statements__ = {
+        "add": """
+            INSERT INTO {table} ({tenant}, title, note, starts, ends, rule, tz) VALUES ($1, $2, $3, $4, $5, $6, $7)
+            RETURNING {columns};
+        """,
+        "get": "SELECT {columns} FROM {table} WHERE {tenant} = $1 AND id = $2;",
+        "delete": """
+            WITH exceptions AS (
+                DELETE FROM {table}_exceptions WHERE {tenant} = $1 AND series_id = $2
+            )
+            DELETE FROM {table} WHERE {tenant} = $1 AND id = $2 RETURNING {columns};
+        """,
+        # Series with occurrences in [$2, $3), or with an occurrence moved there by an exception
+        "window": """
+            SELECT {columns} FROM {table}
+            WHERE {tenant} = $1
+              AND (
+                  (starts < $3 AND (ends IS NULL OR ends >= $2))
+                  OR id IN (
+                      SELECT series_id FROM {table}_exceptions WHERE {tenant} = $1 AND date >= $2 AND date < $3
+                  )
+              )
+            ORDER BY id;
+        """,
+        # Exceptions of the given series whose occurrence or new date falls in [$3, $4)
+        "exceptions": """
+            SELECT series_id, occurrence, cancelled, date, title, note FROM {table}_exceptions
+            WHERE {tenant} = $1 AND series_id = ANY($2::integer[])
+              AND ((occurrence >= $3 AND occurrence < $4) OR (date >= $3 AND date < $4));
+        """,
+        "set_exception": """
+            INSERT INTO {table}_exceptions ({tenant}, series_id, occurrence, cancelled, date, title, note)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT ({tenant}, series_id, occurrence) DO UPDATE
+                SET cancelled = excluded.cancelled, date = excluded.date, title = excluded.title, note = excluded.note
+            RETURNING series_id, occurrence, cancelled, date, title, note;
+        """,
+        "delete_exception": """
+            DELETE FROM {table}_exceptions WHERE {tenant} = $1 AND series_id = $2 AND occurrence = $3
+            RETURNING series_id, occurrence, cancelled, date, title, note;
+        """,
+    }
+
+    def __init__(
+            self,
+            model: typing.Type[BaseAbstractModel]
+    ) -> None:
+        super().__init__(CalendarSeriesDTO, model)
+
+    @staticmethod
+    def _zone(tz: str) -> zoneinfo.ZoneInfo:
+        try:
+            return zoneinfo.ZoneInfo(tz)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise InvalidRecurrenceError(f"Unknown time zone {tz!r}")
+
+    async def add(self, series: AddCalendarSeriesDTO) -> CalendarSeriesDTO:
+        # The rule is stored normalized together with its bound, so range reads skip finished series in SQL
+        rule = RecurrenceRule.parse(series.rule)
+        zone = self._zone(series.tz)
+        starts = series.starts if series.starts.tzinfo is not None else series.starts.replace(tzinfo=zone)
+        async with await self.transaction() as uow:
+            row = await uow.fetchrow(
+                self.sql["add"],
+                self.tenant, series.title, series.note, starts, rule.bound(starts, series.tz), str(rule), series.tz
+            )
+            await self._publish(uow, CREATED, row)
+        return self.return_dto(**row)
+
+    async def get(self, series_id: int) -> CalendarSeriesDTO | None:
+        return await self._read_through(series_id, self._get)
+
+    async def _get(self, series_id: int) -> CalendarSeriesDTO | None:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            row = await uow.fetchrow(
+                self.sql["get"],
+                self.tenant, series_id
+            )
+        return self.return_dto(**row) if row else None
+
+    async def delete(self, series_id: int) -> CalendarSeriesDTO | None:
+        async with await self.transaction() as uow:
+            row = await uow.fetchrow(
+                self.sql["delete"],
+                self.tenant, series_id
+            )
+            await self._publish(uow, DELETED, row)
+        await self._invalidate(series_id)
+        return self.return_dto(**row) if row else None
+
+    async def _occurrence_of(
+            self,
+            series_id: int,
+            occurrence: datetime.datetime
+    ) -> tuple[zoneinfo.ZoneInfo, datetime.datetime] | None:
+        # None when the series doesn't exist, InvalidRecurrenceError when its rule doesn't produce `occurrence`.
+        # Naive values are read in the series' time zone
+        series = await self.get(series_id)
+        if series is None:
+            return None
+        zone = self._zone(series["tz"])
+        if occurrence.tzinfo is None:
+            occurrence = occurrence.replace(tzinfo=zone)
+        if not RecurrenceRule.parse(series["rule"]).occurs(series["starts"], series["tz"], occurrence):
+            raise InvalidRecurrenceError(f"{occurrence.isoformat()} is not an occurrence of series {series_id}")
+        return zone, occurrence
+
+    async def set_exception(self, exception: CalendarSeriesExceptionUpdateDTO) -> CalendarSeriesExceptionDTO | None:
+        found = await self._occurrence_of(exception.series_id, exception.occurrence)
+        if found is None:
+            return None
+        zone, occurrence = found
+        date = exception.date
+        if date is not None and date.tzinfo is None:
+            date = date.replace(tzinfo=zone)
+        async with await self.transaction() as uow:
+            row = await uow.fetchrow(
+                self.sql["set_exception"],
+                self.tenant, exception.series_id, occurrence, exception.cancelled, date,
+                exception.title, exception.note
+            )
+        return CalendarSeriesExceptionDTO(**row)
+
+    async def delete_exception(
+            self,
+            series_id: int,
+            occurrence: datetime.datetime
+    ) -> CalendarSeriesExceptionDTO | None:
+        found = await self._occurrence_of(series_id, occurrence)
+        if found is None:
+            return None
+        _, occurrence = found
+        async with await self.transaction() as uow:
+            row = await uow.fetchrow(
+                self.sql["delete_exception"],
+                self.tenant, series_id, occurrence
+            )
+        return CalendarSeriesExceptionDTO(**row) if row else None
+
+    async def occurrences(
+            self,
+            start: datetime.datetime,
+            end: datetime.datetime
+    ) -> typing.Iterator[CalendarOccurrenceDTO]:
+        # Two queries for the whole range (series, then their exceptions), occurrences themselves are expanded
+        # lazily and merged across series in time order
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            series = await uow.fetch(self.sql["window"], self.tenant, start, end)
+            if not series:
+                return iter(())
+            exceptions = await uow.fetch(
+                self.sql["exceptions"],
+                self.tenant, [row["id"] for row in series], start, end
+            )
+
+        overrides = {(row["series_id"], row["occurrence"]): row for row in exceptions}
+        by_id = {row["id"]: row for row in series}
+        # Occurrences moved into the range may come from anywhere in their series, they are few and sorted apart
+        moved = sorted(
+            (
+                self._occurrence(
+                    by_id[row["series_id"]],
+                    row["occurrence"].astimezone(self._zone(by_id[row["series_id"]]["tz"])),
+                    row
+                )
+                for row in exceptions
+                if not row["cancelled"] and row["date"] is not None and start <= row["date"] < end
+            ),
+            key=lambda item: item["date"]
+        )
+        return heapq.merge(
+            *(self._expand(row, overrides, start, end) for row in series),
+            moved,
+            key=lambda item: item["date"]
+        )
+
+    @staticmethod
+    def _occurrence(
+            series: asyncpg.Record,
+            occurrence: datetime.datetime,
+            exception: asyncpg.Record | None = None
+    ) -> CalendarOccurrenceDTO:
+        return CalendarOccurrenceDTO(
+            series_id=series["id"],
+            occurrence=occurrence,
+            date=(exception["date"] or occurrence) if exception else occurrence,
+            title=(exception["title"] or series["title"]) if exception else series["title"],
+            note=(exception["note"] or series["note"]) if exception else series["note"],
+        )
+
+    def _expand(
+            self,
+            series: asyncpg.Record,
+            overrides: typing.Mapping[tuple[int, datetime.datetime], asyncpg.Record],
+            start: datetime.datetime,
+            end: datetime.datetime
+    ) -> typing.Iterator[CalendarOccurrenceDTO]:
+        for occurrence in RecurrenceRule.parse(series["rule"]).occurrences(series["starts"], series["tz"], start, end):
+            exception = overrides.get((series["id"], occurrence))
+            if exception is not None and (exception["cancelled"] or exception["date"] is not None):
+                # Cancelled, or moved and then yielded from `moved` when its new date is in the range
+                continue
+            yield self._occurrence(series, occurrence, exception)
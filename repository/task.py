@@ -1,16 +1,84 @@
-from dto import TaskDTO, TaskUpdateDTO, AddTaskDTO
+from dto import (
+    TaskDTO, TaskUpdateDTO, AddTaskDTO, TaskPageDTO, TaskBulkResultDTO, TaskSearchPageDTO, TaskImportDTO, ImportResultDTO
+)
 import typing
 from loguru import logger as log
 from db.models import BaseAbstractModel
 from repository import BaseRepository
+from repository.base import BulkResult, CREATED, UPDATED, DELETED
+from core.settings import settings
+from core.exceptions import VersionConflictError
+from repository.coalescing import WriteCoalescer
 
 class TaskRepository(BaseRepository):
+    # $1 is always the tenant
+    __statements__ = {
+        "add": "INSERT INTO {table} ({tenant}, title, description) VALUES ($1, $2, $3) RETURNING {columns};",
+        "get": "SELECT {columns} FROM {table} WHERE {tenant} = $1 AND id = $2;",
+        "delete": "DELETE FROM {table} WHERE {tenant} = $1 AND id = $2 RETURNING {columns};",
+        "update": """
+            UPDATE {table} SET title = $3, description = $4, done = $5
+            WHERE {tenant} = $1 AND id = $2
+            RETURNING {columns};
+        """,
+        # If-Match: only when the row still has one of the versions the client has seen
+        "update_if_match": """
+            UPDATE {table} SET title = $3, description = $4, done = $5
+            WHERE {tenant} = $1 AND id = $2 AND version = ANY($6::bigint[])
+            RETURNING {columns};
+        """,
+        # Coalesced updates (WRITE_COALESCING): the last write of each id in the batch, columns of u are prefixed
+        # so RETURNING {columns} reads the table's
+        "update_batch": """
+            UPDATE {table} SET title = u._title, description = u._description, done = u._done
+            FROM UNNEST($2::integer[], $3::text[], $4::text[], $5::boolean[]) AS u(_id, _title, _description, _done)
+            WHERE {tenant} = $1 AND id = u._id
+            RETURNING {columns};
+        """,
+        "version": "SELECT version FROM {table} WHERE {tenant} = $1 AND id = $2;",
+        # Ranked full-text search on the GIN indexed tsvector, snippets are only cut for the returned page
+        "search": """
+            WITH query AS (SELECT websearch_to_tsquery('{search_config}', $2) AS q),
+            hits AS (
+                SELECT {columns}, ts_rank_cd({search}, query.q) AS rank
+                FROM {table}, query
+                WHERE {tenant} = $1 AND {search} @@ query.q
+            )
+            SELECT page.*,
+                   ts_headline('{search_config}', {search_document}, query.q, 'MaxFragments=2, MaxWords=20, MinWords=5')
+                       AS headline
+            FROM (
+                SELECT * FROM hits
+                WHERE $3::real IS NULL OR (rank, id) < ($3::real, $4::integer)
+                ORDER BY rank DESC, id DESC
+                LIMIT $5
+            ) page, query
+            ORDER BY rank DESC, id DESC;
+        """,
+        # Autocomplete: the trigram GiST index answers both the ILIKE prefix and the distance ordering
+        "autocomplete": """
+            SELECT {columns}, similarity(title, $2) AS rank, title AS headline
+            FROM {table}
+            WHERE {tenant} = $1 AND title ILIKE $3
+            ORDER BY title <-> $2, id
+            LIMIT $4;
+        """,
+        "list": """
+            SELECT {columns} FROM {table}
+            WHERE {tenant} = $1
+              AND id > $2
+              AND ($3::boolean IS NULL OR done = $3)
+              AND ($4::text IS NULL OR title LIKE $4)
+            ORDER BY id
+            LIMIT $5;
+        """,
+    }
 
     def __init__(
             self,
             model: typing.Type[BaseAbstractModel]
     ) -> None:
-        super().__init__(TaskDTO, model.__table__)
+        super().__init__(TaskDTO, model)
 
     async def add(
             self,
@@ -18,42 +86,214 @@ class TaskRepository(BaseRepository):
     ) -> TaskDTO:
         async with await self.transaction() as uow:
             row = await uow.fetchrow(
-                    f"""
-                    INSERT INTO {self.table} (title, description) VALUES ($1, $2) RETURNING *;
-                    """,
-              task.title, task.description
+                self.sql["add"],
+                self.tenant, task.title, task.description
             )
+            await self._publish(uow, CREATED, row)
         return self.return_dto(**row)
 
     async def get(
+            self,
+            task_id: int,
+            min_version: int | None = None
+    ) -> TaskDTO | None:
+        return await self._read_through(task_id, self._get, min_version)
+
+    async def _get(
             self,
             task_id: int
-    ) -> TaskDTO:
-        async with await self.transaction() as uow:
+    ) -> TaskDTO | None:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
             row = await uow.fetchrow(
-                f"SELECT * FROM {self.table} WHERE id=$1;",
-                task_id
+                self.sql["get"],
+                self.tenant, task_id
+            )
+        return self.return_dto(**row) if row else None
+
+    async def version(
+            self,
+            task_id: int
+    ) -> int | None:
+        async with await self.transaction(readonly=True, autocommit=True) as uow:
+            return await uow.fetchval(
+                self.sql["version"],
+                self.tenant, task_id
             )
-        return self.return_dto(**row)
 
     async def delete(
             self,
             task_id: int
-    ) -> TaskDTO:
+    ) -> TaskDTO | None:
         async with await self.transaction() as uow:
             row = await uow.fetchrow(
-                    f"DELETE FROM {self.table} WHERE id=$1 RETURNING *;",
-                    task_id
+                    self.sql["delete"],
+                    self.tenant, task_id
             )
-        return self.return_dto(**row)
+            await self._publish(uow, DELETED, row)
+        await self._invalidate(task_id)
+        return self.return_dto(**row) if row else None
 
     async def update(
             self,
-            task: TaskUpdateDTO
-    ) -> TaskDTO:
+            task: TaskUpdateDTO,
+            versions: typing.Sequence[int] | None = None
+    ) -> TaskDTO | None:
+        # versions comes from If-Match, a row that exists with another version raises VersionConflictError
+        if versions is None and settings.WRITE_COALESCING:
+            return await WriteCoalescer.for_table(self.table, self._update_batch).submit(task.id, task)
         async with await self.transaction() as uow:
+            if versions is None:
                 row = await uow.fetchrow(
-                    f"UPDATE {self.table} SET title=$2, description=$3, done=$4 WHERE id=$1 RETURNING *;",
-                    task.id, task.title, task.description, task.done
+                    self.sql["update"],
+                    self.tenant, task.id, task.title, task.description, task.done
                 )
-        return self.return_dto(**row)
+            else:
+                row = await uow.fetchrow(
+                    self.sql["update_if_match"],
+                    self.tenant, task.id, task.title, task.description, task.done, list(versions)
+                )
+                if row is None and await uow.fetchval(self.sql["version"], self.tenant, task.id) is not None:
+                    raise VersionConflictError(task.id)
+            await self._publish(uow, UPDATED, row)
+        await self._invalidate(task.id)
+        return self.return_dto(**row) if row else None
+
+    async def _update_batch(
+            self,
+            tasks: typing.Sequence[TaskUpdateDTO]
+    ) -> typing.Dict[int, TaskDTO]:
+        # Flushed by WriteCoalescer with the tenant of the batch set, ids are unique within it
+        async with await self.transaction() as uow:
+            rows = await uow.fetch(
+                self.sql["update_batch"],
+                self.tenant,
+                [task.id for task in tasks], [task.title for task in tasks],
+                [task.description for task in tasks], [task.done for task in tasks]
+            )
+            await self._publish(uow, UPDATED, *rows)
+        await self._invalidate(*(task.id for task in tasks))
+        return {row["id"]: self.return_dto(**row) for row in rows}
+
+    async def list(
+            self,
+            cursor: str | None = None,
+            limit: int = settings.PAGE_SIZE,
+            done: bool | None = None,
+            title_prefix: str | None = None
+    ) -> TaskPageDTO:
+        rows, next_cursor = await self._page(
+            self.sql["list"], (done, self._like_prefix(title_prefix)), cursor, limit
+        )
+        return TaskPageDTO(
+            items=[self.return_dto(**row) for row in rows],
+            next=next_cursor
+        )
+
+    async def list_json(
+            self,
+            cursor: str | None = None,
+            limit: int = settings.PAGE_SIZE,
+            done: bool | None = None,
+            title_prefix: str | None = None
+    ) -> bytes:
+        rows, next_cursor = await self._page(
+            self.sql["list"], (done, self._like_prefix(title_prefix)), cursor, limit
+        )
+        return self.encoder.encode_page(rows, next_cursor)
+
+    async def stream(
+            self,
+            done: bool | None = None,
+            title_prefix: str | None = None
+    ) -> typing.AsyncIterator[TaskDTO]:
+        async for row in self._stream(self.sql["list"], (done, self._like_prefix(title_prefix))):
+            yield self.return_dto(**row)
+
+    async def stream_json(
+            self,
+            done: bool | None = None,
+            title_prefix: str | None = None
+    ) -> typing.AsyncIterator[bytes]:
+        async for rows in self._stream_chunks(self.sql["list"], (done, self._like_prefix(title_prefix))):
+            yield self.encoder.encode_lines(rows)
+
+    def export_csv(self) -> typing.AsyncIterator[bytes]:
+        return self._copy_out(self.sql["list"], (None, None))
+
+    async def import_records(
+            self,
+            tasks: typing.AsyncIterable[TaskImportDTO],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> ImportResultDTO:
+        imported, chunks = await self._copy_in(
+            ("title", "description", "done"),
+            ((task.title, task.description, task.done) async for task in tasks),
+            chunk_size
+        )
+        return ImportResultDTO(imported=imported, chunks=chunks)
+
+    async def search(
+            self,
+            query: str,
+            cursor: str | None = None,
+            limit: int = settings.PAGE_SIZE
+    ) -> TaskSearchPageDTO:
+        rows, next_cursor = await self._search(query, cursor, limit)
+        return TaskSearchPageDTO(
+            items=self._hits(rows),
+            next=next_cursor
+        )
+
+    async def autocomplete(
+            self,
+            prefix: str,
+            limit: int = settings.PAGE_SIZE
+    ) -> TaskSearchPageDTO:
+        return TaskSearchPageDTO(
+            items=self._hits(await self._autocomplete(prefix, limit)),
+            next=None
+        )
+
+    def _bulk_results(self, results: typing.Sequence[BulkResult]) -> typing.List[TaskBulkResultDTO]:
+        return [
+            TaskBulkResultDTO(
+                index=index,
+                status=status,
+                item=self.return_dto(**item) if item else None
+            )
+            for index, status, item in results
+        ]
+
+    async def bulk_add(
+            self,
+            tasks: typing.Sequence[AddTaskDTO],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> typing.List[TaskBulkResultDTO]:
+        # Titles are unique per owner: a task with an existing title updates its description
+        results = await self._bulk_insert(
+            [("title", "TEXT"), ("description", "TEXT")],
+            [(task.title, task.description) for task in tasks],
+            chunk_size,
+            merge=("title",)
+        )
+        return self._bulk_results(results)
+
+    async def bulk_update(
+            self,
+            tasks: typing.Sequence[TaskUpdateDTO],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> typing.List[TaskBulkResultDTO]:
+        results = await self._bulk_update(
+            [("id", "INTEGER"), ("title", "TEXT"), ("description", "TEXT"), ("done", "BOOLEAN")],
+            [(task.id, task.title, task.description, task.done) for task in tasks],
+            chunk_size
+        )
+        return self._bulk_results(results)
+
+    async def bulk_delete(
+            self,
+            task_ids: typing.Sequence[int],
+            chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> typing.List[TaskBulkResultDTO]:
+        results = await self._bulk_delete(task_ids, chunk_size)
+        return self._bulk_results(results)
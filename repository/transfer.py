@@ -0,0 +1,196 @@
+import csv
+import datetime
+import typing
+import zlib
+import msgspec
+from core.settings import settings
+from core.exceptions import InvalidImportError
+from core.streaming import aclose
+
+__all__ = (
+    "Transfer",
+)
+
+FORMATS: typing.Final[tuple[str, ...]] = ("ndjson", "csv")
+MEDIA_TYPES: typing.Final[dict[str, str]] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+S = typing.TypeVar("S", bound=msgspec.Struct)
+
+class Transfer:
+    # Export and import streams, every step works on one chunk or line at a time so memory doesn't grow
+    # with the size of the file
+
+    # gzip container (wbits 16 + 15), zlib.decompressobj with 32 + 15 also takes zlib streams
+    GZIP_WBITS: typing.ClassVar[int] = 31
+    GUNZIP_WBITS: typing.ClassVar[int] = 47
+    # Upper bound of what one compressed chunk may inflate to at once, guards against gzip bombs
+    INFLATE_CHUNK: typing.ClassVar[int] = 1024 * 1024
+
+    @staticmethod
+    def media_type(format_: str, compression: str | None) -> str:
+        return "application/gzip" if compression == "gzip" else MEDIA_TYPES[format_]
+
+    @staticmethod
+    def filename(name: str, format_: str, compression: str | None) -> str:
+        return f"{name}.{format_}" + (".gz" if compression == "gzip" else "")
+
+    @classmethod
+    async def gzip(cls, chunks: typing.AsyncIterable[bytes]) -> typing.AsyncIterator[bytes]:
+        compressor = zlib.compressobj(level=6, wbits=cls.GZIP_WBITS)
+        try:
+            async for chunk in chunks:
+                compressed = compressor.compress(chunk)
+                if compressed:
+                    yield compressed
+            yield compressor.flush()
+        finally:
+            # Closing this generator doesn't close the one it reads from, which may hold a connection
+            await aclose(chunks)
+
+    @classmethod
+    async def gunzip(cls, chunks: typing.AsyncIterable[bytes]) -> typing.AsyncIterator[bytes]:
+        decompressor = zlib.decompressobj(wbits=cls.GUNZIP_WBITS)
+        try:
+            async for chunk in chunks:
+                data = chunk
+                while data:
+                    if decompressor.eof:
+                        # Concatenated gzip files are one stream of several members (gzip -d reads them all),
+                        # anything after a member that isn't another one is rejected as invalid
+                        decompressor = zlib.decompressobj(wbits=cls.GUNZIP_WBITS)
+                    inflated = decompressor.decompress(data, cls.INFLATE_CHUNK)
+                    if inflated:
+                        yield inflated
+                    # Input held back by the bounded step, or what follows the end of a member
+                    data = decompressor.unconsumed_tail or decompressor.unused_data
+            tail = decompressor.flush()
+        except zlib.error as e:
+            raise InvalidImportError(f"Invalid gzip stream: {e}") from e
+        if tail:
+            yield tail
+        if not decompressor.eof:
+            raise InvalidImportError("Truncated gzip stream")
+
+    @staticmethod
+    async def lines(chunks: typing.AsyncIterable[bytes]) -> typing.AsyncIterator[tuple[int, bytes]]:
+        # (line number, line without the newline), empty lines included. Each chunk is scanned once and only a
+        # partial line is carried over, so a line split across many small chunks isn't copied again per chunk
+        buffer = bytearray()
+        number = 0
+        async for chunk in chunks:
+            start = 0
+            end = chunk.find(b"\n")
+            while end != -1:
+                if buffer:
+                    buffer += chunk[start:end]
+                    line = bytes(buffer)
+                    buffer.clear()
+                else:
+                    line = chunk[start:end]
+                number += 1
+                if len(line) > settings.IMPORT_MAX_LINE_BYTES:
+                    raise InvalidImportError(f"Line {number} is longer than {settings.IMPORT_MAX_LINE_BYTES} bytes")
+                yield number, line.removesuffix(b"\r")
+                start = end + 1
+                end = chunk.find(b"\n", start)
+            buffer += chunk[start:]
+            if len(buffer) > settings.IMPORT_MAX_LINE_BYTES:
+                raise InvalidImportError(f"Line {number + 1} is longer than {settings.IMPORT_MAX_LINE_BYTES} bytes")
+        if buffer:
+            yield number + 1, bytes(buffer).removesuffix(b"\r")
+
+    @classmethod
+    async def ndjson(
+            cls,
+            chunks: typing.AsyncIterable[bytes],
+            struct: typing.Type[S]
+    ) -> typing.AsyncIterator[S]:
+        decoder = msgspec.json.Decoder(struct)
+        async for number, line in cls.lines(chunks):
+            if not line.strip():
+                continue
+            try:
+                yield decoder.decode(line)
+            except msgspec.ValidationError as e:
+                raise InvalidImportError(f"Line {number}: {e}") from e
+            except msgspec.DecodeError as e:
+                raise InvalidImportError(f"Line {number}: invalid JSON") from e
+
+    @staticmethod
+    def _csv_coercions(struct: typing.Type[msgspec.Struct]) -> dict[str, typing.Callable[[str], typing.Any]]:
+        # COPY writes booleans as t/f and timestamps as "2025-01-31 10:00:00+00", which msgspec doesn't read;
+        # NULL and "" are both empty once parsed, an empty non-text value means "use the default"
+        coercions: dict[str, typing.Callable[[str], typing.Any]] = {}
+        for field in msgspec.structs.fields(struct):
+            types = set(typing.get_args(field.type)) or {field.type}
+            if bool in types:
+                coercions[field.name] = lambda value: {"t": "true", "f": "false"}.get(value, value)
+            elif datetime.datetime in types:
+                coercions[field.name] = datetime.datetime.fromisoformat
+        return coercions
+
+    @classmethod
+    async def csv(
+            cls,
+            chunks: typing.AsyncIterable[bytes],
+            struct: typing.Type[S]
+    ) -> typing.AsyncIterator[S]:
+        # The first record is the header, unknown columns are ignored. Quoted fields may span lines, a record
+        # is complete once its quotes are balanced
+        coercions = cls._csv_coercions(struct)
+        names = {field.name for field in msgspec.structs.fields(struct)}
+        header: list[str] | None = None
+        record: list[str] = []
+        quotes = 0
+        async for number, line in cls.lines(chunks):
+            try:
+                text = line.decode()
+            except UnicodeDecodeError as e:
+                raise InvalidImportError(f"Line {number}: not UTF-8") from e
+            record.append(text)
+            quotes += text.count('"')
+            if quotes % 2:
+                if sum(map(len, record)) > settings.IMPORT_MAX_LINE_BYTES:
+                    raise InvalidImportError(f"Line {number}: unterminated quoted field")
+                continue
+            values = next(csv.reader(["\n".join(record)]), [])
+            record, quotes = [], 0
+            if not values or values == [""]:
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                raise InvalidImportError(f"Line {number}: expected {len(header)} fields, got {len(values)}")
+            row: dict[str, typing.Any] = {}
+            try:
+                for name, value in zip(header, values):
+                    if name not in names:
+                        continue
+                    if name in coercions:
+                        if value == "":
+                            continue
+                        value = coercions[name](value)
+                    row[name] = value
+                yield msgspec.convert(row, struct, strict=False)
+            except (msgspec.ValidationError, ValueError) as e:
+                raise InvalidImportError(f"Line {number}: {e}") from e
+        if record:
+            raise InvalidImportError("Unterminated quoted field at the end of the file")
+
+    @classmethod
+    async def records(
+            cls,
+            chunks: typing.AsyncIterable[bytes],
+            struct: typing.Type[S],
+            format_: str,
+            compression: str | None = None
+    ) -> typing.AsyncIterator[S]:
+        if compression == "gzip":
+            chunks = cls.gunzip(chunks)
+        parse = cls.csv if format_ == "csv" else cls.ndjson
+        async for item in parse(chunks, struct):
+            yield item
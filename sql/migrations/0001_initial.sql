@@ -0,0 +1,11 @@
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id SERIAL PRIMARY KEY UNIQUE NOT NULL, title TEXT UNIQUE NOT NULL, description TEXT , done BOOLEAN NOT NULL DEFAULT false, uid UUID UNIQUE NOT NULL DEFAULT uuid_generate_v4()
+);
+
+CREATE TABLE IF NOT EXISTS calendar_notes (
+    id SERIAL PRIMARY KEY UNIQUE NOT NULL, uid UUID UNIQUE NOT NULL DEFAULT uuid_generate_v4(), date TIMESTAMPTZ NOT NULL DEFAULT now(), title TEXT NOT NULL, note TEXT 
+);
+
+CREATE INDEX IF NOT EXISTS calendar_notes_date_index ON calendar_notes USING btree (date);
@@ -0,0 +1,5 @@
+ALTER TABLE tasks DROP CONSTRAINT IF EXISTS tasks_id_key;
+
+ALTER TABLE calendar_notes DROP CONSTRAINT IF EXISTS calendar_notes_id_key;
+
+CREATE INDEX IF NOT EXISTS tasks_open_index ON tasks USING btree (id) WHERE done = false;
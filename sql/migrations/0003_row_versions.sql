@@ -0,0 +1,23 @@
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION tasks_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS tasks_version_trigger ON tasks;
+CREATE TRIGGER tasks_version_trigger BEFORE UPDATE ON tasks
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION tasks_bump_version();
+
+ALTER TABLE calendar_notes ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION calendar_notes_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS calendar_notes_version_trigger ON calendar_notes;
+CREATE TRIGGER calendar_notes_version_trigger BEFORE UPDATE ON calendar_notes
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION calendar_notes_bump_version();
@@ -0,0 +1,35 @@
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+-- Version triggers compare the stored columns only, generated columns are not readable in their WHEN
+
+CREATE OR REPLACE FUNCTION tasks_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS tasks_version_trigger ON tasks;
+CREATE TRIGGER tasks_version_trigger BEFORE UPDATE ON tasks
+    FOR EACH ROW WHEN ((OLD.id, OLD.title, OLD.description, OLD.done, OLD.uid) IS DISTINCT FROM (NEW.id, NEW.title, NEW.description, NEW.done, NEW.uid)) EXECUTE FUNCTION tasks_bump_version();
+
+CREATE OR REPLACE FUNCTION calendar_notes_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS calendar_notes_version_trigger ON calendar_notes;
+CREATE TRIGGER calendar_notes_version_trigger BEFORE UPDATE ON calendar_notes
+    FOR EACH ROW WHEN ((OLD.id, OLD.uid, OLD.date, OLD.title, OLD.note) IS DISTINCT FROM (NEW.id, NEW.uid, NEW.date, NEW.title, NEW.note)) EXECUTE FUNCTION calendar_notes_bump_version();
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(title, '')), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED;
+
+CREATE INDEX IF NOT EXISTS tasks_title_trgm_index ON tasks USING gist (title gist_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS tasks_search_index ON tasks USING gin (search);
+
+ALTER TABLE calendar_notes ADD COLUMN IF NOT EXISTS search TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(title, '')), 'A') || setweight(to_tsvector('english', coalesce(note, '')), 'B')) STORED;
+
+CREATE INDEX IF NOT EXISTS calendar_notes_title_trgm_index ON calendar_notes USING gist (title gist_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS calendar_notes_search_index ON calendar_notes USING gin (search);
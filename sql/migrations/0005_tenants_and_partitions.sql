@@ -0,0 +1,104 @@
+-- tasks and calendar_notes become tenant scoped (owner_id) partitioned tables: hash on the owner for tasks,
+-- monthly ranges on date for calendar notes. Existing rows are moved to the default tenant (nil UUID), ids and
+-- their sequences are kept
+
+ALTER TABLE tasks RENAME TO tasks_unpartitioned;
+ALTER TABLE tasks_unpartitioned RENAME CONSTRAINT tasks_pkey TO tasks_unpartitioned_pkey;
+ALTER TABLE tasks_unpartitioned RENAME CONSTRAINT tasks_title_key TO tasks_unpartitioned_title_key;
+ALTER TABLE tasks_unpartitioned RENAME CONSTRAINT tasks_uid_key TO tasks_unpartitioned_uid_key;
+DROP INDEX IF EXISTS tasks_open_index, tasks_search_index, tasks_title_trgm_index;
+DROP TRIGGER IF EXISTS tasks_version_trigger ON tasks_unpartitioned;
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER NOT NULL DEFAULT nextval('tasks_id_seq'), title TEXT NOT NULL, description TEXT , done BOOLEAN NOT NULL DEFAULT false, uid UUID NOT NULL DEFAULT uuid_generate_v4(), version BIGINT NOT NULL DEFAULT 1, search TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(title, '')), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED, owner_id UUID NOT NULL, PRIMARY KEY (owner_id, id), UNIQUE (owner_id, title), UNIQUE (owner_id, uid)
+) PARTITION BY HASH (owner_id);
+
+ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id;
+
+CREATE TABLE IF NOT EXISTS tasks_p0 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 0);
+CREATE TABLE IF NOT EXISTS tasks_p1 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 1);
+CREATE TABLE IF NOT EXISTS tasks_p2 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 2);
+CREATE TABLE IF NOT EXISTS tasks_p3 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 3);
+CREATE TABLE IF NOT EXISTS tasks_p4 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 4);
+CREATE TABLE IF NOT EXISTS tasks_p5 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 5);
+CREATE TABLE IF NOT EXISTS tasks_p6 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 6);
+CREATE TABLE IF NOT EXISTS tasks_p7 PARTITION OF tasks FOR VALUES WITH (MODULUS 8, REMAINDER 7);
+
+INSERT INTO tasks (id, title, description, done, uid, version, owner_id)
+SELECT id, title, description, done, uid, version, '00000000-0000-0000-0000-000000000000'::uuid FROM tasks_unpartitioned;
+
+DROP TABLE tasks_unpartitioned;
+
+CREATE INDEX IF NOT EXISTS tasks_title_trgm_index ON tasks USING gist (title gist_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS tasks_search_index ON tasks USING gin (search);
+
+CREATE INDEX IF NOT EXISTS tasks_open_index ON tasks USING btree (owner_id, id) WHERE done = false;
+
+CREATE OR REPLACE FUNCTION tasks_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS tasks_version_trigger ON tasks;
+CREATE TRIGGER tasks_version_trigger BEFORE UPDATE ON tasks
+    FOR EACH ROW WHEN ((OLD.id, OLD.title, OLD.description, OLD.done, OLD.uid, OLD.owner_id) IS DISTINCT FROM (NEW.id, NEW.title, NEW.description, NEW.done, NEW.uid, NEW.owner_id)) EXECUTE FUNCTION tasks_bump_version();
+
+ALTER TABLE calendar_notes RENAME TO calendar_notes_unpartitioned;
+ALTER TABLE calendar_notes_unpartitioned RENAME CONSTRAINT calendar_notes_pkey TO calendar_notes_unpartitioned_pkey;
+ALTER TABLE calendar_notes_unpartitioned RENAME CONSTRAINT calendar_notes_uid_key TO calendar_notes_unpartitioned_uid_key;
+DROP INDEX IF EXISTS calendar_notes_date_index, calendar_notes_search_index, calendar_notes_title_trgm_index;
+DROP TRIGGER IF EXISTS calendar_notes_version_trigger ON calendar_notes_unpartitioned;
+
+CREATE TABLE IF NOT EXISTS calendar_notes (
+    id INTEGER NOT NULL DEFAULT nextval('calendar_notes_id_seq'), uid UUID NOT NULL DEFAULT uuid_generate_v4(), date TIMESTAMPTZ NOT NULL DEFAULT now(), title TEXT NOT NULL, note TEXT , version BIGINT NOT NULL DEFAULT 1, search TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('english', coalesce(title, '')), 'A') || setweight(to_tsvector('english', coalesce(note, '')), 'B')) STORED, owner_id UUID NOT NULL, PRIMARY KEY (owner_id, id, date), UNIQUE (owner_id, uid, date)
+) PARTITION BY RANGE (date);
+
+ALTER SEQUENCE calendar_notes_id_seq OWNED BY calendar_notes.id;
+
+CREATE TABLE IF NOT EXISTS calendar_notes_default PARTITION OF calendar_notes DEFAULT;
+
+-- One partition per month that already has notes, up to the current one; later months are created on startup
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(min(date), now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC'),
+            interval '1 month'
+        )::date
+        FROM calendar_notes_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF calendar_notes FOR VALUES FROM (%L) TO (%L)',
+            'calendar_notes_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+            month::text || ' 00:00:00+00',
+            (month + interval '1 month')::date::text || ' 00:00:00+00'
+        );
+    END LOOP;
+END;
+$$;
+
+INSERT INTO calendar_notes (id, uid, date, title, note, version, owner_id)
+SELECT id, uid, date, title, note, version, '00000000-0000-0000-0000-000000000000'::uuid FROM calendar_notes_unpartitioned;
+
+DROP TABLE calendar_notes_unpartitioned;
+
+CREATE INDEX IF NOT EXISTS calendar_notes_owner_id_date_index ON calendar_notes USING btree (owner_id, date);
+
+CREATE INDEX IF NOT EXISTS calendar_notes_title_trgm_index ON calendar_notes USING gist (title gist_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS calendar_notes_search_index ON calendar_notes USING gin (search);
+
+CREATE OR REPLACE FUNCTION calendar_notes_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS calendar_notes_version_trigger ON calendar_notes;
+CREATE TRIGGER calendar_notes_version_trigger BEFORE UPDATE ON calendar_notes
+    FOR EACH ROW WHEN ((OLD.id, OLD.uid, OLD.date, OLD.title, OLD.note, OLD.owner_id) IS DISTINCT FROM (NEW.id, NEW.uid, NEW.date, NEW.title, NEW.note, NEW.owner_id)) EXECUTE FUNCTION calendar_notes_bump_version();
@@ -0,0 +1,25 @@
+-- Recurring calendar notes: a series row per rule plus its cancelled or overridden occurrences
+
+CREATE TABLE IF NOT EXISTS calendar_series (
+    id SERIAL NOT NULL, uid UUID NOT NULL DEFAULT uuid_generate_v4(), starts TIMESTAMPTZ NOT NULL, ends TIMESTAMPTZ , rule TEXT NOT NULL, tz TEXT NOT NULL DEFAULT 'UTC', title TEXT NOT NULL, note TEXT , version BIGINT NOT NULL DEFAULT 1, owner_id UUID NOT NULL, PRIMARY KEY (owner_id, id), UNIQUE (owner_id, uid)
+);
+
+CREATE INDEX IF NOT EXISTS calendar_series_owner_id_starts_index ON calendar_series USING btree (owner_id, starts) INCLUDE (ends);
+
+CREATE OR REPLACE FUNCTION calendar_series_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$;
+DROP TRIGGER IF EXISTS calendar_series_version_trigger ON calendar_series;
+CREATE TRIGGER calendar_series_version_trigger BEFORE UPDATE ON calendar_series
+    FOR EACH ROW WHEN ((OLD.id, OLD.uid, OLD.starts, OLD.ends, OLD.rule, OLD.tz, OLD.title, OLD.note, OLD.owner_id) IS DISTINCT FROM (NEW.id, NEW.uid, NEW.starts, NEW.ends, NEW.rule, NEW.tz, NEW.title, NEW.note, NEW.owner_id)) EXECUTE FUNCTION calendar_series_bump_version();
+
+CREATE TABLE IF NOT EXISTS calendar_series_exceptions (
+    id SERIAL NOT NULL, series_id INTEGER NOT NULL, occurrence TIMESTAMPTZ NOT NULL, cancelled BOOLEAN NOT NULL DEFAULT false, date TIMESTAMPTZ , title TEXT , note TEXT , owner_id UUID NOT NULL, PRIMARY KEY (owner_id, id)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS calendar_series_exceptions_occurrence_index ON calendar_series_exceptions USING btree (owner_id, series_id, occurrence);
+
+CREATE INDEX IF NOT EXISTS calendar_series_exceptions_owner_id_date_index ON calendar_series_exceptions USING btree (owner_id, date) WHERE date IS NOT NULL;
@@ -0,0 +1,9 @@
+-- Reminders of calendar notes, claimed by the in-process scheduler with FOR UPDATE SKIP LOCKED
+
+CREATE TABLE IF NOT EXISTS calendar_reminders (
+    id SERIAL NOT NULL, note_id INTEGER NOT NULL, due TIMESTAMPTZ NOT NULL, claimed_until TIMESTAMPTZ , attempts INTEGER NOT NULL DEFAULT 0, sent_at TIMESTAMPTZ , error TEXT , owner_id UUID NOT NULL, PRIMARY KEY (owner_id, id)
+);
+
+CREATE INDEX IF NOT EXISTS calendar_reminders_pending_index ON calendar_reminders USING btree (due) WHERE sent_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS calendar_reminders_owner_id_note_id_index ON calendar_reminders USING btree (owner_id, note_id);
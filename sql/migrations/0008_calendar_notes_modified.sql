@@ -0,0 +1,29 @@
+-- Last-Modified of the .ics feed from the data: notes are stamped by the version trigger, deletions leave a
+-- timestamp per tenant (they don't leave a row to take max(modified) from)
+
+ALTER TABLE calendar_notes ADD COLUMN IF NOT EXISTS modified TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION calendar_notes_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    NEW.modified := now();
+    RETURN NEW;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS calendar_notes_deletions (
+    owner_id UUID PRIMARY KEY, deleted_at TIMESTAMPTZ NOT NULL
+);
+
+-- Once per statement, so a bulk delete touches each tenant's row once
+CREATE OR REPLACE FUNCTION calendar_notes_record_deletions() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO calendar_notes_deletions (owner_id, deleted_at)
+    SELECT DISTINCT owner_id, now() FROM deleted_notes
+    ON CONFLICT (owner_id) DO UPDATE SET deleted_at = excluded.deleted_at;
+    RETURN NULL;
+END;
+$$;
+DROP TRIGGER IF EXISTS calendar_notes_deletions_trigger ON calendar_notes;
+CREATE TRIGGER calendar_notes_deletions_trigger AFTER DELETE ON calendar_notes
+    REFERENCING OLD TABLE AS deleted_notes FOR EACH STATEMENT EXECUTE FUNCTION calendar_notes_record_deletions();
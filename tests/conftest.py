@@ -0,0 +1,41 @@
+import asyncio
+import typing
+import asyncpg
+import pytest
+from core.settings import settings
+
+# Unit tests need nothing running. Tests taking the `database` fixture run against the Postgres of core.settings
+# (the same one the app and benchmarks use) and are skipped when it can't be reached; each writes as a fresh tenant
+
+# Async tests are marked anyio and run on asyncio by the pytest plugin of anyio, a dependency of Litestar
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def database(monkeypatch: pytest.MonkeyPatch) -> typing.AsyncIterator[None]:
+    try:
+        conn = await asyncpg.connect(
+            user=settings.USER,
+            password=settings.PASSWD,
+            database=settings.DB,
+            host=settings.HOST,
+            port=settings.PORT,
+            timeout=2,
+        )
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        pytest.skip(f"No Postgres at {settings.HOST}:{settings.PORT} ({e!r})")
+    await conn.close()
+
+    from core.lifespan import ASGILifespan
+
+    # Migrations, statements and the pool as on startup, without the background workers
+    monkeypatch.setattr(settings, "CHANGES_ENABLED", False)
+    monkeypatch.setattr(settings, "REMINDERS_ENABLED", False)
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+    await ASGILifespan.startup()
+    try:
+        yield
+    finally:
+        await ASGILifespan.shutdown()
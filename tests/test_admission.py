@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import types
+import typing
+import pytest
+from litestar.exceptions import TooManyRequestsException, ServiceUnavailableException
+import core.admission
+from core.admission import Admission, AdmissionMiddleware, TokenBucket, PRIORITIES
+from core.metrics import Histogram
+from core.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(core.admission.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def admission(monkeypatch: pytest.MonkeyPatch) -> typing.Iterator[None]:
+    # 4 permits: writes may hold 2 of them, bulk routes 1
+    monkeypatch.setattr(settings, "ADMISSION_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "ADMISSION_WRITE_SHARE", 0.5)
+    monkeypatch.setattr(settings, "ADMISSION_BULK_SHARE", 0.25)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 2)
+    monkeypatch.setattr(Admission, "in_flight", dict.fromkeys(PRIORITIES, 0))
+    monkeypatch.setattr(Admission, "_waiters", {priority: collections.deque() for priority in PRIORITIES})
+    monkeypatch.setattr(Admission, "_buckets", collections.OrderedDict())
+    monkeypatch.setattr(Admission, "admitted", dict.fromkeys(PRIORITIES, 0))
+    monkeypatch.setattr(Admission, "rejected", collections.defaultdict(int))
+    monkeypatch.setattr(Admission, "wait_seconds", Histogram())
+    yield
+
+
+async def waiting(priority: str) -> asyncio.Task:
+    task = asyncio.create_task(Admission.acquire(priority))
+    await asyncio.sleep(0)
+    assert not task.done()
+    return task
+
+
+def test_token_bucket(clock: Clock) -> None:
+    bucket = TokenBucket(burst=2)
+    assert bucket.take(rate=1, burst=2) == 0
+    assert bucket.take(rate=1, burst=2) == 0
+    assert bucket.take(rate=1, burst=2) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.take(rate=1, burst=2) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take(rate=1, burst=2) == 0
+    # Refills up to the burst only
+    clock.now += 100
+    assert [bucket.take(rate=1, burst=2) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+
+def test_rate_limit_per_client(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_SECOND", 0.5)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 1.0)
+    monkeypatch.setattr(Admission, "MAX_CLIENTS", 2)
+    Admission.rate_limit("a")
+    with pytest.raises(TooManyRequestsException) as raised:
+        Admission.rate_limit("a")
+    assert raised.value.headers == {"Retry-After": "2"}
+    Admission.rate_limit("b")
+    # The least recently seen client is forgotten beyond MAX_CLIENTS
+    Admission.rate_limit("c")
+    assert list(Admission._buckets) == ["b", "c"]
+    Admission.rate_limit("a")
+    assert Admission.rejected[("rate_limited", "")] == 1
+
+
+def test_limits() -> None:
+    assert Admission.limits() == {"read": 4, "write": 2, "bulk": 1}
+
+
+async def test_reads_keep_flowing_while_writes_are_capped() -> None:
+    await Admission.acquire("bulk")
+    await Admission.acquire("write")
+    # Bulk permits count against the write share
+    write = await waiting("write")
+    await Admission.acquire("read")
+    await Admission.acquire("read")
+    assert Admission.in_flight == {"read": 2, "write": 1, "bulk": 1}
+    read = await waiting("read")
+    Admission.release("read")
+    await read
+    assert not write.done()
+    Admission.release("bulk")
+    await write
+    assert Admission.in_flight == {"read": 2, "write": 2, "bulk": 0}
+
+
+async def test_freed_permits_go_to_reads_first() -> None:
+    for _ in range(2):
+        await Admission.acquire("write")
+    for _ in range(2):
+        await Admission.acquire("read")
+    write = await waiting("write")
+    read = await waiting("read")
+    Admission.release("write")
+    await read
+    assert not write.done()
+    assert Admission.in_flight == {"read": 3, "write": 1, "bulk": 0}
+    Admission.release("read")
+    await write
+
+
+async def test_timeout_sheds_with_503() -> None:
+    await Admission.acquire("bulk")
+    with pytest.raises(ServiceUnavailableException) as raised:
+        await Admission.acquire("bulk")
+    assert raised.value.headers == {"Retry-After": "1"}
+    assert Admission.rejected[("timeout", "bulk")] == 1
+    assert not Admission._waiters["bulk"]
+    assert Admission.in_flight["bulk"] == 1
+
+
+async def test_full_queue_sheds_immediately() -> None:
+    await Admission.acquire("bulk")
+    queued = [await waiting("bulk") for _ in range(settings.ADMISSION_MAX_QUEUE)]
+    with pytest.raises(ServiceUnavailableException):
+        await Admission.acquire("bulk")
+    assert Admission.rejected[("queue_full", "bulk")] == 1
+    for task in queued:
+        task.cancel()
+    await asyncio.gather(*queued, return_exceptions=True)
+
+
+async def test_cancelled_waiter_leaves_no_trace() -> None:
+    await Admission.acquire("bulk")
+    task = await waiting("bulk")
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not Admission._waiters["bulk"]
+    Admission.release("bulk")
+    assert Admission.in_flight["bulk"] == 0
+
+
+async def test_permit_handed_to_a_cancelled_waiter_is_given_back() -> None:
+    await Admission.acquire("bulk")
+    task = await waiting("bulk")
+    # The permit is handed over, then the request is cancelled before it resumes
+    Admission.release("bulk")
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        assert Admission.in_flight["bulk"] == 0
+    else:
+        # asyncio.wait_for before Python 3.12 lets the admission win over the cancellation, the caller holds it
+        assert Admission.in_flight["bulk"] == 1
+    assert not Admission._waiters["bulk"]
+
+
+def test_middleware_priority_and_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    def scope(method: str, opt: dict[str, str] | None = None, headers: list[tuple[bytes, bytes]] = ()) -> dict:
+        handler = types.SimpleNamespace(opt=opt or {}) if opt is not None else None
+        return {"method": method, "route_handler": handler, "headers": list(headers), "client": ("10.0.0.1", 1234)}
+
+    assert AdmissionMiddleware.priority(scope("GET")) == "read"
+    assert AdmissionMiddleware.priority(scope("POST", {})) == "write"
+    assert AdmissionMiddleware.priority(scope("GET", {"admission": "bulk"})) == "bulk"
+    assert AdmissionMiddleware.priority(scope("GET", {"admission": "exempt"})) == "exempt"
+    assert AdmissionMiddleware.client(scope("GET")) == "addr:10.0.0.1"
+    assert AdmissionMiddleware.client(scope("GET", headers=[(b"x-api-key", b"secret")])) == "key:secret"
@@ -0,0 +1,43 @@
+import uuid
+import pytest
+from core.tenant import Tenant
+from db.models import _TaskModel, _CalendarNoteModel
+from dto import AddTaskDTO, AddCalendarNoteDTO
+from repository import TaskRepository, CalendarNoteRepository
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_database_bulk_add_merges_tasks_on_title(database: None) -> None:
+    repo = TaskRepository(_TaskModel)
+    with Tenant.scope(uuid.uuid4()):
+        existing = await repo.add(AddTaskDTO(title="Existing", description="before"))
+        results = await repo.bulk_add(
+            [
+                AddTaskDTO(title="New", description="first"),
+                AddTaskDTO(title="Existing", description="after"),
+                AddTaskDTO(title="New", description="second"),
+            ],
+            chunk_size=2
+        )
+        # The repeated title was in another chunk, so it merged into the row its first occurrence created
+        assert [result["status"] for result in results] == ["created", "updated", "updated"]
+        assert results[1]["item"]["id"] == existing["id"]
+        assert results[1]["item"]["version"] == existing["version"] + 1
+        assert results[2]["item"]["id"] == results[0]["item"]["id"]
+        assert (await repo.get(existing["id"]))["description"] == "after"
+
+        # Within one chunk only the last occurrence is written
+        results = await repo.bulk_add(
+            [AddTaskDTO(title="Twice", description="a"), AddTaskDTO(title="Twice", description="b")]
+        )
+        assert [result["status"] for result in results] == ["conflict", "created"]
+        assert results[1]["item"]["description"] == "b"
+
+
+async def test_database_bulk_add_always_creates_notes(database: None) -> None:
+    repo = CalendarNoteRepository(_CalendarNoteModel)
+    with Tenant.scope(uuid.uuid4()):
+        results = await repo.bulk_add([AddCalendarNoteDTO(title="Same", note="a"), AddCalendarNoteDTO(title="Same", note="b")])
+        assert [result["status"] for result in results] == ["created", "created"]
+        assert results[0]["item"]["id"] != results[1]["item"]["id"]
@@ -0,0 +1,87 @@
+import asyncio
+import typing
+import uuid
+import pytest
+from db.changes import ChangeEvent
+from repository.cache import MemoryCacheBackend, DictCacheBackend, RepositoryCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Row(typing.TypedDict):
+    id: int
+    version: int
+
+
+@pytest.fixture
+def cache() -> typing.Iterator[RepositoryCache]:
+    RepositoryCache.configure(DictCacheBackend())
+    yield RepositoryCache.for_table("rows", Row)
+    RepositoryCache.configure(None)
+
+
+async def test_memory_backend_evicts_least_recently_used() -> None:
+    backend = MemoryCacheBackend(max_bytes=20)
+    await backend.set("a", b"1234567", 60)
+    await backend.set("b", b"1234567", 60)
+    await backend.get("a")
+    await backend.set("c", b"1234567", 60)
+    assert await backend.get("a") == b"1234567"
+    assert await backend.get("b") is None
+    assert backend.size <= backend.max_bytes
+    assert backend.evictions == 1
+
+
+async def test_memory_backend_expires_entries() -> None:
+    backend = MemoryCacheBackend(max_bytes=1024)
+    await backend.set("a", b"1", 0)
+    assert await backend.get("a") is None
+    assert backend.expirations == 1
+    assert backend.size == 0
+
+
+async def test_concurrent_misses_are_coalesced(cache: RepositoryCache) -> None:
+    calls = 0
+
+    async def load(key: int) -> Row:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return Row(id=key, version=1)
+
+    rows = await asyncio.gather(*(cache.get_or_load(1, load) for _ in range(5)))
+    assert rows == [Row(id=1, version=1)] * 5
+    assert calls == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+    assert await cache.get_or_load(1, load) == Row(id=1, version=1)
+    assert cache.hits == 1
+
+
+async def test_a_load_racing_an_invalidation_is_not_stored(cache: RepositoryCache) -> None:
+    async def load(key: int) -> Row:
+        await cache.invalidate(key)
+        return Row(id=key, version=1)
+
+    await cache.get_or_load(1, load)
+    assert await cache.backend.get(cache._key(1)) is None
+
+
+async def test_change_feed_events_invalidate(cache: RepositoryCache) -> None:
+    tenant = uuid.uuid4()
+
+    async def load(key: tuple[uuid.UUID, int]) -> Row:
+        return Row(id=key[1], version=1)
+
+    await cache.get_or_load((tenant, 1), load)
+    await cache.get_or_load((tenant, 2), load)
+    # Inserts can't make an entry stale
+    RepositoryCache.on_change(ChangeEvent(tenant, "rows", "created", 1, 1))
+    RepositoryCache.on_change(ChangeEvent(tenant, "rows", "updated", 1, 2))
+    await asyncio.gather(*RepositoryCache._pending)
+    assert await cache.backend.get(cache._key((tenant, 1))) is None
+    assert await cache.backend.get(cache._key((tenant, 2))) is not None
+    assert cache.invalidations == 1
+
+    # Missed events drop everything
+    RepositoryCache.on_change(None)
+    assert await cache.backend.get(cache._key((tenant, 2))) is None
@@ -0,0 +1,39 @@
+import asyncio
+import uuid
+import pytest
+from db.changes import Subscription, RESYNC
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_overflow_is_replaced_by_one_resync() -> None:
+    subscription = Subscription(uuid.uuid4(), (), 2)
+    assert subscription.push("created", "1")
+    assert subscription.push("created", "2")
+    assert not subscription.push("created", "3")
+    # Events after the resync are newer than the refetch it triggers, so they are kept
+    assert subscription.push("updated", "4")
+
+    assert await subscription.get(0.1) == (RESYNC, "")
+    assert await subscription.get(0.1) == ("updated", "4")
+    assert await subscription.get(0.01) is None
+
+
+async def test_resync_wakes_a_consumer_waiting_without_timeout() -> None:
+    # The websocket stream waits without a heartbeat
+    subscription = Subscription(uuid.uuid4(), (), 4)
+    waiter = asyncio.ensure_future(subscription.get(None))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    subscription.resync()
+    assert await asyncio.wait_for(waiter, 1) == (RESYNC, "")
+
+
+async def test_repeated_resyncs_are_delivered_once() -> None:
+    subscription = Subscription(uuid.uuid4(), (), 4)
+    subscription.push("created", "1")
+    subscription.resync()
+    subscription.resync()
+    assert await subscription.get(0.1) == (RESYNC, "")
+    assert await subscription.get(0.01) is None
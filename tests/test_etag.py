@@ -0,0 +1,33 @@
+import pytest
+from core.etag import ETag
+
+
+def test_of() -> None:
+    assert ETag.of(3) == '"3"'
+
+
+@pytest.mark.parametrize(
+    "header, weak, versions",
+    [
+        (None, False, []),
+        ("", False, []),
+        ('"3"', False, [3]),
+        ('"1", "2" ,"3"', False, [1, 2, 3]),
+        ('W/"3"', False, []),
+        ('W/"3"', True, [3]),
+        ('W/"3", "4"', False, [4]),
+        # Not a version of ours: other tags, unquoted or empty values
+        ('"abc", 5, "", "-1", """', True, []),
+    ],
+)
+def test_versions(header: str | None, weak: bool, versions: list[int]) -> None:
+    assert ETag.versions(header, weak) == versions
+
+
+def test_matches() -> None:
+    assert ETag.matches('"2", "3"', 3)
+    assert not ETag.matches('"2"', 3)
+    assert ETag.matches(" * ", 3)
+    assert not ETag.matches("*", None)
+    assert not ETag.matches('W/"3"', 3)
+    assert ETag.matches('W/"3"', 3, weak=True)
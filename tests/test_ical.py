@@ -0,0 +1,134 @@
+import datetime
+import typing
+import uuid
+import pytest
+from core.tenant import Tenant
+from db.models import _CalendarNoteModel
+from db.uow import UnitOfWork
+from dto import AddCalendarNoteDTO, CalendarNoteUpdateDTO
+from repository import CalendarNoteRepository
+from repository.cache import DictCacheBackend, RepositoryCache
+from repository.ical import ICalendar
+
+pytestmark = pytest.mark.anyio
+
+DATE = datetime.datetime(2025, 1, 31, 10, 0, tzinfo=datetime.UTC)
+
+
+def note(id_: int, version: int = 1, title: str = "Note", body: str | None = None) -> dict[str, typing.Any]:
+    return {"id": id_, "uid": uuid.UUID(int=id_), "date": DATE, "title": title, "note": body, "version": version}
+
+
+def test_escape() -> None:
+    assert ICalendar.escape("a,b;c\\d\r\ne\nf") == "a\\,b\\;c\\\\d\\ne\\nf"
+
+
+def test_fold_keeps_lines_within_75_octets_without_splitting_characters() -> None:
+    line = "SUMMARY:" + "é" * 100
+    folded = ICalendar.fold(line)
+    parts = folded.split(b"\r\n")[:-1]
+    assert all(len(part) <= 75 for part in parts)
+    assert all(part.startswith(b" ") for part in parts[1:])
+    assert b"".join(part.removeprefix(b" ") for part in parts).decode() == line
+    assert ICalendar.fold("SHORT") == b"SHORT\r\n"
+
+
+def test_event_is_deterministic_per_version() -> None:
+    event = ICalendar.event(note(1, 3, "Call, Bob", "line\nbreak"))
+    assert event == ICalendar.event(note(1, 3, "Call, Bob", "line\nbreak"))
+    assert event.decode().split("\r\n") == [
+        "BEGIN:VEVENT",
+        f"UID:{uuid.UUID(int=1)}",
+        "DTSTAMP:20250131T100000Z",
+        "DTSTART:20250131T100000Z",
+        "SEQUENCE:3",
+        "SUMMARY:Call\\, Bob",
+        "DESCRIPTION:line\\nbreak",
+        "END:VEVENT",
+        "",
+    ]
+
+
+def test_version_changes_with_any_write() -> None:
+    version = ICalendar.version(2, 3, 2)
+    assert version == ICalendar.version(2, 3, 2)
+    assert len({version, ICalendar.version(3, 6, 3), ICalendar.version(2, 3, 3), ICalendar.version(1, 2, 1)}) == 4
+
+
+def test_last_modified_has_http_date_resolution() -> None:
+    modified = datetime.datetime(2025, 1, 31, 11, 0, 0, 999999, tzinfo=datetime.timezone(datetime.timedelta(hours=1)))
+    assert ICalendar.last_modified(modified) == datetime.datetime(2025, 1, 31, 10, tzinfo=datetime.UTC)
+    assert ICalendar.last_modified(None) == ICalendar.EPOCH
+
+
+async def test_render_only_loads_notes_missing_from_the_cache() -> None:
+    RepositoryCache.configure(DictCacheBackend())
+    tenant = uuid.uuid4()
+    notes = {1: note(1), 2: note(2), 3: note(3)}
+    loads: list[list[int]] = []
+
+    async def load(ids: list[int]) -> list[dict[str, typing.Any]]:
+        loads.append(ids)
+        return [notes[id_] for id_ in ids if id_ in notes]
+
+    async def render(index: list[dict[str, typing.Any]]) -> bytes:
+        return b"".join([chunk async for chunk in ICalendar.render(tenant, index, load, batch=2)])
+
+    try:
+        first = await render([{"id": 1, "version": 1}, {"id": 2, "version": 1}, {"id": 3, "version": 1}])
+        assert first.startswith(ICalendar.HEADER) and first.endswith(ICalendar.FOOTER)
+        assert first.count(b"BEGIN:VEVENT") == 3
+        assert loads == [[1, 2], [3]]
+
+        loads.clear()
+        notes[2] = note(2, 2, "Changed")
+        del notes[3]
+        # Note 3 was deleted after the index was read
+        second = await render([{"id": 1, "version": 1}, {"id": 2, "version": 2}, {"id": 3, "version": 2}])
+        assert loads == [[2], [3]]
+        assert second.count(b"BEGIN:VEVENT") == 2
+        assert b"SUMMARY:Changed" in second
+        assert ICalendar.reused >= 1
+    finally:
+        RepositoryCache.configure(None)
+
+
+async def test_database_last_modified_follows_updates_and_deletes(database: None) -> None:
+    repo = CalendarNoteRepository(_CalendarNoteModel)
+    with Tenant.scope(uuid.uuid4()) as tenant:
+        version, modified = await repo.feed_version()
+        assert modified == ICalendar.EPOCH
+
+        first = await repo.add(AddCalendarNoteDTO(title="First", note="a", date=DATE))
+        second = await repo.add(AddCalendarNoteDTO(title="Second", note="b", date=DATE))
+
+        async def stamps() -> tuple[datetime.datetime, datetime.datetime | None]:
+            async with UnitOfWork(readonly=True, autocommit=True) as conn:
+                return (
+                    await conn.fetchval("SELECT max(modified) FROM calendar_notes WHERE owner_id = $1;", tenant),
+                    await conn.fetchval("SELECT deleted_at FROM calendar_notes_deletions WHERE owner_id = $1;", tenant),
+                )
+
+        inserted, deleted = await stamps()
+        assert deleted is None
+        version, modified = await repo.feed_version()
+        assert modified == ICalendar.last_modified(inserted)
+
+        await repo.update(CalendarNoteUpdateDTO(id=first["id"], title="First", note="changed"))
+        updated, _ = await stamps()
+        assert updated > inserted
+
+        # An update that changes nothing doesn't bump the version, nor the modification time
+        await repo.update(CalendarNoteUpdateDTO(id=first["id"], title="First", note="changed"))
+        assert (await stamps())[0] == updated
+
+        await repo.delete(second["id"])
+        _, deleted = await stamps()
+        assert deleted > updated
+        version, modified = await repo.feed_version()
+        assert modified == ICalendar.last_modified(deleted)
+
+        # The feed itself reports the same version and Last-Modified as the revalidation query
+        feed_version, feed_modified, body = await repo.feed()
+        assert (feed_version, feed_modified) == (version, modified)
+        assert b"".join([chunk async for chunk in body]).count(b"BEGIN:VEVENT") == 1
@@ -0,0 +1,47 @@
+from core.metrics import Histogram, Prometheus
+
+
+def test_histogram_buckets_are_upper_inclusive() -> None:
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 3.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.snapshot() == {
+        "buckets": {"0.1": 2, "1.0": 4, "+Inf": 5},
+        "count": 5,
+        "sum": 4.65,
+    }
+
+
+def test_histogram_sorts_its_buckets() -> None:
+    assert Histogram((1.0, 0.1)).buckets == (0.1, 1.0)
+    assert Histogram().buckets == Histogram.DEFAULT_BUCKETS
+
+
+def test_scalar() -> None:
+    assert Prometheus.scalar("counter", "requests_total", "Requests", {(): 3, (("route", "/a"),): 1}) == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        "requests_total 3",
+        'requests_total{route="/a"} 1',
+    ]
+
+
+def test_label_values_are_escaped() -> None:
+    assert Prometheus.labels((("path", 'a"b\\c\nd'), ("method", "GET"))) == '{path="a\\"b\\\\c\\nd",method="GET"}'
+    assert Prometheus.labels(()) == ""
+
+
+def test_histogram_exposition() -> None:
+    histogram = Histogram((0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(2.0)
+    assert Prometheus.histogram("seconds", "Latency", {(("route", "/a"),): histogram}) == [
+        "# HELP seconds Latency",
+        "# TYPE seconds histogram",
+        'seconds_bucket{route="/a",le="0.1"} 1',
+        'seconds_bucket{route="/a",le="1.0"} 1',
+        'seconds_bucket{route="/a",le="+Inf"} 2',
+        'seconds_sum{route="/a"} 2.05',
+        'seconds_count{route="/a"} 2',
+    ]
@@ -0,0 +1,47 @@
+import datetime
+import uuid
+import pytest
+from core.tenant import Tenant
+from db.manager import AsyncPGPoolManager
+from db.migrations import Migrator
+from db.models import _CalendarNoteModel
+from db.uow import UnitOfWork
+from dto import AddCalendarNoteDTO
+from repository import CalendarNoteRepository
+
+pytestmark = pytest.mark.anyio
+
+# Far enough ahead that no startup has created these months
+MONTH = datetime.date(2099, 1, 1)
+PARTITIONS = [f"calendar_notes_y2099m{month:02d}" for month in range(1, 5)]
+
+
+def test_range_partitions_move_rows_out_of_the_default_partition() -> None:
+    (name, stmt), *_ = _CalendarNoteModel.__partitioning__.__range_partitions__("calendar_notes", MONTH)
+    assert name == PARTITIONS[0]
+    assert "DETACH PARTITION calendar_notes_default" in stmt
+    assert stmt.index("DELETE FROM calendar_notes_default") < stmt.index("ATTACH PARTITION calendar_notes_default")
+
+
+async def test_database_partition_created_after_its_rows(database: None) -> None:
+    repo = CalendarNoteRepository(_CalendarNoteModel)
+    mgr = await AsyncPGPoolManager.instance()
+    try:
+        with Tenant.scope(uuid.uuid4()) as tenant:
+            note = await repo.add(AddCalendarNoteDTO(
+                title="Far ahead", note="Later", date=datetime.datetime(2099, 1, 15, tzinfo=datetime.UTC)
+            ))
+            assert await Migrator(mgr).ensure_partitions([_CalendarNoteModel], MONTH) == PARTITIONS
+
+            async with UnitOfWork(readonly=True, autocommit=True) as conn:
+                assert await conn.fetchval(
+                    "SELECT tableoid::regclass::text FROM calendar_notes WHERE owner_id = $1 AND id = $2;",
+                    tenant, note["id"]
+                ) == PARTITIONS[0]
+            assert (await repo.get(note["id"]))["title"] == "Far ahead"
+            # Nothing left to create
+            assert await Migrator(mgr).ensure_partitions([_CalendarNoteModel], MONTH) == []
+    finally:
+        async with UnitOfWork(autocommit=True) as conn:
+            for name in PARTITIONS:
+                await conn.execute(f"DROP TABLE IF EXISTS {name};")
@@ -0,0 +1,127 @@
+import datetime
+import itertools
+import zoneinfo
+import pytest
+from core.exceptions import InvalidRecurrenceError
+from repository.recurrence import RecurrenceRule
+
+BERLIN = zoneinfo.ZoneInfo("Europe/Berlin")
+START = datetime.datetime(2024, 1, 31, 9, 30, tzinfo=BERLIN)
+
+
+def expand(rule: str, start: datetime.datetime = START, tz: str = "Europe/Berlin", limit: int = 50) -> list[datetime.datetime]:
+    return list(itertools.islice(RecurrenceRule.parse(rule).occurrences(start, tz), limit))
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        "FREQ=DAILY",
+        "FREQ=DAILY;INTERVAL=3",
+        "FREQ=WEEKLY;BYDAY=MO,WE,SU",
+        "FREQ=WEEKLY;INTERVAL=2",
+        "FREQ=MONTHLY",
+        "FREQ=MONTHLY;BYMONTHDAY=1,-1",
+        "FREQ=MONTHLY;INTERVAL=5;BYMONTHDAY=30",
+        "FREQ=YEARLY",
+        "FREQ=DAILY;UNTIL=20241231",
+        "FREQ=WEEKLY;COUNT=40;BYDAY=TU,FR",
+    ],
+)
+@pytest.mark.parametrize(
+    "window_start, days",
+    [(datetime.datetime(2023, 6, 1, tzinfo=datetime.UTC), 400), (datetime.datetime(2024, 3, 30, 22, tzinfo=datetime.UTC), 45)],
+)
+def test_window_jump_matches_full_expansion(rule: str, window_start: datetime.datetime, days: int) -> None:
+    # Expansion jumps to the window's period (without COUNT), it must find what walking from the start finds
+    window_end = window_start + datetime.timedelta(days=days)
+    walked = [
+        at for at in itertools.takewhile(
+            lambda at: at < window_end, RecurrenceRule.parse(rule).occurrences(START, "Europe/Berlin")
+        )
+        if at >= window_start
+    ]
+    assert list(RecurrenceRule.parse(rule).occurrences(START, "Europe/Berlin", window_start, window_end)) == walked
+
+
+def test_wall_clock_time_is_kept_across_dst() -> None:
+    days = expand("FREQ=DAILY", start=datetime.datetime(2024, 3, 30, 9, 30, tzinfo=BERLIN), limit=3)
+    assert [at.hour for at in days] == [9, 9, 9]
+    assert [at.utcoffset() for at in days] == [datetime.timedelta(hours=1), *[datetime.timedelta(hours=2)] * 2]
+
+
+def test_monthly_skips_months_without_the_day() -> None:
+    assert [at.date() for at in expand("FREQ=MONTHLY;COUNT=4")] == [
+        datetime.date(2024, 1, 31), datetime.date(2024, 3, 31), datetime.date(2024, 5, 31), datetime.date(2024, 7, 31)
+    ]
+    assert [at.day for at in expand("FREQ=MONTHLY;BYMONTHDAY=-1;COUNT=3")] == [31, 29, 31]
+
+
+def test_yearly_on_february_29() -> None:
+    start = datetime.datetime(2024, 2, 29, tzinfo=datetime.UTC)
+    assert [at.year for at in expand("FREQ=YEARLY;COUNT=3", start=start, tz="UTC")] == [2024, 2028, 2032]
+
+
+def test_count_until_and_occurs() -> None:
+    assert len(expand("FREQ=DAILY;COUNT=5")) == 5
+    assert expand("FREQ=DAILY;UNTIL=20240202")[-1].date() == datetime.date(2024, 2, 2)
+    rule = RecurrenceRule.parse("FREQ=WEEKLY;BYDAY=WE")
+    assert rule.occurs(START, "Europe/Berlin", datetime.datetime(2024, 2, 7, 9, 30, tzinfo=BERLIN))
+    assert not rule.occurs(START, "Europe/Berlin", datetime.datetime(2024, 2, 7, 9, 31, tzinfo=BERLIN))
+
+
+def test_rule_that_can_never_match_again_stops() -> None:
+    start = datetime.datetime(2024, 4, 30, tzinfo=datetime.UTC)
+    assert expand("FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=31", start=start, tz="UTC") == []
+
+
+def test_bound() -> None:
+    assert RecurrenceRule.parse("FREQ=DAILY").bound(START, "Europe/Berlin") is None
+    assert RecurrenceRule.parse("FREQ=DAILY;COUNT=3").bound(START, "Europe/Berlin") == START + datetime.timedelta(days=2)
+    until = RecurrenceRule.parse("FREQ=DAILY;UNTIL=20240301T120000Z")
+    assert until.bound(START, "Europe/Berlin") == datetime.datetime(2024, 3, 1, 12, tzinfo=datetime.UTC)
+
+
+def test_str_round_trips() -> None:
+    # Normalized: upper case, canonical part order, BYDAY sorted and deduplicated
+    assert str(RecurrenceRule.parse("RRULE:byday=fr,mo,fr;until=20250131t235959z;interval=2;freq=weekly")) == (
+        "FREQ=WEEKLY;INTERVAL=2;UNTIL=20250131T235959Z;BYDAY=MO,FR"
+    )
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        "FREQ=HOURLY",
+        "FREQ=DAILY;FREQ=DAILY",
+        "FREQ=DAILY;INTERVAL=0",
+        f"FREQ=DAILY;INTERVAL={RecurrenceRule.MAX_INTERVAL + 1}",
+        "FREQ=DAILY;COUNT=0",
+        "FREQ=DAILY;COUNT=2;UNTIL=20250101",
+        "FREQ=DAILY;BYDAY=MO",
+        "FREQ=MONTHLY;BYMONTHDAY=0",
+        "FREQ=MONTHLY;BYMONTHDAY=32",
+        "FREQ=DAILY;WKST=MO",
+        "FREQ=DAILY;UNTIL=tomorrow",
+    ],
+)
+def test_invalid_rules(rule: str) -> None:
+    with pytest.raises(InvalidRecurrenceError):
+        RecurrenceRule.parse(rule)
+
+
+def test_expansion_stops_at_the_end_of_the_datetime_range() -> None:
+    start = datetime.datetime(9990, 1, 1, tzinfo=datetime.UTC)
+    years = expand(f"FREQ=YEARLY;INTERVAL={RecurrenceRule.MAX_INTERVAL}", start=start, tz="UTC")
+    assert [at.year for at in years] == [9990]
+    days = RecurrenceRule.parse("FREQ=DAILY").occurrences(
+        datetime.datetime(9999, 12, 30, tzinfo=datetime.UTC), "UTC",
+        datetime.datetime(9999, 12, 31, tzinfo=datetime.UTC), datetime.datetime.max.replace(tzinfo=datetime.UTC)
+    )
+    assert [at.day for at in days] == [31]
+
+
+def test_bound_past_the_datetime_range_is_rejected() -> None:
+    start = datetime.datetime(9990, 1, 1, tzinfo=datetime.UTC)
+    with pytest.raises(InvalidRecurrenceError):
+        RecurrenceRule.parse("FREQ=YEARLY;COUNT=20").bound(start, "UTC")
@@ -0,0 +1,47 @@
+import datetime
+import uuid
+import pytest
+from core.tenant import Tenant
+from db.models import _CalendarNoteModel, _CalendarReminderModel
+from dto import AddCalendarNoteDTO, AddCalendarReminderDTO
+from repository import CalendarNoteRepository, CalendarReminderRepository
+from repository.scheduler import ReminderSink, MemorySink
+
+pytestmark = pytest.mark.anyio
+
+
+def test_sinks_must_implement_send() -> None:
+    with pytest.raises(TypeError):
+        ReminderSink()
+
+    class Incomplete(ReminderSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert isinstance(ReminderSink.create("memory"), MemorySink)
+
+
+def test_statements_name_the_notes_table_through_its_model() -> None:
+    statements = CalendarReminderRepository.register(_CalendarReminderModel)
+    for name in ("add", "claim"):
+        assert f"{_CalendarNoteModel.__table__} " in statements[name]
+        assert "{" not in statements[name]
+
+
+async def test_database_add_and_claim(database: None) -> None:
+    notes = CalendarNoteRepository(_CalendarNoteModel)
+    reminders = CalendarReminderRepository(_CalendarReminderModel)
+    with Tenant.scope(uuid.uuid4()) as tenant:
+        note = await notes.add(AddCalendarNoteDTO(
+            title="Due", note="now", date=datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=30)
+        ))
+        reminder = await reminders.add(AddCalendarReminderDTO(note_id=note["id"], before=60))
+        assert reminder["due"] < datetime.datetime.now(datetime.UTC)
+        # Nothing is added for a note of another tenant (or none at all)
+        assert await reminders.add(AddCalendarReminderDTO(note_id=note["id"] + 1_000_000)) is None
+
+        claimed = [row for row in await reminders.claim(1000, 60) if row["tenant"] == tenant]
+        assert [(row["id"], row["title"]) for row in claimed] == [(reminder["id"], "Due")]
+        await reminders.finish([(tenant, reminder["id"])], [])
+        assert (await reminders.list(note["id"]))[0]["sent_at"] is not None
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from db.manager import AsyncPGPoolManager, ReplicaPool
+
+pytestmark = pytest.mark.anyio
+
+
+class Pool:
+
+    def __init__(self, error: BaseException | None = None) -> None:
+        self.error = error
+        self.acquired: list[object] = []
+
+    async def acquire(self, timeout: float | None = None) -> object:
+        if self.error is not None:
+            raise self.error
+        conn = object()
+        self.acquired.append(conn)
+        return conn
+
+
+def manager(replica_pool: Pool) -> tuple[AsyncPGPoolManager, ReplicaPool]:
+    mgr = AsyncPGPoolManager()
+    mgr.pool = Pool()
+    replica = ReplicaPool("postgresql://replica:5432/db")
+    replica.pool, replica.healthy = replica_pool, True
+    mgr.replicas = [replica]
+    return mgr, replica
+
+
+async def test_reads_go_to_a_healthy_replica() -> None:
+    mgr, replica = manager(Pool())
+    conn = await mgr.acquire(timeout=1, readonly=True)
+    assert replica.pool.acquired == [conn]
+    assert mgr.replica_reads == 1
+
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError(), OSError("refused")])
+async def test_failed_replica_is_ejected_and_the_read_falls_back(error: BaseException) -> None:
+    mgr, replica = manager(Pool(error))
+    conn = await mgr.acquire(timeout=1, readonly=True)
+    assert mgr.pool.acquired == [conn]
+    assert not replica.healthy
+    assert (mgr.fallback_reads, mgr.acquire_timeouts) == (1, 0)
+
+    # Until the health check brings it back, reads skip it
+    await mgr.acquire(timeout=1, readonly=True)
+    assert len(mgr.pool.acquired) == 2
@@ -0,0 +1,48 @@
+import datetime
+import typing
+import uuid
+import pytest
+from litestar.serialization import encode_json
+from db.models import BaseAbstractModel, _TaskModel, _CalendarNoteModel
+from db.serialization import RecordEncoder
+from db.statements import StatementRegistry
+from dto import TaskDTO, TaskPageDTO, CalendarNoteDTO, CalendarNotePageDTO
+
+# Records are tuples in the order of {columns}, rows are built as tuples for RecordEncoder and as mappings for the
+# return_dto(**row) + encode_json path, both must produce the same bytes
+
+NOW = datetime.datetime(2025, 3, 30, 1, 30, 15, 123456, tzinfo=datetime.UTC)
+
+CASES = [
+    (
+        _TaskModel, TaskDTO, TaskPageDTO,
+        [(1, "Task", "Description", True, uuid.uuid4(), 1), (2, 'Quote " and \\ and ü', None, False, uuid.uuid4(), 7)],
+    ),
+    (
+        _CalendarNoteModel, CalendarNoteDTO, CalendarNotePageDTO,
+        [
+            (1, uuid.uuid4(), NOW, "Note", "Body", 1),
+            (2, uuid.uuid4(), NOW.astimezone(datetime.timezone(datetime.timedelta(hours=2))), "Note", None, 3),
+        ],
+    ),
+]
+
+
+@pytest.mark.parametrize("model, dto, page_dto, rows", CASES, ids=[case[0].__table__ for case in CASES])
+def test_record_encoder_matches_dto_path(
+        model: typing.Type[BaseAbstractModel],
+        dto: type,
+        page_dto: type,
+        rows: list[tuple[typing.Any, ...]]
+) -> None:
+    encoder = RecordEncoder.for_model(model)
+    mappings = [dict(zip(StatementRegistry.columns(model), row)) for row in rows]
+
+    assert encoder.encode(rows[0]) == encode_json(dto(**mappings[0]))
+    assert encoder.encode_many(rows) == encode_json([dto(**row) for row in mappings])
+    for cursor in (None, "abc"):
+        assert encoder.encode_page(rows, cursor) == encode_json(
+            page_dto(items=[dto(**row) for row in mappings], next=cursor)
+        )
+    assert encoder.encode_lines(rows) == b"".join(encode_json(dto(**row)) + b"\n" for row in mappings)
+    assert encoder.encode_lines([]) == b""
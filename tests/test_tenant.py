@@ -0,0 +1,41 @@
+import uuid
+import pytest
+from litestar.exceptions import ValidationException
+from core.exceptions import MissingTenantError
+from core.settings import settings
+from core.tenant import Tenant, TenantMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+async def handle(headers: list[tuple[bytes, bytes]]) -> uuid.UUID | None:
+    seen = []
+
+    async def next_app(scope, receive, send) -> None:
+        seen.append(Tenant.get())
+
+    await TenantMiddleware().handle({"type": "http", "headers": headers}, None, None, next_app)
+    return seen[0]
+
+
+async def test_header_sets_the_tenant_of_the_request() -> None:
+    tenant = uuid.uuid4()
+    assert await handle([(settings.TENANT_HEADER.lower().encode(), str(tenant).encode())]) == tenant
+    assert Tenant.get() is None
+
+
+async def test_requests_without_the_header_are_rejected_by_default() -> None:
+    assert settings.DEFAULT_TENANT is None
+    with pytest.raises(MissingTenantError):
+        await handle([])
+
+
+async def test_default_tenant_is_opt_in(monkeypatch: pytest.MonkeyPatch) -> None:
+    tenant = uuid.uuid4()
+    monkeypatch.setattr(settings, "DEFAULT_TENANT", tenant)
+    assert await handle([]) == tenant
+
+
+async def test_invalid_header() -> None:
+    with pytest.raises(ValidationException):
+        await handle([(settings.TENANT_HEADER.lower().encode(), b"not-a-uuid")])
@@ -0,0 +1,152 @@
+import datetime
+import gzip
+import typing
+import uuid
+import pytest
+from core.exceptions import InvalidImportError
+from core.settings import settings
+from core.tenant import Tenant
+from db.models import _TaskModel
+from dto import TaskImportDTO, CalendarNoteImportDTO
+from repository import TaskRepository
+from repository.transfer import Transfer
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(*parts: bytes) -> typing.AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+async def collect(iterator: typing.AsyncIterable[typing.Any]) -> list[typing.Any]:
+    return [item async for item in iterator]
+
+
+async def test_lines_across_chunks() -> None:
+    lines = await collect(Transfer.lines(chunks(b"a\r\nb", b"c\n\nd", b"")))
+    assert lines == [(1, b"a"), (2, b"bc"), (3, b""), (4, b"d")]
+
+
+async def test_line_longer_than_the_limit_is_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "IMPORT_MAX_LINE_BYTES", 8)
+    assert await collect(Transfer.lines(chunks(b"12345678\n", b"12345678"))) == [(1, b"12345678"), (2, b"12345678")]
+    with pytest.raises(InvalidImportError, match="Line 2 is longer than 8 bytes"):
+        await collect(Transfer.lines(chunks(b"ok\n1234", b"56789")))
+
+
+async def test_lines_split_into_many_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "IMPORT_MAX_LINE_BYTES", 8)
+    data = b"first\r\n12345678\n\nlast"
+    assert await collect(Transfer.lines(chunks(*(data[i:i + 1] for i in range(len(data)))))) == [
+        (1, b"first"), (2, b"12345678"), (3, b""), (4, b"last")
+    ]
+    # Complete lines in one chunk are held to the limit too
+    with pytest.raises(InvalidImportError, match="Line 2 is longer than 8 bytes"):
+        await collect(Transfer.lines(chunks(b"ok\n123456789\nok\n")))
+
+
+async def test_gzip_round_trip() -> None:
+    data = b"".join(b'{"title": "Task %d"}\n' % i for i in range(1000))
+    compressed = b"".join(await collect(Transfer.gzip(chunks(data[:5000], data[5000:]))))
+    assert gzip.decompress(compressed) == data
+    split = [compressed[i:i + 100] for i in range(0, len(compressed), 100)]
+    assert b"".join(await collect(Transfer.gunzip(chunks(*split)))) == data
+
+
+async def test_gunzip_inflates_in_bounded_steps(monkeypatch: pytest.MonkeyPatch) -> None:
+    # A small chunk may expand enormously, each step yields at most INFLATE_CHUNK bytes
+    monkeypatch.setattr(Transfer, "INFLATE_CHUNK", 1024)
+    inflated = await collect(Transfer.gunzip(chunks(gzip.compress(b"\0" * 100_000))))
+    assert max(map(len, inflated)) <= 1024
+    assert sum(map(len, inflated)) == 100_000
+
+
+async def test_gunzip_reads_every_member() -> None:
+    # e.g. cat a.ndjson.gz b.ndjson.gz, with a member boundary inside a chunk and one between chunks
+    first, second, third = gzip.compress(b"a\n"), gzip.compress(b"b" * 5000 + b"\n"), gzip.compress(b"c\n")
+    data = first + second
+    assert b"".join(await collect(Transfer.gunzip(chunks(data[:len(first) + 5], data[len(first) + 5:], third)))) == (
+        b"a\n" + b"b" * 5000 + b"\nc\n"
+    )
+
+
+async def test_gunzip_rejects_trailing_garbage_and_truncated_members() -> None:
+    with pytest.raises(InvalidImportError, match="Invalid gzip stream"):
+        await collect(Transfer.gunzip(chunks(gzip.compress(b"a\n") + b"trailing")))
+    with pytest.raises(InvalidImportError, match="Truncated gzip stream"):
+        await collect(Transfer.gunzip(chunks(gzip.compress(b"a\n") + gzip.compress(b"b\n")[:-4])))
+
+
+async def test_gunzip_rejects_invalid_and_truncated_streams() -> None:
+    with pytest.raises(InvalidImportError, match="Invalid gzip stream"):
+        await collect(Transfer.gunzip(chunks(b"not gzip at all")))
+    with pytest.raises(InvalidImportError, match="Truncated gzip stream"):
+        await collect(Transfer.gunzip(chunks(gzip.compress(b"x" * 1000)[:-8])))
+
+
+async def test_gzip_closes_its_source() -> None:
+    closed = False
+
+    async def source() -> typing.AsyncIterator[bytes]:
+        nonlocal closed
+        try:
+            yield b"a"
+            yield b"b"
+        finally:
+            closed = True
+
+    compressed = Transfer.gzip(source())
+    await compressed.__anext__()
+    await compressed.aclose()
+    assert closed
+
+
+async def test_ndjson() -> None:
+    records = await collect(Transfer.records(
+        chunks(b'{"title": "A", "description": null, "done": true}\n\n{"description": "d"}'), TaskImportDTO, "ndjson"
+    ))
+    assert records == [TaskImportDTO(title="A", description=None, done=True), TaskImportDTO(description="d")]
+    with pytest.raises(InvalidImportError, match="Line 2: invalid JSON"):
+        await collect(Transfer.ndjson(chunks(b"{}\n{"), TaskImportDTO))
+    with pytest.raises(InvalidImportError, match="Line 1"):
+        await collect(Transfer.ndjson(chunks(b'{"done": "yes"}'), TaskImportDTO))
+
+
+async def test_csv_reads_copy_output() -> None:
+    # COPY ... CSV HEADER: t/f booleans, "+00" offsets, empty fields for NULL, quoted fields spanning lines
+    data = b'id,title,description,done\n1,A,,t\n2,"B, ""quoted""","two\nlines",f\n'
+    records = await collect(Transfer.records(chunks(gzip.compress(data)), TaskImportDTO, "csv", "gzip"))
+    assert records == [
+        TaskImportDTO(title="A", description="", done=True),
+        TaskImportDTO(title='B, "quoted"', description="two\nlines", done=False),
+    ]
+    notes = await collect(Transfer.csv(chunks(b"title,date\nN,2025-01-31 10:00:00+00\nM,\n"), CalendarNoteImportDTO))
+    assert notes == [
+        CalendarNoteImportDTO(title="N", date=datetime.datetime(2025, 1, 31, 10, tzinfo=datetime.UTC)),
+        CalendarNoteImportDTO(title="M"),
+    ]
+
+
+async def test_csv_rejects_malformed_records() -> None:
+    with pytest.raises(InvalidImportError, match="Line 2: expected 2 fields, got 3"):
+        await collect(Transfer.csv(chunks(b"title,done\na,t,x\n"), TaskImportDTO))
+    with pytest.raises(InvalidImportError, match="Unterminated quoted field"):
+        await collect(Transfer.csv(chunks(b'title\n"open\n'), TaskImportDTO))
+    with pytest.raises(InvalidImportError, match="not UTF-8"):
+        await collect(Transfer.csv(chunks(b"title\n\xff\n"), TaskImportDTO))
+
+
+async def test_database_import_and_export(database: None) -> None:
+    repo = TaskRepository(_TaskModel)
+    with Tenant.scope(uuid.uuid4()):
+        records = Transfer.records(
+            chunks(b'{"title": "A", "description": null}\n{"title": "B", "done": true}\n'), TaskImportDTO, "ndjson"
+        )
+        result = await repo.import_records(records, chunk_size=1)
+        assert result == {"imported": 2, "chunks": 2}
+        exported = b"".join(await collect(repo.export_csv()))
+        assert await collect(Transfer.csv(chunks(exported), TaskImportDTO)) == [
+            TaskImportDTO(title="A", description="", done=False),
+            TaskImportDTO(title="B", description="", done=True),
+        ]
@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import uuid
+import pytest
+from core.tenant import Tenant
+from db.manager import AsyncPGPoolManager
+from db.uow import UnitOfWork
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeTransaction:
+
+    def __init__(self, log: list[str]) -> None:
+        self.log = log
+
+    async def start(self) -> None:
+        self.log.append("start")
+
+    async def commit(self) -> None:
+        self.log.append("commit")
+
+    async def rollback(self) -> None:
+        self.log.append("rollback")
+
+
+class FakeConnection:
+
+    def __init__(self) -> None:
+        self.log: list[str] = []
+
+    def transaction(self, readonly: bool = False) -> FakeTransaction:
+        return FakeTransaction(self.log)
+
+
+class FakeManager:
+
+    def __init__(self) -> None:
+        self.acquired: list[FakeConnection] = []
+        self.released: list[FakeConnection] = []
+        self.writes = 0
+
+    async def acquire(self, readonly: bool = False) -> FakeConnection:
+        conn = FakeConnection()
+        self.acquired.append(conn)
+        return conn
+
+    async def release(self, conn: FakeConnection) -> None:
+        self.released.append(conn)
+
+    def wrote(self) -> None:
+        self.writes += 1
+
+
+@pytest.fixture
+def manager(monkeypatch: pytest.MonkeyPatch) -> FakeManager:
+    mgr = FakeManager()
+
+    async def instance() -> FakeManager:
+        return mgr
+
+    monkeypatch.setattr(AsyncPGPoolManager, "instance", instance)
+    return mgr
+
+
+async def test_commits_and_releases(manager: FakeManager) -> None:
+    async with UnitOfWork() as conn:
+        assert UnitOfWork.current() is conn
+    assert conn.log == ["start", "commit"]
+    assert manager.released == [conn]
+    assert manager.writes == 1
+    assert UnitOfWork.current() is None
+
+
+async def test_rolls_back_on_error(manager: FakeManager) -> None:
+    with pytest.raises(RuntimeError):
+        async with UnitOfWork() as conn:
+            raise RuntimeError
+    assert conn.log == ["start", "rollback"]
+    assert manager.released == [conn]
+    assert manager.writes == 0
+
+
+async def test_nested_scope_reuses_the_connection_as_a_savepoint(manager: FakeManager) -> None:
+    async with UnitOfWork() as outer:
+        async with UnitOfWork() as inner:
+            assert inner is outer
+    assert outer.log == ["start", "start", "commit", "commit"]
+    assert manager.released == [outer]
+
+
+async def test_autocommit_and_readonly_scopes(manager: FakeManager) -> None:
+    async with UnitOfWork(readonly=True, autocommit=True) as conn:
+        pass
+    assert conn.log == []
+    assert manager.writes == 0
+
+
+async def test_releases_when_exited_in_another_context(manager: FakeManager) -> None:
+    # An abandoned async generator is finalized in another Context, where the token can't be reset
+    uow = UnitOfWork()
+    conn = await uow.__aenter__()
+    await asyncio.create_task(uow.__aexit__(None, None, None), context=contextvars.Context())
+    assert manager.released == [conn]
+
+
+async def test_database_transactions(database: None) -> None:
+    with Tenant.scope(uuid.uuid4()):
+        async with UnitOfWork() as conn:
+            await conn.execute("CREATE TEMPORARY TABLE uow_test (id integer) ON COMMIT PRESERVE ROWS;")
+            await conn.execute("INSERT INTO uow_test VALUES (1);")
+            with pytest.raises(ValueError):
+                async with UnitOfWork() as nested:
+                    await nested.execute("INSERT INTO uow_test VALUES (2);")
+                    raise ValueError
+            # The savepoint was rolled back, the outer transaction wasn't
+            assert await conn.fetchval("SELECT array_agg(id) FROM uow_test;") == [1]
+            await conn.execute("DROP TABLE uow_test;")
+        async with UnitOfWork(readonly=True, autocommit=True) as conn:
+            assert await conn.fetchval("SELECT 1;") == 1